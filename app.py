@@ -1,14 +1,356 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response, send_file, stream_with_context
 from config import Config
-from models import db, Producto, Servicio, Cliente, Orden, OrdenItem, Usuario, Empleada, CategoriaProducto, CategoriaServicio, MarcaProducto
+from models import db, Producto, Servicio, Cliente, Orden, OrdenItem, Usuario, Empleada, CategoriaProducto, CategoriaServicio, MarcaProducto, OrdenArchivo, OrdenItemArchivo, MovimientoInventario, Cambio, Trabajo, Sucursal, StockSucursal, Cita, EmpleadaServicio
+from decimal import Decimal, ROUND_HALF_UP
 from flask_migrate import Migrate
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 from flask_cors import CORS
+from inventario import LibroMovimientos, stock_a_fecha, stock_en_sucursal, sumar_stock_sucursal, tomar_snapshot
+from importacion import importar_productos, leer_filas, exportar_csv, exportar_json
+from respuestas import init_compresion, pide_recorte, recortar_segun
+from reportes import CRITERIOS_TOP, en_cache, top_vendidos, corte_caja, corte_csv, corte_detalle_csv
+from cambios import cambios_desde, registrar_consulta, registrar_ids
+from trabajos import MIMETYPES, encolar, podar_trabajos, ruta_resultado, trabajar, trabajo_to_dict
+from eventos import Suscripcion, broker, emitir, formato_sse, iniciar_oyente, marcar_stock
+from replicas import init_replicas, solo_lectura
+from esquemas import valida
+from citas import (
+    ESTADOS as ESTADOS_CITA, MAX_DURACION, choques, cita_to_dict, disponibilidad, duracion_de,
+    invalidar as invalidar_agenda, rango_del_dia, ranking_asignacion,
+)
+from busqueda import TIPOS as TIPOS_BUSQUEDA, buscar, terminos as terminos_busqueda
+from catalogo import (
+    version_catalogo, invalidar_catalogo, cache_catalogo, cache_codigos, etag_catalogo, normalizar_sku,
+    resolver_lookup, olvidar_lookups,
+)
+from sqlalchemy import func, select, insert, delete, update, literal, case, cast, text, and_, or_, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+import click
+import os
+import io
+import math
 
 
 migrate = Migrate()
 
 
+def parse_iso_datetime(value: str) -> datetime:
+    """
+    Convierte una cadena ISO 8601 a datetime.
+    Acepta 'Z' al final como UTC.
+    """
+    if not value:
+        return None
+    # si termina en 'Z', lo cambiamos a +00:00
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value)
+
+
+def a_utc_naive(value: datetime) -> datetime:
+    """Las fechas se guardan en UTC sin zona; normaliza para poder comparar."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+CENTAVO = Decimal("0.01")
+
+
+def a_dinero(valor) -> Decimal:
+    """
+    Monto del JSON (int, float o str) -> Decimal con 2 decimales.
+    Pasa por str para no arrastrar el error binario del float (0.1 -> 0.10).
+    Lanza InvalidOperation si no es un número.
+    """
+    return Decimal(str(valor)).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+
+
+def subtotal_items(orden_id, tipo=None):
+    """SUM(cantidad * precio_unitario) de los items de una orden, como subconsulta escalar.
+    `orden_id` puede ser un valor o la columna Orden.id (subconsulta correlacionada)."""
+    query = (
+        select(func.coalesce(func.sum(OrdenItem.cantidad * OrdenItem.precio_unitario), 0))
+        .where(OrdenItem.orden_id == orden_id)
+    )
+    if tipo is not None:
+        query = query.where(OrdenItem.tipo == tipo)
+    return query.scalar_subquery()
+
+
+def resumen_sql():
+    """Columnas de resumen de Orden calculadas en SQL desde orden_items (para conciliar)."""
+    def agregado(expr):
+        return select(expr).where(OrdenItem.orden_id == Orden.id).scalar_subquery()
+
+    return {
+        "num_items": agregado(func.count(OrdenItem.id)),
+        "subtotal": subtotal_items(Orden.id),
+        "subtotal_productos": subtotal_items(Orden.id, "producto"),
+        "subtotal_servicios": subtotal_items(Orden.id, "servicio"),
+        "num_empleadas": agregado(func.count(OrdenItem.empleada_id.distinct())),
+    }
+
+
+def aplicar_resumen(orden, items):
+    """
+    Llena las columnas de resumen (num_items, subtotales, num_empleadas) y el
+    total de la orden a partir de sus items, con los precios ya en Decimal.
+    """
+    subtotales = {"producto": Decimal("0"), "servicio": Decimal("0")}
+    for item in items:
+        subtotales[item.tipo] += (item.cantidad or 0) * item.precio_unitario
+    orden.num_items = len(items)
+    orden.subtotal_productos = subtotales["producto"]
+    orden.subtotal_servicios = subtotales["servicio"]
+    orden.subtotal = subtotales["producto"] + subtotales["servicio"]
+    orden.num_empleadas = len({item.empleada for item in items})
+    orden.total = max(orden.subtotal - (orden.descuento or 0), Decimal("0"))
+
+
+def total_esperado():
+    """Total que debería tener cada orden según sus items: max(subtotal - descuento, 0)."""
+    neto = subtotal_items(Orden.id) - Orden.descuento
+    return func.round(case((neto < 0, 0), else_=neto), 2)
+
+
+# ---------- Serialización (compartida con asgi.py) ----------
+
+def producto_listado_dict(p: Producto):
+    return {
+        "id": p.id,
+        "marca": p.marca.nombre if p.marca else None,
+        "marca_id": p.marca.id if p.marca else None,
+        "descripcion": p.descripcion,
+        "sku": p.sku,
+        "categoria": p.categoria.nombre if p.categoria else None,
+        "categoria_id": p.categoria.id if p.categoria else None,
+        "costo": float(p.costo),
+        "precio": float(p.precio),
+        "cantidad": p.cantidad,
+        "stock_minimo": p.stock_minimo,
+        "imagen": p.imagen,
+    }
+
+
+def servicio_listado_dict(s: Servicio):
+    return {
+        "id": s.id,
+        "descripcion": s.descripcion,
+        "categoria": s.categoria.nombre if s.categoria else None,
+        "categoria_id": s.categoria.id if s.categoria else None,
+        "costo": float(s.costo),
+        "precio": float(s.precio),
+        "imagen": s.imagen,
+        "duracion_minutos": s.duracion_minutos,
+    }
+
+
+def cliente_to_dict(c: Cliente):
+    return {
+        "id": c.id,
+        "nombre": c.nombre,
+        "telefono": c.telefono,
+    }
+
+
+def producto_to_dict(p: Producto):
+    if p is None:
+        return None
+    return {
+        "id": p.id,
+        "descripcion": p.descripcion,
+        "sku": p.sku,
+        "precio": float(p.precio),
+        "categoria_id": p.categoria_id,
+        "marca_id": p.marca_id,
+    }
+
+def servicio_to_dict(s: Servicio):
+    if s is None:
+        return None
+    return {
+        "id": s.id,
+        "descripcion": s.descripcion,
+        "precio": float(s.precio),
+        "categoria_id": s.categoria_id,
+    }
+
+
+def orden_to_dict(orden: Orden):
+    return {
+        "id": orden.id,
+        "codigo": orden.codigo,
+        "fecha": orden.fecha.isoformat(),
+        "tipo_pago": orden.tipo_pago,
+        "referencia": orden.referencia,
+        "descuento": float(orden.descuento) if orden.descuento is not None else 0.0,
+        "total": float(orden.total) if orden.total is not None else 0.0,
+        "anulada_en": orden.anulada_en.isoformat() if orden.anulada_en else None,
+        "sucursal_id": orden.sucursal_id,
+        "empleada": None,  # compat: ahora las empleadas van a nivel de item
+        "cliente": {
+            "id": orden.cliente.id,
+            "nombre": orden.cliente.nombre,
+            "telefono": orden.cliente.telefono,
+        },
+        "items": [
+            {
+                "id": item.id,
+                "tipo": item.tipo,
+                "producto_id": item.producto_id,
+                "servicio_id": item.servicio_id,
+                "cantidad": item.cantidad,
+                "precio_unitario": float(item.precio_unitario),
+                "empleada": {
+                    "id": item.empleada.id,
+                    "nombre": item.empleada.nombre,
+                    "telefono": item.empleada.telefono,
+                } if item.empleada else None,
+                "producto": producto_to_dict(item.producto) if item.tipo == "producto" else None,
+                "servicio": servicio_to_dict(item.servicio) if item.tipo == "servicio" else None,
+            }
+            for item in orden.items
+        ],
+    }
+
+
+def orden_evento_dict(orden):
+    """Lo que viaja en los eventos de órdenes (GET /eventos): sin items, cabe en un NOTIFY."""
+    return {
+        "id": orden.id,
+        "codigo": orden.codigo,
+        "fecha": orden.fecha.isoformat() if orden.fecha else None,
+        "tipo_pago": orden.tipo_pago,
+        "total": float(orden.total),
+        "num_items": orden.num_items,
+        "anulada_en": orden.anulada_en.isoformat() if orden.anulada_en else None,
+        "cliente_id": orden.cliente_id,
+        "sucursal_id": orden.sucursal_id,
+    }
+
+
+def orden_resumen_dict(fila):
+    """Fila de consulta_ordenes_resumen -> dict (sin items)."""
+    return {
+        "id": fila.id,
+        "codigo": fila.codigo,
+        "fecha": fila.fecha.isoformat(),
+        "tipo_pago": fila.tipo_pago,
+        "referencia": fila.referencia,
+        "descuento": float(fila.descuento),
+        "total": float(fila.total),
+        "anulada_en": fila.anulada_en.isoformat() if fila.anulada_en else None,
+        "num_items": fila.num_items,
+        "subtotal": float(fila.subtotal),
+        "subtotal_productos": float(fila.subtotal_productos),
+        "subtotal_servicios": float(fila.subtotal_servicios),
+        "num_empleadas": fila.num_empleadas,
+        "sucursal_id": fila.sucursal_id,
+        "cliente": {"id": fila.cliente_id, "nombre": fila.cliente_nombre},
+    }
+
+
+# ---------- Consultas (compartidas con asgi.py) ----------
+
+def consulta_productos():
+    return select(Producto).options(selectinload(Producto.marca), selectinload(Producto.categoria))
+
+
+def consulta_servicios():
+    return select(Servicio).options(selectinload(Servicio.categoria))
+
+
+def consulta_clientes(q: str = None):
+    query = select(Cliente)
+    if q:
+        # filtra por nombre que contenga 'q' (case-insensitive)
+        query = query.where(Cliente.nombre.ilike(f"%{q}%"))
+    return query.order_by(Cliente.nombre.asc())
+
+
+def consulta_ordenes(modelo, inicio=None, fin=None, incluir_anuladas=False, sucursal_id=None):
+    """
+    SELECT de órdenes (Orden u OrdenArchivo) con cliente e items ya cargados,
+    para que orden_to_dict no dispare una consulta por orden.
+    """
+    item = modelo.items.property.mapper.class_
+    query = select(modelo).options(
+        selectinload(modelo.cliente),
+        selectinload(modelo.items).options(
+            selectinload(item.empleada),
+            selectinload(item.producto),
+            selectinload(item.servicio),
+        ),
+    )
+    return filtrar_ordenes(query, modelo, inicio, fin, incluir_anuladas, sucursal_id)
+
+
+def consulta_ordenes_resumen(modelo, inicio=None, fin=None, incluir_anuladas=False, sucursal_id=None):
+    """
+    Igual que consulta_ordenes pero solo con las columnas de la orden (incluido
+    el resumen) y el nombre del cliente: no lee orden_items.
+    """
+    columnas = [
+        modelo.id, modelo.codigo, modelo.fecha, modelo.tipo_pago, modelo.referencia,
+        modelo.descuento, modelo.total, modelo.anulada_en, modelo.num_items, modelo.subtotal,
+        modelo.subtotal_productos, modelo.subtotal_servicios, modelo.num_empleadas, modelo.cliente_id,
+        modelo.sucursal_id,
+    ]
+    query = select(*columnas, Cliente.nombre.label("cliente_nombre")).join(Cliente, Cliente.id == modelo.cliente_id)
+    return filtrar_ordenes(query, modelo, inicio, fin, incluir_anuladas, sucursal_id)
+
+
+def sucursal_activa(sucursal_id) -> bool:
+    return bool(db.session.execute(select(Sucursal.activo).where(Sucursal.id == sucursal_id)).scalar())
+
+
+def producto_de_item(item_data: dict):
+    """
+    Producto de un item de orden: por producto_id o por sku (lo que manda el
+    escáner de caja). Devuelve (producto, error).
+    """
+    producto_id = item_data.get("producto_id")
+    if producto_id:
+        producto = Producto.query.get(producto_id)
+        return producto, None if producto else f"producto {producto_id} no existe"
+    sku = normalizar_sku(item_data.get("sku"))
+    if sku is None:
+        return None, "producto_id o sku es requerido cuando tipo='producto'"
+    producto = Producto.query.filter_by(sku=sku).first()
+    return producto, None if producto else f"no hay producto con sku {sku}"
+
+
+def sku_ocupado(sku: str, excluir_id: int = None) -> bool:
+    query = select(Producto.id).where(Producto.sku == sku)
+    if excluir_id is not None:
+        query = query.where(Producto.id != excluir_id)
+    return db.session.execute(query.limit(1)).first() is not None
+
+
+def filtrar_ordenes(query, modelo, inicio, fin, incluir_anuladas, sucursal_id=None):
+    if sucursal_id is not None:
+        # Con sucursal_id primero se usa ix_ordenes_sucursal_fecha_tipo_pago
+        query = query.where(modelo.sucursal_id == sucursal_id)
+    if inicio is not None:
+        query = query.where(modelo.fecha >= inicio)
+    if fin is not None:
+        query = query.where(modelo.fecha <= fin)
+    if not incluir_anuladas:
+        query = query.where(modelo.anulada_en.is_(None))
+    return query.order_by(modelo.fecha.desc())
+
+
+def consulta_horizonte_archivo():
+    """
+    Fecha de la orden archivada más reciente. Todo lo posterior a esta fecha
+    está en las tablas calientes.
+    """
+    return select(func.max(OrdenArchivo.fecha))
+
+
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
@@ -20,34 +362,248 @@ def create_app():
 
     db.init_app(app)
     migrate.init_app(app, db)
+    init_compresion(app)
+    init_replicas(app)
 
     @app.route("/")
     def index():
         return jsonify({"message": "API funcionando"})
 
+    @app.route("/healthz")
+    def healthz():
+        """Liveness: el proceso responde. No toca la BD."""
+        return jsonify({"status": "ok"})
+
+    @app.route("/readyz")
+    def readyz():
+        """
+        Readiness: se puede sacar una conexión del pool y la BD contesta un SELECT 1.
+        Responde 503 si no, para que el balanceador deje de mandar tráfico.
+        """
+        try:
+            with db.engine.connect() as conexion:
+                conexion.execute(text("SELECT 1"))
+        except Exception as e:
+            return jsonify({"status": "error", "error": type(e).__name__}), 503
+        return jsonify({"status": "ok", "pool": db.engine.pool.status()})
+
+    def respuesta_catalogo(nombre, construir):
+        """
+        Responde un listado de catálogo con ETag y cache en memoria.
+        `construir` solo se llama si la versión del catálogo cambió.
+        """
+        version = version_catalogo(nombre)
+        etag = etag_catalogo(nombre, version)
+        if request.if_none_match.contains_weak(etag):
+            resp = Response(status=304)
+            resp.set_etag(etag)
+            return resp
+
+        if pide_recorte(request.args):
+            # ?fields= / ?compacto=: no se cachea, cada combinación es distinta
+            return jsonify(recortar_segun(request.args, construir()))
+
+        payload = cache_catalogo.get(nombre, version)
+        if payload is None:
+            payload = jsonify(construir()).get_data()
+            cache_catalogo.set(nombre, version, payload)
+
+        resp = Response(payload, mimetype="application/json")
+        resp.set_etag(etag)
+        return resp
+
+    def expresion_ajuste(columna, spec, decimales=2):
+        """
+        Traduce {"porcentaje": x} | {"monto": x} | {"valor": x} a una expresión SQL
+        sobre `columna` (nunca negativa). Devuelve (expresion, error).
+        """
+        if not isinstance(spec, dict) or len(spec) != 1:
+            return None, "cada ajuste debe tener exactamente uno de 'porcentaje', 'monto' o 'valor'"
+        modo, valor = next(iter(spec.items()))
+        try:
+            valor = Decimal(str(valor))
+        except Exception:
+            return None, f"'{modo}' debe ser numérico"
+        if not valor.is_finite():
+            return None, f"'{modo}' debe ser numérico"
+
+        if modo == "porcentaje":
+            expr = func.round(columna * (1 + valor / 100), decimales)
+        elif modo == "monto":
+            expr = columna + valor
+        elif modo == "valor":
+            expr = literal(valor)
+        else:
+            return None, f"modo de ajuste desconocido: '{modo}'"
+        return case((expr < 0, 0), else_=expr), None
+
+    def filtro_bulk(modelo, filtro, campos):
+        """
+        Condiciones WHERE a partir de {"categoria_id", "marca_id", "ids", "todos"}
+        (tipos ya validados contra esquemas.FILTRO_BULK).
+        """
+        condiciones = []
+        for campo in campos:
+            if filtro.get(campo) is not None:
+                condiciones.append(getattr(modelo, campo) == filtro[campo])
+        if filtro.get("ids") is not None:
+            condiciones.append(modelo.id.in_(filtro["ids"]))
+        if not condiciones and not filtro.get("todos"):
+            return None, f"filtro requiere alguno de {', '.join(campos)}, ids (o todos=true)"
+        return and_(*condiciones), None
+
+    # ---------- BÚSQUEDA ----------
+
+    @app.route("/buscar", methods=["GET"])
+    @solo_lectura
+    def buscar_catalogo():
+        """
+        Productos y servicios por descripción, marca y categoría (ver busqueda.py).
+
+        Query params:
+        - q: requerido; sin importar acentos ni mayúsculas, cada palabra como prefijo
+        - tipo: producto | servicio (default ambos)
+        - limite: default 20, máx 50
+
+        Respuesta: [{"tipo", "id", "descripcion", "marca", "categoria", "precio", "rank"}]
+        de mayor a menor rank (primero lo que coincide en la descripción).
+        """
+        q = request.args.get("q", "")
+        if not terminos_busqueda(q):
+            return jsonify({"error": "q es requerido"}), 400
+        tipo = request.args.get("tipo") or None
+        if tipo is not None and tipo not in TIPOS_BUSQUEDA:
+            return jsonify({"error": f"tipo debe ser uno de {', '.join(TIPOS_BUSQUEDA)}"}), 400
+        try:
+            limite = min(int(request.args.get("limite", 20)), 50)
+        except ValueError:
+            return jsonify({"error": "limite debe ser entero"}), 400
+        if limite < 1:
+            return jsonify({"error": "limite debe ser >= 1"}), 400
+        return jsonify(buscar(q, limite, tipo)), 200
+
     # ---------- CRUD PRODUCTOS ----------
 
     @app.route("/productos", methods=["GET"])
+    @solo_lectura
     def listar_productos():
-        productos = Producto.query.all()
+        return respuesta_catalogo("productos", construir_listado_productos)
+
+    def construir_listado_productos():
+        productos = db.session.execute(consulta_productos()).scalars()
+        return [producto_listado_dict(p) for p in productos]
+
+
+    @app.route("/productos/bajo-stock", methods=["GET"])
+    @solo_lectura
+    def productos_bajo_stock():
+        """
+        Productos en o por debajo de su umbral de reorden, con velocidad de venta.
+
+        El umbral es Producto.stock_minimo, o el de su categoría, o
+        STOCK_MINIMO_DEFAULT. Las ventas recientes salen de un agregado sobre
+        orden_items unido en la misma consulta.
+
+        Query params:
+        - dias: ventana para calcular la velocidad de venta (default 30)
+        - cobertura: días de venta que debe cubrir el pedido sugerido (default 15)
+        - categoria_id: opcional
+        """
+        dias = request.args.get("dias", 30, type=int)
+        cobertura = request.args.get("cobertura", 15, type=int)
+        categoria_id = request.args.get("categoria_id", type=int)
+        if not dias or dias <= 0 or cobertura is None or cobertura < 0:
+            return jsonify({"error": "'dias' debe ser > 0 y 'cobertura' >= 0"}), 400
+
+        desde = datetime.utcnow() - timedelta(days=dias)
+        ventas = (
+            select(OrdenItem.producto_id, func.sum(OrdenItem.cantidad).label("vendidos"))
+            .join(Orden, Orden.id == OrdenItem.orden_id)
+            .where(
+                Orden.fecha >= desde,
+                Orden.anulada_en.is_(None),
+                OrdenItem.tipo == "producto",
+            )
+            .group_by(OrdenItem.producto_id)
+            .subquery()
+        )
+
+        umbral_categoria = func.coalesce(CategoriaProducto.stock_minimo, app.config["STOCK_MINIMO_DEFAULT"])
+        umbral = func.coalesce(Producto.stock_minimo, umbral_categoria).label("umbral")
+
+        query = (
+            select(
+                Producto.id,
+                Producto.descripcion,
+                Producto.cantidad,
+                Producto.categoria_id,
+                CategoriaProducto.nombre.label("categoria"),
+                MarcaProducto.nombre.label("marca"),
+                umbral,
+                func.coalesce(ventas.c.vendidos, 0).label("vendidos"),
+            )
+            .outerjoin(CategoriaProducto, CategoriaProducto.id == Producto.categoria_id)
+            .outerjoin(MarcaProducto, MarcaProducto.id == Producto.marca_id)
+            .outerjoin(ventas, ventas.c.producto_id == Producto.id)
+            # Dos ramas para que cada una pueda usar su índice parcial
+            .where(or_(
+                and_(Producto.stock_minimo.isnot(None), Producto.cantidad <= Producto.stock_minimo),
+                and_(Producto.stock_minimo.is_(None), Producto.cantidad <= umbral_categoria),
+            ))
+            .order_by(Producto.cantidad.asc())
+        )
+        if categoria_id is not None:
+            query = query.where(Producto.categoria_id == categoria_id)
+
         data = []
-        for p in productos:
+        for row in db.session.execute(query):
+            velocidad = row.vendidos / dias
             data.append({
-                "id": p.id,
-                "marca": p.marca.nombre if p.marca else None,
-                "marca_id": p.marca.id if p.marca else None,
-                "descripcion": p.descripcion,
-                "categoria": p.categoria.nombre if p.categoria else None,
-                "categoria_id": p.categoria.id if p.categoria else None,
-                "costo": float(p.costo),
-                "precio": float(p.precio),
-                "cantidad": p.cantidad,
-                "imagen": p.imagen,
+                "id": row.id,
+                "descripcion": row.descripcion,
+                "marca": row.marca,
+                "categoria": row.categoria,
+                "categoria_id": row.categoria_id,
+                "cantidad": row.cantidad,
+                "stock_minimo": row.umbral,
+                "vendidos": int(row.vendidos),
+                "venta_diaria": round(velocidad, 3),
+                "dias_cobertura": round(row.cantidad / velocidad, 1) if velocidad else None,
+                "sugerido_reorden": max(math.ceil(velocidad * cobertura) + row.umbral - row.cantidad, 0),
             })
         return jsonify(data)
 
 
+    @app.route("/productos/por-codigo/<codigo>", methods=["GET"])
+    @solo_lectura
+    def obtener_producto_por_codigo(codigo):
+        """
+        Producto por sku / código de barras (escáner de caja), mismo formato que GET /productos.
+        Se sirve de cache_codigos mientras no cambie la versión del catálogo de productos.
+        """
+        codigo = normalizar_sku(codigo)
+        if codigo is None:
+            # Sin esto la consulta quedaría "sku IS NULL" y devolvería cualquier producto sin sku
+            return jsonify({"error": "codigo vacío"}), 404
+        version = version_catalogo("productos")
+        entrada = cache_codigos.get(codigo)
+        if entrada is not None and entrada[0] == version:
+            payload = entrada[1]
+        else:
+            p = db.session.execute(
+                select(Producto)
+                .options(selectinload(Producto.marca), selectinload(Producto.categoria))
+                .where(Producto.sku == codigo)
+            ).scalar()
+            payload = jsonify(producto_listado_dict(p)).get_data() if p else None
+            cache_codigos.set(codigo, (version, payload))
+        if payload is None:
+            return jsonify({"error": f"no hay producto con sku {codigo}"}), 404
+        return Response(payload, mimetype="application/json")
+
+
     @app.route("/productos/<int:producto_id>", methods=["GET"])
+    @solo_lectura
     def obtener_producto(producto_id):
         p = Producto.query.get_or_404(producto_id)
         return jsonify({
@@ -55,74 +611,217 @@ def create_app():
             "marca": p.marca.nombre if p.marca else None,
             "marca_id": p.marca.id if p.marca else None,
             "descripcion": p.descripcion,
+            "sku": p.sku,
             "categoria": p.categoria.nombre if p.categoria else None,
             "categoria_id": p.categoria.id if p.categoria else None,
             "costo": float(p.costo),
             "precio": float(p.precio),
             "cantidad": p.cantidad,
+            "stock_minimo": p.stock_minimo,
             "imagen": p.imagen,
         })
 
 
     @app.route("/productos", methods=["POST"])
+    @valida("crear_producto")
     def crear_producto():
         data = request.get_json()
 
         # ===== MARCA =====
-        marca = None
-
         # 1) Si viene marca_id, usamos el ID
         marca_id = data.get("marca_id")
         if marca_id is not None:
-            marca = MarcaProducto.query.get(marca_id)
-            if not marca:
+            if not MarcaProducto.query.get(marca_id):
                 return jsonify({"error": "marca_id inválido"}), 400
-        else:
+        elif data.get("marca"):
             # 2) Compatibilidad: si viene 'marca' como nombre (string)
-            marca_nombre = data.get("marca")
-            if marca_nombre:
-                marca = MarcaProducto.query.filter_by(nombre=str(marca_nombre)).first()
-                if not marca:
-                    marca = MarcaProducto(nombre=str(marca_nombre))
-                    db.session.add(marca)
-                    db.session.flush()
+            marca_id = resolver_lookup(MarcaProducto, data["marca"])
 
         # ===== CATEGORÍA =====
-        categoria = None
-
         categoria_id = data.get("categoria_id")
         if categoria_id is not None:
-            categoria = CategoriaProducto.query.get(categoria_id)
-            if not categoria:
+            if not CategoriaProducto.query.get(categoria_id):
                 return jsonify({"error": "categoria_id inválido"}), 400
-        else:
-            categoria_nombre = data.get("categoria")
-            if categoria_nombre:
-                categoria = CategoriaProducto.query.filter_by(nombre=str(categoria_nombre)).first()
-                if not categoria:
-                    categoria = CategoriaProducto(nombre=str(categoria_nombre))
-                    db.session.add(categoria)
-                    db.session.flush()
+        elif data.get("categoria"):
+            categoria_id = resolver_lookup(CategoriaProducto, data["categoria"])
+
+        # ===== SKU =====
+        sku = normalizar_sku(data.get("sku"))
+        if sku is not None and sku_ocupado(sku):
+            return jsonify({"error": f"ya existe un producto con sku {sku}"}), 409
 
         # ===== PRODUCTO =====
         p = Producto(
-            marca=marca,
-            categoria=categoria,
+            marca_id=marca_id,
+            categoria_id=categoria_id,
             descripcion=data["descripcion"],
+            sku=sku,
             costo=data["costo"],
             precio=data["precio"],
             cantidad=data.get("cantidad", 0),
+            stock_minimo=data.get("stock_minimo"),
             imagen=data.get("imagen"),
         )
 
         db.session.add(p)
+        try:
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            if sku is not None:
+                # Otro request guardó el mismo sku entre la revisión y el INSERT
+                return jsonify({"error": f"ya existe un producto con sku {sku}"}), 409
+            return jsonify({"error": "el producto choca con datos existentes"}), 409
+
+        libro = LibroMovimientos(total=False)  # el INSERT ya lleva la cantidad
+        libro.registrar(p.id, p.cantidad or 0, "ajuste")
+        libro.guardar()
         db.session.commit()
 
         return jsonify({"id": p.id}), 201
 
 
 
+    @app.route("/productos/import", methods=["POST"])
+    def importar_catalogo_productos():
+        """
+        Importa productos en bloque desde CSV, JSON o NDJSON.
+
+        El archivo puede venir como cuerpo del request (Content-Type text/csv,
+        application/json o application/x-ndjson) o como campo 'archivo' de un
+        multipart. Se puede forzar el formato con ?formato=csv|json|ndjson.
+
+        Columnas: id (opcional, para actualizar), marca, categoria, descripcion,
+        sku, costo, precio, cantidad, stock_minimo, imagen. Marcas y categorías se
+        resuelven/crean por nombre en bloque.
+
+        Responde con el conteo de insertados/actualizados, las primeras filas
+        con error y el throughput (filas_por_segundo).
+        """
+        archivo = request.files.get("archivo")
+        if archivo is not None:
+            stream = archivo.stream
+            nombre = (archivo.filename or "").lower()
+            tipo = archivo.mimetype or ""
+        else:
+            stream = io.BufferedReader(request.stream)
+            nombre = ""
+            tipo = request.mimetype or ""
+
+        formato = request.args.get("formato")
+        if not formato:
+            if nombre.endswith(".csv") or tipo == "text/csv":
+                formato = "csv"
+            elif nombre.endswith(".ndjson") or tipo in ("application/x-ndjson", "application/jsonl"):
+                formato = "ndjson"
+            elif nombre.endswith(".json") or tipo == "application/json":
+                formato = "json"
+            else:
+                return jsonify({"error": "no se pudo detectar el formato; usa ?formato=csv|json|ndjson"}), 400
+
+        try:
+            resumen = importar_productos(leer_filas(stream, formato))
+        except (ValueError, UnicodeDecodeError) as e:
+            db.session.rollback()
+            return jsonify({"error": f"archivo inválido: {e}"}), 400
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({"error": "el archivo repite un sku que ya tiene otro producto"}), 409
+
+        invalidar_catalogo("productos")
+        marcar_stock()
+        db.session.commit()
+        return jsonify(resumen), 200
+
+
+    @app.route("/productos/export", methods=["GET"])
+    @solo_lectura
+    def exportar_catalogo_productos():
+        """
+        Exporta todo el catálogo de productos en streaming.
+        GET /productos/export?formato=csv   (default)
+        GET /productos/export?formato=json
+        """
+        formato = request.args.get("formato", "csv")
+        if formato == "csv":
+            generador, mimetype = exportar_csv(), "text/csv"
+        elif formato == "json":
+            generador, mimetype = exportar_json(), "application/json"
+        else:
+            return jsonify({"error": "formato debe ser 'csv' o 'json'"}), 400
+
+        return Response(
+            stream_with_context(generador),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename=productos.{formato}"},
+        )
+
+
+    @app.route("/productos/bulk", methods=["PATCH"])
+    @valida("actualizar_productos_bulk")
+    def actualizar_productos_bulk():
+        """
+        Ajusta precio/costo/cantidad de muchos productos con un solo UPDATE.
+
+        Espera JSON:
+        {
+          "filtro": {"categoria_id": 1, "marca_id": 2, "ids": [1, 2, 3]},  // se combinan con AND
+          "precio": {"porcentaje": 10},     // o {"monto": -5} o {"valor": 100}
+          "costo": {"monto": 2.5},          // opcional
+          "cantidad": {"monto": 10},        // opcional, queda en el kardex
+          "dry_run": true                   // opcional: solo cuenta los afectados
+        }
+        """
+        data = request.get_json()  # ya validado contra esquemas.PRODUCTOS_BULK
+        condicion, error = filtro_bulk(Producto, data["filtro"], ["categoria_id", "marca_id"])
+        if error:
+            return jsonify({"error": error}), 400
+
+        valores = {}
+        for campo in ("precio", "costo", "cantidad"):
+            if campo in data:
+                expr, error = expresion_ajuste(getattr(Producto, campo), data[campo], 0 if campo == "cantidad" else 2)
+                if error:
+                    return jsonify({"error": f"{campo}: {error}"}), 400
+                valores[campo] = expr
+        if not valores:
+            return jsonify({"error": "nada que actualizar: envía precio, costo y/o cantidad"}), 400
+
+        afectados = db.session.execute(select(func.count(Producto.id)).where(condicion)).scalar()
+        if data.get("dry_run"):
+            return jsonify({"dry_run": True, "afectados": afectados})
+
+        if "cantidad" in valores:
+            # Kardex y stock de la sucursal antes del UPDATE, también set-based.
+            # La diferencia contra el total se carga a la sucursal por defecto.
+            nueva = cast(valores["cantidad"], db.Integer)
+            sucursal = literal(app.config["SUCURSAL_DEFAULT_ID"])
+            db.session.execute(
+                insert(MovimientoInventario).from_select(
+                    ["producto_id", "tipo", "cantidad", "sucursal_id", "fecha"],
+                    select(
+                        Producto.id, literal("ajuste"), nueva - Producto.cantidad, sucursal,
+                        literal(datetime.utcnow(), db.DateTime),
+                    ).where(condicion, nueva != Producto.cantidad),
+                )
+            )
+            sumar_stock_sucursal(
+                select(sucursal, Producto.id, nueva - Producto.cantidad).where(condicion, nueva != Producto.cantidad)
+            )
+            valores["cantidad"] = nueva
+            marcar_stock()
+
+        registrar_consulta("productos", select(Producto.id).where(condicion), "update")
+        db.session.execute(
+            update(Producto).where(condicion).values(**valores).execution_options(synchronize_session=False)
+        )
+        invalidar_catalogo("productos")
+        db.session.commit()
+        return jsonify({"dry_run": False, "afectados": afectados})
+
+
     @app.route("/productos/<int:producto_id>", methods=["PUT", "PATCH"])
+    @valida("actualizar_producto")
     def actualizar_producto(producto_id):
         p = Producto.query.get_or_404(producto_id)
         data = request.get_json()
@@ -130,42 +829,48 @@ def create_app():
         if "descripcion" in data:
             p.descripcion = data["descripcion"]
 
+        if "sku" in data:
+            sku = normalizar_sku(data["sku"])
+            if sku is not None and sku_ocupado(sku, p.id):
+                return jsonify({"error": f"ya existe un producto con sku {sku}"}), 409
+            p.sku = sku
+
         # 🔹 Marca
         if "marca" in data:
             marca_nombre = data.get("marca")
-            if marca_nombre:
-                m = MarcaProducto.query.filter_by(nombre=marca_nombre).first()
-                if not m:
-                    m = MarcaProducto(nombre=marca_nombre)
-                    db.session.add(m)
-                    db.session.flush()
-                p.marca = m
-            else:
-                p.marca = None
+            p.marca_id = resolver_lookup(MarcaProducto, marca_nombre) if marca_nombre else None
 
         # 🔹 Categoría (ya la teníamos)
         if "categoria" in data:
             categoria_nombre = data.get("categoria")
-            if categoria_nombre:
-                cat = CategoriaProducto.query.filter_by(nombre=categoria_nombre).first()
-                if not cat:
-                    cat = CategoriaProducto(nombre=categoria_nombre)
-                    db.session.add(cat)
-                    db.session.flush()
-                p.categoria = cat
-            else:
-                p.categoria = None
+            p.categoria_id = resolver_lookup(CategoriaProducto, categoria_nombre) if categoria_nombre else None
 
         if "costo" in data:
             p.costo = data["costo"]
         if "precio" in data:
             p.precio = data["precio"]
         if "cantidad" in data:
-            p.cantidad = data["cantidad"]
+            # Fija el total: se lee con FOR UPDATE para que una venta concurrente no se pierda
+            actual = db.session.execute(
+                select(Producto.cantidad).where(Producto.id == p.id).with_for_update()
+            ).scalar() or 0
+            libro = LibroMovimientos()
+            libro.registrar(p.id, (data["cantidad"] or 0) - actual, "ajuste")
+            libro.guardar()
+        if "stock_minimo" in data:
+            p.stock_minimo = data["stock_minimo"]
         if "imagen" in data:
             p.imagen = data["imagen"]
 
-        db.session.commit()
+        sku = p.sku
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            if "sku" in data and sku is not None:
+                # Otro request guardó el mismo sku entre la revisión y el UPDATE
+                return jsonify({"error": f"ya existe un producto con sku {sku}"}), 409
+            return jsonify({"error": "el cambio choca con datos existentes"}), 409
 
         return jsonify({"message": "Producto actualizado"})
 
@@ -174,29 +879,120 @@ def create_app():
     def eliminar_producto(producto_id):
         p = Producto.query.get_or_404(producto_id)
         db.session.delete(p)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Kardex, snapshots, stock por sucursal e items de órdenes lo referencian:
+            # borrarlo rompería el historial
+            db.session.rollback()
+            return jsonify({
+                "error": "el producto tiene movimientos de inventario u órdenes asociadas; no se puede eliminar"
+            }), 409
         return jsonify({"message": "Producto eliminado"})
+
+
+    @app.route("/productos/<int:producto_id>/kardex", methods=["GET"])
+    @solo_lectura
+    def kardex_producto(producto_id):
+        """
+        Movimientos de inventario de un producto con saldo corrido.
+
+        Query params:
+        - inicio: fecha/hora ISO 8601 (default: hace 30 días)
+        - fin:    fecha/hora ISO 8601 (default: ahora)
+
+        El saldo inicial sale de snapshot + movimientos (ver stock_a_fecha),
+        no de recorrer todo el historial.
+        """
+        Producto.query.get_or_404(producto_id)
+
+        try:
+            inicio = parse_iso_datetime(request.args.get("inicio"))
+            fin = parse_iso_datetime(request.args.get("fin"))
+        except Exception:
+            return jsonify({"error": "parametros 'inicio' y 'fin' deben estar en formato ISO 8601"}), 400
+        fin = a_utc_naive(fin) if fin else datetime.utcnow()
+        inicio = a_utc_naive(inicio) if inicio else fin - timedelta(days=30)
+
+        saldo = stock_a_fecha(producto_id, inicio)
+        saldo_inicial = saldo
+
+        movimientos = (
+            MovimientoInventario.query
+            .filter(
+                MovimientoInventario.producto_id == producto_id,
+                MovimientoInventario.fecha > inicio,
+                MovimientoInventario.fecha <= fin,
+            )
+            .order_by(MovimientoInventario.fecha, MovimientoInventario.id)
+            .all()
+        )
+
+        data = []
+        for m in movimientos:
+            saldo += m.cantidad
+            data.append({
+                "id": m.id,
+                "fecha": m.fecha.isoformat(),
+                "tipo": m.tipo,
+                "cantidad": m.cantidad,
+                "orden_id": m.orden_id,
+                "saldo": saldo,
+            })
+
+        return jsonify({
+            "producto_id": producto_id,
+            "inicio": inicio.isoformat(),
+            "fin": fin.isoformat(),
+            "saldo_inicial": saldo_inicial,
+            "saldo_final": saldo,
+            "movimientos": data,
+        })
+
+
+    @app.route("/productos/<int:producto_id>/stock", methods=["GET"])
+    @solo_lectura
+    def stock_producto(producto_id):
+        """
+        Stock de un producto a una fecha dada.
+        GET /productos/1/stock?fecha=2025-11-01T00:00:00Z
+        """
+        p = Producto.query.get_or_404(producto_id)
+        fecha_str = request.args.get("fecha")
+        if not fecha_str:
+            return jsonify({"producto_id": p.id, "fecha": datetime.utcnow().isoformat(), "cantidad": p.cantidad})
+        try:
+            fecha = a_utc_naive(parse_iso_datetime(fecha_str))
+        except Exception:
+            return jsonify({"error": "parametro 'fecha' debe estar en formato ISO 8601"}), 400
+        return jsonify({
+            "producto_id": p.id,
+            "fecha": fecha.isoformat(),
+            "cantidad": stock_a_fecha(p.id, fecha),
+        })
+
+
+    @app.cli.command("snapshot-stock")
+    def snapshot_stock():
+        """Guarda una foto del stock actual (correr periódicamente, p. ej. cada noche)."""
+        n = tomar_snapshot()
+        db.session.commit()
+        click.echo(f"snapshot de {n} productos guardado")
     
         # ---------- CRUD SERVICIOS ----------
 
     @app.route("/servicios", methods=["GET"])
+    @solo_lectura
     def listar_servicios():
-        servicios = Servicio.query.all()
-        data = []
-        for s in servicios:
-            data.append({
-                "id": s.id,
-                "descripcion": s.descripcion,
-                "categoria": s.categoria.nombre if s.categoria else None,
-                "categoria_id": s.categoria.id if s.categoria else None,
-                "costo": float(s.costo),
-                "precio": float(s.precio),
-                "imagen": s.imagen,
-            })
-        return jsonify(data)
+        return respuesta_catalogo("servicios", construir_listado_servicios)
+
+    def construir_listado_servicios():
+        servicios = db.session.execute(consulta_servicios()).scalars()
+        return [servicio_listado_dict(s) for s in servicios]
 
 
     @app.route("/servicios/<int:servicio_id>", methods=["GET"])
+    @solo_lectura
     def obtener_servicio(servicio_id):
         s = Servicio.query.get_or_404(servicio_id)
         return jsonify({
@@ -207,36 +1003,30 @@ def create_app():
             "costo": float(s.costo),
             "precio": float(s.precio),
             "imagen": s.imagen,
+            "duracion_minutos": s.duracion_minutos,
         })
 
 
     @app.route("/servicios", methods=["POST"])
+    @valida("crear_servicio")
     def crear_servicio():
         data = request.get_json()
 
         # ===== CATEGORÍA =====
-        categoria = None
-
         categoria_id = data.get("categoria_id")
         if categoria_id is not None:
-            categoria = CategoriaServicio.query.get(categoria_id)
-            if not categoria:
+            if not CategoriaServicio.query.get(categoria_id):
                 return jsonify({"error": "categoria_id inválido"}), 400
-        else:
-            categoria_nombre = data.get("categoria")
-            if categoria_nombre:
-                categoria = CategoriaServicio.query.filter_by(nombre=str(categoria_nombre)).first()
-                if not categoria:
-                    categoria = CategoriaServicio(nombre=str(categoria_nombre))
-                    db.session.add(categoria)
-                    db.session.flush()
+        elif data.get("categoria"):
+            categoria_id = resolver_lookup(CategoriaServicio, data["categoria"])
 
         s = Servicio(
             descripcion=data["descripcion"],
             costo=data["costo"],
             precio=data["precio"],
             imagen=data.get("imagen"),
-            categoria=categoria,
+            categoria_id=categoria_id,
+            duracion_minutos=data.get("duracion_minutos"),
         )
 
         db.session.add(s)
@@ -245,7 +1035,43 @@ def create_app():
         return jsonify({"id": s.id}), 201
 
 
+    @app.route("/servicios/bulk", methods=["PATCH"])
+    @valida("actualizar_servicios_bulk")
+    def actualizar_servicios_bulk():
+        """
+        Igual que PATCH /productos/bulk pero para servicios.
+        filtro: categoria_id, ids. Campos: precio, costo.
+        """
+        data = request.get_json()  # ya validado contra esquemas.SERVICIOS_BULK
+        condicion, error = filtro_bulk(Servicio, data["filtro"], ["categoria_id"])
+        if error:
+            return jsonify({"error": error}), 400
+
+        valores = {}
+        for campo in ("precio", "costo"):
+            if campo in data:
+                expr, error = expresion_ajuste(getattr(Servicio, campo), data[campo])
+                if error:
+                    return jsonify({"error": f"{campo}: {error}"}), 400
+                valores[campo] = expr
+        if not valores:
+            return jsonify({"error": "nada que actualizar: envía precio y/o costo"}), 400
+
+        afectados = db.session.execute(select(func.count(Servicio.id)).where(condicion)).scalar()
+        if data.get("dry_run"):
+            return jsonify({"dry_run": True, "afectados": afectados})
+
+        registrar_consulta("servicios", select(Servicio.id).where(condicion), "update")
+        db.session.execute(
+            update(Servicio).where(condicion).values(**valores).execution_options(synchronize_session=False)
+        )
+        invalidar_catalogo("servicios")
+        db.session.commit()
+        return jsonify({"dry_run": False, "afectados": afectados})
+
+
     @app.route("/servicios/<int:servicio_id>", methods=["PUT", "PATCH"])
+    @valida("actualizar_servicio")
     def actualizar_servicio(servicio_id):
         s = Servicio.query.get_or_404(servicio_id)
         data = request.get_json()
@@ -254,15 +1080,7 @@ def create_app():
 
         if "categoria" in data:
             categoria_nombre = data.get("categoria")
-            if categoria_nombre:
-                cat = CategoriaServicio.query.filter_by(nombre=categoria_nombre).first()
-                if not cat:
-                    cat = CategoriaServicio(nombre=categoria_nombre)
-                    db.session.add(cat)
-                    db.session.flush()
-                s.categoria = cat
-            else:
-                s.categoria = None
+            s.categoria_id = resolver_lookup(CategoriaServicio, categoria_nombre) if categoria_nombre else None
 
         if "costo" in data:
             s.costo = data["costo"]
@@ -270,6 +1088,8 @@ def create_app():
             s.precio = data["precio"]
         if "imagen" in data:
             s.imagen = data["imagen"]
+        if "duracion_minutos" in data:
+            s.duracion_minutos = data["duracion_minutos"]
 
         db.session.commit()
 
@@ -284,95 +1104,13 @@ def create_app():
         return jsonify({"message": "Servicio eliminado"})
 
 
-    def parse_iso_datetime(value: str) -> datetime:
-        """
-        Intenta parsear un string ISO 8601. Si falla, devuelve ahora.
-        Soporta 'Z' al final (UTC).
-        """
-        if not value:
-            return datetime.utcnow()
-        try:
-            # Reemplazamos Z por +00:00 para que fromisoformat lo acepte
-            value = value.replace("Z", "+00:00")
-            return datetime.fromisoformat(value)
-        except Exception:
-            return datetime.utcnow()
-        
-
-    def producto_to_dict(p: Producto):
-        if p is None:
-            return None
-        return {
-            "id": p.id,
-            "descripcion": p.descripcion,
-            "precio": float(p.precio),
-            "categoria_id": p.categoria_id,
-            "marca_id": p.marca_id,
-        }
-
-    def servicio_to_dict(s: Servicio):
-        if s is None:
-            return None
-        return {
-            "id": s.id,
-            "descripcion": s.descripcion,
-            "precio": float(s.precio),
-            "categoria_id": s.categoria_id,
-        }
-
-
-    def orden_to_dict(orden: Orden):
-        return {
-            "id": orden.id,
-            "codigo": orden.codigo,
-            "fecha": orden.fecha.isoformat(),
-            "tipo_pago": orden.tipo_pago,
-            "referencia": orden.referencia,
-            "descuento": float(orden.descuento) if orden.descuento is not None else 0.0,
-            "total": float(orden.total) if orden.total is not None else 0.0,
-            "empleada": None,  # compat: ahora las empleadas van a nivel de item
-            "cliente": {
-                "id": orden.cliente.id,
-                "nombre": orden.cliente.nombre,
-                "telefono": orden.cliente.telefono,
-            },
-            "items": [
-                {
-                    "id": item.id,
-                    "tipo": item.tipo,
-                    "producto_id": item.producto_id,
-                    "servicio_id": item.servicio_id,
-                    "cantidad": item.cantidad,
-                    "precio_unitario": float(item.precio_unitario),
-                    "empleada": {
-                        "id": item.empleada.id,
-                        "nombre": item.empleada.nombre,
-                        "telefono": item.empleada.telefono,
-                    } if item.empleada else None,
-                    "producto": producto_to_dict(item.producto) if item.tipo == "producto" else None,
-                    "servicio": servicio_to_dict(item.servicio) if item.tipo == "servicio" else None,
-                }
-                for item in orden.items
-            ],
-        }
-
-    def parse_iso_datetime(value: str) -> datetime:
-        """
-        Convierte una cadena ISO 8601 a datetime.
-        Acepta 'Z' al final como UTC.
-        """
-        if not value:
-            return None
-        # si termina en 'Z', lo cambiamos a +00:00
-        if value.endswith("Z"):
-            value = value[:-1] + "+00:00"
-        return datetime.fromisoformat(value)
-
-
-
         # ---------- CRUD ORDENES ----------
 
+    def horizonte_archivo() -> datetime:
+        return db.session.execute(consulta_horizonte_archivo()).scalar() or datetime.min
+
     @app.route("/ordenes", methods=["GET"])
+    @solo_lectura
     def listar_ordenes():
         """
         Lista órdenes, opcionalmente filtradas por rango de fechas.
@@ -380,6 +1118,15 @@ def create_app():
         Query params:
         - inicio: fecha/hora ISO 8601 (ej: 2025-11-01T00:00:00Z)
         - fin:    fecha/hora ISO 8601 (ej: 2025-11-30T23:59:59Z)
+        - incluir_anuladas: true para incluir órdenes anuladas (default false)
+        - fields: claves a devolver, con punto para anidadas (ej: id,total,cliente.nombre)
+        - compacto: true para omitir claves en null
+        - vista=resumen: sin items, con num_items, subtotales y num_empleadas
+          (solo lee la tabla de órdenes y el nombre del cliente)
+        - sucursal_id: solo las órdenes de esa sucursal
+
+        Las órdenes de meses cerrados viven en ordenes_archivo; solo se
+        consultan si el rango pedido llega hasta ellas (o si no hay 'inicio').
 
         Ejemplos:
         GET /ordenes
@@ -387,8 +1134,9 @@ def create_app():
         """
         inicio_str = request.args.get("inicio")
         fin_str = request.args.get("fin")
+        incluir_anuladas = request.args.get("incluir_anuladas", "").lower() == "true"
 
-        query = Orden.query
+        inicio = fin = None
 
         # Filtro fecha inicio
         if inicio_str:
@@ -396,7 +1144,6 @@ def create_app():
                 inicio = parse_iso_datetime(inicio_str)
             except Exception:
                 return jsonify({"error": "parametro 'inicio' debe estar en formato ISO 8601"}), 400
-            query = query.filter(Orden.fecha >= inicio)
 
         # Filtro fecha fin
         if fin_str:
@@ -404,19 +1151,40 @@ def create_app():
                 fin = parse_iso_datetime(fin_str)
             except Exception:
                 return jsonify({"error": "parametro 'fin' debe estar en formato ISO 8601"}), 400
-            query = query.filter(Orden.fecha <= fin)
 
-        ordenes = query.order_by(Orden.fecha.desc()).all()
-        data = [orden_to_dict(o) for o in ordenes]
-        return jsonify(data)
+        resumen = request.args.get("vista") == "resumen"
+        sucursal_id = request.args.get("sucursal_id", type=int)
+
+        def leer(modelo):
+            if resumen:
+                return db.session.execute(
+                    consulta_ordenes_resumen(modelo, inicio, fin, incluir_anuladas, sucursal_id)
+                ).all()
+            return db.session.execute(
+                consulta_ordenes(modelo, inicio, fin, incluir_anuladas, sucursal_id)
+            ).scalars().all()
+
+        ordenes = leer(Orden)
+
+        # Poda: si el rango empieza después de lo archivado, no tocamos el archivo
+        if inicio is None or a_utc_naive(inicio) <= horizonte_archivo():
+            archivadas = leer(OrdenArchivo)
+            if archivadas:
+                ordenes = sorted(list(ordenes) + list(archivadas), key=lambda o: o.fecha, reverse=True)
+
+        a_dict = orden_resumen_dict if resumen else orden_to_dict
+        data = [a_dict(o) for o in ordenes]
+        return jsonify(recortar_segun(request.args, data))
 
 
     @app.route("/ordenes/<int:orden_id>", methods=["GET"])
+    @solo_lectura
     def obtener_orden(orden_id):
-        orden = Orden.query.get_or_404(orden_id)
+        orden = Orden.query.get(orden_id) or OrdenArchivo.query.get_or_404(orden_id)
         return jsonify(orden_to_dict(orden))
 
     @app.route("/ordenes", methods=["POST"])
+    @valida("crear_orden")
     def crear_orden():
         """
         Espera un JSON tipo:
@@ -427,6 +1195,7 @@ def create_app():
           "referencia": "TRX123",          // opcional
           "fecha": "2025-11-10T10:10:00Z",   // opcional
           "descuento": 25.50,                // opcional, descuento fijo en moneda
+          "sucursal_id": 2,                  // opcional (default SUCURSAL_DEFAULT_ID)
           "cliente": {
             "id": 1                      // OPCIÓN 1: cliente existente
           }
@@ -437,31 +1206,25 @@ def create_app():
           // },
           "items": [
             { "tipo": "producto", "producto_id": 1, "cantidad": 2, "precio_unitario": 250, "empleada_id": 1 },
+            { "tipo": "producto", "sku": "7501234567890", "cantidad": 1, "precio_unitario": 90, "empleada_id": 1 },
             { "tipo": "servicio", "servicio_id": 3, "cantidad": 1, "precio_unitario": 400, "empleada": { "nombre": "Ana", "telefono": "+502..." } }
           ]
         }
         """
-        data = request.get_json()
+        data = request.get_json()  # ya validado contra esquemas.ORDEN
 
         # 1) Cliente
-        cliente_data = data.get("cliente")
-        if not cliente_data:
-            return jsonify({"error": "cliente es requerido"}), 400
-
-        cliente = None
+        cliente_data = data["cliente"]
 
         # Si viene cliente.id, usamos cliente existente
-        if "id" in cliente_data:
+        if cliente_data.get("id") is not None:
             cliente = Cliente.query.get(cliente_data["id"])
             if not cliente:
                 return jsonify({"error": "cliente con ese id no existe"}), 400
         else:
             # Buscamos por telefono (y/o nombre). Si no existe, lo creamos.
-            nombre = cliente_data.get("nombre")
-            telefono = cliente_data.get("telefono")
-
-            if not nombre or not telefono:
-                return jsonify({"error": "cliente requiere nombre y telefono"}), 400
+            nombre = cliente_data["nombre"]
+            telefono = cliente_data["telefono"]
 
             cliente = Cliente.query.filter_by(telefono=telefono).first()
             if not cliente:
@@ -470,17 +1233,16 @@ def create_app():
                 db.session.flush()  # para tener cliente.id antes de crear la orden
 
         # 2) Orden
-        tipo_pago = data.get("tipo_pago")
-        if not tipo_pago:
-            return jsonify({"error": "tipo_pago es requerido"}), 400
+        tipo_pago = data["tipo_pago"]
         referencia = data.get("referencia")
-        codigo = data.get("codigo")
-        if not codigo:
-            return jsonify({"error": "codigo de orden es requerido"}), 400
+        codigo = data["codigo"]
 
         fecha_str = data.get("fecha")
         fecha = parse_iso_datetime(fecha_str) if fecha_str else datetime.utcnow()
-        descuento = max(float(data.get("descuento", 0) or 0), 0.0)
+        descuento = max(a_dinero(data.get("descuento") or 0), Decimal("0"))
+        sucursal_id = data.get("sucursal_id") or app.config["SUCURSAL_DEFAULT_ID"]
+        if not sucursal_activa(sucursal_id):
+            return jsonify({"error": "sucursal_id no existe o está inactiva"}), 400
 
         orden = Orden(
             codigo=codigo,
@@ -489,62 +1251,47 @@ def create_app():
             tipo_pago=tipo_pago,
             referencia=referencia,
             descuento=descuento,
+            sucursal_id=sucursal_id,
         )
         db.session.add(orden)
         db.session.flush()  # para tener orden.id
 
-        # 3) Items
-        items_data = data.get("items", [])
-        if not items_data:
-            return jsonify({"error": "debe incluir al menos un item en 'items'"}), 400
-
-        subtotal = 0.0
-        for item_data in items_data:
-            tipo = item_data.get("tipo")
+        # 3) Items (tipo, precio_unitario y empleada ya vienen en cada uno)
+        libro = LibroMovimientos(orden.sucursal_id)
+        nuevos = []
+        for item_data in data["items"]:
+            tipo = item_data["tipo"]
             cantidad = item_data.get("cantidad", 1)
-            precio_unitario = item_data.get("precio_unitario")
-            empleada = None
-
-            if tipo not in ("producto", "servicio"):
-                return jsonify({"error": "tipo de item debe ser 'producto' o 'servicio'"}), 400
-
-            if precio_unitario is None:
-                return jsonify({"error": "precio_unitario es requerido en cada item"}), 400
+            precio_unitario = a_dinero(item_data["precio_unitario"])
 
             # Resolver empleada por item (obligatorio)
             empleada_id = item_data.get("empleada_id")
-            empleada_data = item_data.get("empleada")
             if empleada_id is not None:
                 empleada = Empleada.query.get(empleada_id)
                 if not empleada:
                     return jsonify({"error": f"empleada {empleada_id} no existe"}), 400
-            elif empleada_data is not None:
-                nombre_emp = empleada_data.get("nombre")
-                tel_emp = empleada_data.get("telefono")
-                if not nombre_emp:
-                    return jsonify({"error": "empleada en item requiere al menos nombre"}), 400
+            else:
+                nombre_emp = item_data["empleada"]["nombre"]
+                tel_emp = item_data["empleada"].get("telefono")
                 q = Empleada.query.filter_by(nombre=nombre_emp)
                 if tel_emp:
                     q = q.filter_by(telefono=tel_emp)
                 empleada = q.first()
                 if not empleada:
-                    empleada = Empleada(nombre=nombre_emp, telefono=tel_emp)
+                    empleada = Empleada(nombre=nombre_emp, telefono=tel_emp, sucursal_id=orden.sucursal_id)
                     db.session.add(empleada)
                     db.session.flush()
-            else:
-                return jsonify({"error": "cada item requiere una empleada (empleada_id o empleada{...})"}), 400
 
             if tipo == "producto":
-                producto_id = item_data.get("producto_id")
-                if not producto_id:
-                    return jsonify({"error": "producto_id es requerido cuando tipo='producto'"}), 400
-                producto = Producto.query.get(producto_id)
-                if not producto:
-                    return jsonify({"error": f"producto {producto_id} no existe"}), 400
-                # Restar stock del producto según la cantidad solicitada
-                if producto.cantidad is not None and producto.cantidad < cantidad:
-                    return jsonify({"error": f"stock insuficiente para el producto {producto_id}"}), 400
-                producto.cantidad = (producto.cantidad or 0) - cantidad
+                producto, error = producto_de_item(item_data)
+                if error:
+                    return jsonify({"error": error}), 400
+                # La venta sale del stock de la sucursal de la orden; producto.cantidad es el total
+                if libro.disponible(producto.id) < cantidad:
+                    return jsonify({
+                        "error": f"stock insuficiente para el producto {producto.id} en la sucursal {orden.sucursal_id}"
+                    }), 400
+                libro.registrar(producto.id, -cantidad, "venta", orden.id)
 
                 orden_item = OrdenItem(
                     orden=orden,
@@ -555,9 +1302,7 @@ def create_app():
                     empleada=empleada,
                 )
             else:  # servicio
-                servicio_id = item_data.get("servicio_id")
-                if not servicio_id:
-                    return jsonify({"error": "servicio_id es requerido cuando tipo='servicio'"}), 400
+                servicio_id = item_data["servicio_id"]
                 servicio = Servicio.query.get(servicio_id)
                 if not servicio:
                     return jsonify({"error": f"servicio {servicio_id} no existe"}), 400
@@ -572,15 +1317,18 @@ def create_app():
                 )
 
             db.session.add(orden_item)
-            subtotal += (cantidad or 0) * float(precio_unitario)
+            nuevos.append(orden_item)
 
-        orden.total = max(subtotal - descuento, 0)
+        aplicar_resumen(orden, nuevos)
 
+        libro.guardar()
+        emitir("orden_creada", orden_evento_dict(orden))
         db.session.commit()
 
         return jsonify(orden_to_dict(orden)), 201
 
     @app.route("/ordenes/<int:orden_id>", methods=["PUT", "PATCH"])
+    @valida("actualizar_orden")
     def actualizar_orden(orden_id):
         """
         Permite actualizar:
@@ -591,7 +1339,10 @@ def create_app():
         - items (si se envía 'items', se reemplazan todos los items)
         """
         orden = Orden.query.get_or_404(orden_id)
-        data = request.get_json()
+        data = request.get_json()  # ya validado contra esquemas.ACTUALIZAR_ORDEN
+
+        if orden.anulada_en is not None:
+            return jsonify({"error": "no se puede modificar una orden anulada"}), 400
 
         if "codigo" in data:
             orden.codigo = data["codigo"]
@@ -600,15 +1351,13 @@ def create_app():
             orden.fecha = parse_iso_datetime(data["fecha"])
 
         if "tipo_pago" in data:
-            if not data["tipo_pago"]:
-                return jsonify({"error": "tipo_pago no puede ser vacío"}), 400
             orden.tipo_pago = data["tipo_pago"]
 
         if "referencia" in data:
             orden.referencia = data["referencia"]
 
         if "descuento" in data:
-            orden.descuento = max(float(data.get("descuento") or 0), 0.0)
+            orden.descuento = max(a_dinero(data.get("descuento") or 0), Decimal("0"))
 
         # Cliente (solo permitimos cambiar cliente por id para simplificar)
         if "cliente_id" in data:
@@ -618,59 +1367,50 @@ def create_app():
             orden.cliente = cliente
 
         # Reemplazar items si viene "items"
+        libro = LibroMovimientos(orden.sucursal_id)
         if "items" in data:
             # Borramos items actuales
             for item in list(orden.items):
                 if item.tipo == "producto" and item.producto:
-                    item.producto.cantidad = (item.producto.cantidad or 0) + item.cantidad
+                    libro.registrar(item.producto.id, item.cantidad, "devolucion", orden.id)
                 db.session.delete(item)
             db.session.flush()
 
             items_data = data["items"]
-            subtotal = 0.0
+            nuevos = []
             for item_data in items_data:
-                tipo = item_data.get("tipo")
+                tipo = item_data["tipo"]
                 cantidad = item_data.get("cantidad", 1)
-                precio_unitario = item_data.get("precio_unitario")
-                empleada = None
-
-                if tipo not in ("producto", "servicio"):
-                    return jsonify({"error": "tipo de item debe ser 'producto' o 'servicio'"}), 400
-
-                if precio_unitario is None:
-                    return jsonify({"error": "precio_unitario es requerido en cada item"}), 400
+                precio_unitario = a_dinero(item_data["precio_unitario"])
 
                 # Resolver empleada por item (obligatorio)
                 empleada_id = item_data.get("empleada_id")
-                empleada_data = item_data.get("empleada")
                 if empleada_id is not None:
                     empleada = Empleada.query.get(empleada_id)
                     if not empleada:
                         return jsonify({"error": f"empleada {empleada_id} no existe"}), 400
-                elif empleada_data is not None:
-                    nombre_emp = empleada_data.get("nombre")
-                    tel_emp = empleada_data.get("telefono")
-                    if not nombre_emp:
-                        return jsonify({"error": "empleada en item requiere al menos nombre"}), 400
+                else:
+                    nombre_emp = item_data["empleada"]["nombre"]
+                    tel_emp = item_data["empleada"].get("telefono")
                     q = Empleada.query.filter_by(nombre=nombre_emp)
                     if tel_emp:
                         q = q.filter_by(telefono=tel_emp)
                     empleada = q.first()
                     if not empleada:
-                        empleada = Empleada(nombre=nombre_emp, telefono=tel_emp)
+                        empleada = Empleada(nombre=nombre_emp, telefono=tel_emp, sucursal_id=orden.sucursal_id)
                         db.session.add(empleada)
                         db.session.flush()
-                else:
-                    return jsonify({"error": "cada item requiere una empleada (empleada_id o empleada{...})"}), 400
 
                 if tipo == "producto":
-                    producto_id = item_data.get("producto_id")
-                    producto = Producto.query.get(producto_id)
-                    if not producto:
-                        return jsonify({"error": f"producto {producto_id} no existe"}), 400
-                    if producto.cantidad is not None and producto.cantidad < cantidad:
-                        return jsonify({"error": f"stock insuficiente para el producto {producto_id}"}), 400
-                    producto.cantidad = (producto.cantidad or 0) - cantidad
+                    producto, error = producto_de_item(item_data)
+                    if error:
+                        return jsonify({"error": error}), 400
+                    # disponible() ya cuenta lo que devolvieron los items reemplazados
+                    if libro.disponible(producto.id) < cantidad:
+                        return jsonify({
+                            "error": f"stock insuficiente para el producto {producto.id} en la sucursal {orden.sucursal_id}"
+                        }), 400
+                    libro.registrar(producto.id, -cantidad, "venta", orden.id)
                     orden_item = OrdenItem(
                         orden=orden,
                         tipo="producto",
@@ -679,9 +1419,8 @@ def create_app():
                         precio_unitario=precio_unitario,
                         empleada=empleada,
                     )
-                    subtotal += (cantidad or 0) * float(precio_unitario)
                 else:
-                    servicio_id = item_data.get("servicio_id")
+                    servicio_id = item_data["servicio_id"]
                     servicio = Servicio.query.get(servicio_id)
                     if not servicio:
                         return jsonify({"error": f"servicio {servicio_id} no existe"}), 400
@@ -693,33 +1432,402 @@ def create_app():
                         precio_unitario=precio_unitario,
                         empleada=empleada,
                     )
-                    subtotal += (cantidad or 0) * float(precio_unitario)
 
                 db.session.add(orden_item)
+                nuevos.append(orden_item)
 
-            orden.total = max(subtotal - float(orden.descuento or 0), 0)
+            aplicar_resumen(orden, nuevos)
         elif "descuento" in data:
-            # Recalcular total con items existentes y nuevo descuento
-            subtotal = sum((item.cantidad or 0) * float(item.precio_unitario or 0) for item in orden.items)
-            orden.total = max(subtotal - float(orden.descuento or 0), 0)
+            # El subtotal ya está en la orden: no hace falta leer los items
+            orden.total = max(orden.subtotal - orden.descuento, Decimal("0"))
 
+        libro.guardar()
+        emitir("orden_actualizada", orden_evento_dict(orden))
         db.session.commit()
         return jsonify(orden_to_dict(orden))
 
     @app.route("/ordenes/<int:orden_id>", methods=["DELETE"])
     def eliminar_orden(orden_id):
+        """
+        Anula la orden (baja lógica): se marca anulada_en y se repone el stock.
+        La orden y sus items se conservan para auditoría.
+        """
         orden = Orden.query.get_or_404(orden_id)
-        # Reponer stock de productos antes de eliminar la orden
+        if orden.anulada_en is not None:
+            return jsonify({"error": "la orden ya está anulada"}), 400
+
+        # Reponer stock de productos antes de anular la orden
+        libro = LibroMovimientos(orden.sucursal_id)
         for item in orden.items:
             if item.tipo == "producto" and item.producto:
-                item.producto.cantidad = (item.producto.cantidad or 0) + item.cantidad
-        db.session.delete(orden)
+                libro.registrar(item.producto.id, item.cantidad, "devolucion", orden.id)
+        orden.anulada_en = datetime.utcnow()
+        libro.guardar()
+        emitir("orden_anulada", orden_evento_dict(orden))
+        db.session.commit()
+        return jsonify({"message": "Orden anulada"})
+
+    @app.cli.command("archivar-ordenes")
+    @click.option("--hasta", help="Primer mes que se queda caliente (YYYY-MM). "
+                                  "Default: según ORDENES_MESES_CALIENTES.")
+    def archivar_ordenes(hasta):
+        """Mueve las órdenes de meses cerrados a ordenes_archivo / orden_items_archivo."""
+        if hasta:
+            corte = datetime.strptime(hasta, "%Y-%m")
+        else:
+            hoy = datetime.utcnow()
+            meses = hoy.year * 12 + (hoy.month - 1) - (app.config["ORDENES_MESES_CALIENTES"] - 1)
+            corte = datetime(meses // 12, meses % 12 + 1, 1)
+
+        cols_orden = [c.name for c in OrdenArchivo.__table__.columns]
+        cols_item = [c.name for c in OrdenItemArchivo.__table__.columns]
+        ids_viejas = select(Orden.id).where(Orden.fecha < corte)
+
+        # Todo en una transacción y con sentencias set-based
+        n_ordenes = db.session.execute(
+            insert(OrdenArchivo.__table__).from_select(
+                cols_orden,
+                select(*[Orden.__table__.c[c] for c in cols_orden]).where(Orden.fecha < corte),
+            )
+        ).rowcount
+        db.session.execute(
+            insert(OrdenItemArchivo.__table__).from_select(
+                cols_item,
+                select(*[OrdenItem.__table__.c[c] for c in cols_item]).where(OrdenItem.orden_id.in_(ids_viejas)),
+            )
+        )
+        # Para los clientes que sincronizan, lo archivado sale de ordenes/orden_items
+        registrar_consulta("orden_items", select(OrdenItem.id).where(OrdenItem.orden_id.in_(ids_viejas)), "delete")
+        registrar_consulta("ordenes", ids_viejas, "delete")
+        db.session.execute(delete(OrdenItem.__table__).where(OrdenItem.orden_id.in_(ids_viejas)))
+        db.session.execute(delete(Orden.__table__).where(Orden.fecha < corte))
         db.session.commit()
-        return jsonify({"message": "Orden eliminada"})
+
+        click.echo(f"{n_ordenes} órdenes anteriores a {corte:%Y-%m} movidas al archivo")
+
+    @app.cli.command("conciliar-totales")
+    @click.option("--desde", help="Fecha inicial (YYYY-MM-DD), inclusive.")
+    @click.option("--hasta", help="Fecha final (YYYY-MM-DD), exclusive.")
+    @click.option("--corregir", is_flag=True, help="Reescribe ordenes.total con el valor calculado.")
+    def conciliar_totales(desde, hasta, corregir):
+        """
+        Recalcula el total de las órdenes del rango a partir de sus items
+        (SUM(cantidad * precio_unitario) - descuento) y lista las que no cuadran,
+        ya sea en el total o en las columnas de resumen.
+        Es una sola consulta con subconsultas correlacionadas (usa ix_orden_items_orden_id).
+        """
+        esperado = total_esperado()
+        resumen = resumen_sql()
+        filtros = [or_(
+            Orden.total != esperado,
+            Orden.num_items != resumen["num_items"],
+            Orden.subtotal != func.round(resumen["subtotal"], 2),
+            Orden.subtotal_productos != func.round(resumen["subtotal_productos"], 2),
+            Orden.num_empleadas != resumen["num_empleadas"],
+        )]
+        if desde:
+            filtros.append(Orden.fecha >= datetime.strptime(desde, "%Y-%m-%d"))
+        if hasta:
+            filtros.append(Orden.fecha < datetime.strptime(hasta, "%Y-%m-%d"))
+
+        if corregir:
+            registrar_consulta("ordenes", select(Orden.id).where(*filtros), "update")
+            n = db.session.execute(
+                update(Orden).where(*filtros).values(total=esperado, **resumen)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            click.echo(f"{n} órdenes corregidas")
+            return
+
+        descuadres = db.session.execute(
+            select(Orden.id, Orden.codigo, Orden.fecha, Orden.total, esperado.label("esperado"))
+            .where(*filtros)
+            .order_by(Orden.fecha)
+        ).all()
+        for d in descuadres:
+            click.echo(f"{d.codigo:20} {d.fecha:%Y-%m-%d %H:%M}  total={d.total}  esperado={a_dinero(d.esperado)}")
+        click.echo(f"{len(descuadres)} órdenes con total o resumen descuadrado")
+
+    # ---------- REPORTES ----------
+
+    def rango_reporte(dias_default=30):
+        """
+        inicio/fin de los query params (ISO 8601). Sin ellos: los últimos
+        `dias_default` días hasta el final del minuto actual (redondeado hacia
+        arriba, así la clave del cache no cambia en cada request y lo vendido
+        en este minuto entra). Lanza ValueError con el mensaje de error.
+        """
+        fechas = {}
+        for campo in ("inicio", "fin"):
+            try:
+                fechas[campo] = parse_iso_datetime(request.args.get(campo))
+            except ValueError:
+                raise ValueError(f"parametro '{campo}' debe estar en formato ISO 8601")
+        if fechas["fin"]:
+            fin = a_utc_naive(fechas["fin"])
+        else:
+            fin = datetime.utcnow().replace(second=0, microsecond=0) + timedelta(minutes=1)
+        inicio = a_utc_naive(fechas["inicio"]) if fechas["inicio"] else fin - timedelta(days=dias_default)
+        return inicio, fin
+
+    @app.route("/reportes/top", methods=["GET"])
+    @solo_lectura
+    def reporte_top():
+        """
+        Productos y servicios más vendidos del período.
+
+        Query params:
+        - inicio, fin: ISO 8601 (default: últimos 30 días)
+        - n: cuántos por tipo (default 10, máximo 100)
+        - criterio: ingresos | unidades (default ingresos)
+        - tipo: producto | servicio (default ambos)
+        - categoria_id: categoría del producto o servicio (requiere 'tipo')
+        - sucursal_id: solo las ventas de esa sucursal (default todas)
+
+        El resultado se cachea REPORTES_CACHE_TTL segundos por combinación de parámetros.
+        """
+        try:
+            inicio, fin = rango_reporte()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        n = min(max(request.args.get("n", 10, type=int), 1), 100)
+        criterio = request.args.get("criterio", "ingresos")
+        tipo = request.args.get("tipo")
+        categoria_id = request.args.get("categoria_id", type=int)
+        sucursal_id = request.args.get("sucursal_id", type=int)
+
+        if criterio not in CRITERIOS_TOP:
+            return jsonify({"error": "criterio debe ser 'ingresos' o 'unidades'"}), 400
+        if tipo not in (None, "producto", "servicio"):
+            return jsonify({"error": "tipo debe ser 'producto' o 'servicio'"}), 400
+        if categoria_id is not None and tipo is None:
+            return jsonify({"error": "categoria_id requiere 'tipo'"}), 400
+
+        clave = ("top", inicio, fin, n, criterio, tipo, categoria_id, sucursal_id)
+        data = en_cache(clave, lambda: top_vendidos(
+            inicio, fin, n, criterio, tipo, categoria_id, incluir_archivo=inicio <= horizonte_archivo(),
+            sucursal_id=sucursal_id,
+        ))
+        return jsonify({
+            "inicio": inicio.isoformat(),
+            "fin": fin.isoformat(),
+            "criterio": criterio,
+            **data,
+        })
+
+    @app.route("/reportes/corte", methods=["GET"])
+    @solo_lectura
+    def reporte_corte():
+        """
+        Corte de caja: órdenes, bruto, descuentos y neto por tipo_pago.
+
+        Query params:
+        - fecha: día del corte, YYYY-MM-DD en la zona de la tienda (default: hoy)
+        - inicio, fin: ISO 8601, para un turno en lugar de un día completo [inicio, fin)
+        - formato: json | csv (default json)
+        - detalle: true para el CSV con cada orden (codigo, referencia, montos)
+        - sucursal_id: corte de una sola sucursal (default todas)
+        """
+        zona = ZoneInfo(app.config["ZONA_HORARIA"])
+        if request.args.get("inicio") or request.args.get("fin"):
+            try:
+                inicio = parse_iso_datetime(request.args.get("inicio"))
+                fin = parse_iso_datetime(request.args.get("fin"))
+            except ValueError:
+                return jsonify({"error": "inicio y fin deben estar en formato ISO 8601"}), 400
+            if inicio is None or fin is None:
+                return jsonify({"error": "para un turno se requieren inicio y fin"}), 400
+            # Sin zona explícita se toma la hora local de la tienda
+            inicio, fin = (a_utc_naive(f if f.tzinfo else f.replace(tzinfo=zona)) for f in (inicio, fin))
+        else:
+            try:
+                dia = (
+                    datetime.strptime(request.args["fecha"], "%Y-%m-%d")
+                    if request.args.get("fecha") else datetime.now(zona).replace(tzinfo=None)
+                )
+            except ValueError:
+                return jsonify({"error": "fecha debe tener formato YYYY-MM-DD"}), 400
+            inicio = a_utc_naive(datetime(dia.year, dia.month, dia.day, tzinfo=zona))
+            fin = a_utc_naive(datetime(dia.year, dia.month, dia.day, tzinfo=zona) + timedelta(days=1))
+
+        formato = request.args.get("formato", "json")
+        if formato not in ("json", "csv"):
+            return jsonify({"error": "formato debe ser 'json' o 'csv'"}), 400
+
+        sucursal_id = request.args.get("sucursal_id", type=int)
+        incluir_archivo = inicio <= horizonte_archivo()
+        nombre = f"corte_{inicio:%Y%m%d%H%M}" + (f"_sucursal{sucursal_id}" if sucursal_id else "")
+        if request.args.get("detalle", "").lower() == "true":
+            return Response(
+                stream_with_context(corte_detalle_csv(inicio, fin, incluir_archivo, sucursal_id)),
+                mimetype="text/csv",
+                headers={"Content-Disposition": f"attachment; filename={nombre}_detalle.csv"},
+            )
+
+        corte = corte_caja(inicio, fin, incluir_archivo, sucursal_id)
+        if formato == "csv":
+            return Response(
+                stream_with_context(corte_csv(corte)),
+                mimetype="text/csv",
+                headers={"Content-Disposition": f"attachment; filename={nombre}.csv"},
+            )
+        return jsonify({"inicio": inicio.isoformat(), "fin": fin.isoformat(), **corte})
+
+    # ---------- CAMBIOS (sincronización incremental) ----------
+
+    @app.route("/cambios", methods=["GET"])
+    @solo_lectura
+    def listar_cambios():
+        """
+        Cambios posteriores a `desde` (el último seq que el cliente ya aplicó), en orden.
+        Query params:
+        - desde: seq (default 0 = desde el principio)
+        - limite: máximo de cambios por página (default 500, máx 1000)
+        - tablas: lista separada por comas para filtrar (ej. productos,servicios)
+        Responde con `siguiente` (el `desde` de la próxima llamada) y `hay_mas`.
+        Si `desde` es anterior a lo que se conserva (ver podar-cambios) responde
+        410 y el cliente tiene que volver a descargar todo.
+        """
+        try:
+            desde = int(request.args.get("desde", 0))
+            limite = min(int(request.args.get("limite", 500)), 1000)
+        except ValueError:
+            return jsonify({"error": "desde y limite deben ser enteros"}), 400
+        if desde < 0 or limite < 1:
+            return jsonify({"error": "desde debe ser >= 0 y limite >= 1"}), 400
+        tablas = [t.strip() for t in request.args.get("tablas", "").split(",") if t.strip()]
+
+        primero, ultimo = db.session.execute(select(func.min(Cambio.seq), func.max(Cambio.seq))).one()
+        if primero is not None and desde < primero - 1:
+            # `ultimo` sirve de `desde` después de descargar todo de nuevo
+            return jsonify({"error": "desde ya no está en la bitácora, hay que sincronizar todo", "ultimo": ultimo}), 410
+
+        cambios, hay_mas = cambios_desde(desde, limite, tablas or None)
+        return jsonify({
+            "cambios": cambios,
+            "siguiente": cambios[-1]["seq"] if cambios else desde,
+            "hay_mas": hay_mas,
+        })
+
+    @app.cli.command("podar-cambios")
+    @click.option("--dias", default=30, show_default=True, help="Conserva los cambios de los últimos N días.")
+    def podar_cambios(dias):
+        """Borra de la bitácora los cambios más viejos que --dias."""
+        corte = datetime.utcnow() - timedelta(days=dias)
+        n = db.session.execute(delete(Cambio.__table__).where(Cambio.fecha < corte)).rowcount
+        db.session.commit()
+        click.echo(f"{n} cambios anteriores a {corte:%Y-%m-%d} borrados")
+
+    # ---------- EVENTOS EN VIVO ----------
+
+    @app.route("/eventos", methods=["GET"])
+    def eventos():
+        """
+        Canal Server-Sent Events para no tener que hacer polling de /ordenes y /productos.
+        Query param `tipos` (separados por coma) para filtrar, ej.
+        GET /eventos?tipos=orden_creada,stock. Eventos: ver eventos.py.
+        Manda un comentario cada EVENTOS_HEARTBEAT segundos para mantener viva la
+        conexión. Con gunicorn cada conexión ocupa un thread (ver
+        EVENTOS_MAX_SUSCRIPTORES_WSGI); con asgi.py no.
+        """
+        if len(broker) >= app.config["EVENTOS_MAX_SUSCRIPTORES_WSGI"]:
+            return jsonify({"error": "demasiadas conexiones de eventos en este proceso"}), 503, {"Retry-After": "10"}
+        tipos = [t.strip() for t in request.args.get("tipos", "").split(",") if t.strip()]
+        iniciar_oyente(db.engine)
+        suscripcion = broker.agregar(Suscripcion(tipos))
+        espera = app.config["EVENTOS_HEARTBEAT"]
+
+        def generar():
+            yield "retry: 3000\n\n"
+            while True:
+                evento = suscripcion.siguiente(espera)
+                yield formato_sse(evento) if evento is not None else ": ping\n\n"
+
+        respuesta = Response(generar(), mimetype="text/event-stream", headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # que nginx no lo acumule
+        })
+        # El servidor cierra la respuesta cuando el cliente se desconecta (se nota en el siguiente yield)
+        respuesta.call_on_close(lambda: broker.quitar(suscripcion))
+        return respuesta
+
+    # ---------- TRABAJOS EN SEGUNDO PLANO ----------
+
+    @app.route("/trabajos", methods=["POST"])
+    @valida("crear_trabajo")
+    def crear_trabajo():
+        """
+        Encola un export o reporte pesado para `flask worker`.
+        Body JSON:
+        {
+          "tipo": "exportar_productos" | "corte_detalle" | "top_vendidos",
+          "parametros": {...}   // formato | inicio, fin | inicio, fin, n, criterio, tipo, categoria_id
+        }
+        Responde 202 con el trabajo; consultar GET /trabajos/<id> hasta que esté terminado.
+        """
+        data = request.get_json()  # ya validado contra esquemas.TRABAJO
+        try:
+            trabajo = encolar(data["tipo"], data.get("parametros") or {})
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        db.session.commit()
+        return jsonify(trabajo_to_dict(trabajo)), 202, {"Location": f"/trabajos/{trabajo.id}"}
+
+    @app.route("/trabajos", methods=["GET"])
+    def listar_trabajos():
+        """Los últimos trabajos (?estado=pendiente|en_curso|terminado|error, ?limite= máx 100)."""
+        try:
+            limite = max(1, min(int(request.args.get("limite", 20)), 100))
+        except ValueError:
+            return jsonify({"error": "limite debe ser entero"}), 400
+        query = select(Trabajo).order_by(Trabajo.id.desc()).limit(limite)
+        if request.args.get("estado"):
+            query = query.where(Trabajo.estado == request.args["estado"])
+        return jsonify([trabajo_to_dict(t) for t in db.session.execute(query).scalars()])
+
+    @app.route("/trabajos/<int:trabajo_id>", methods=["GET"])
+    def obtener_trabajo(trabajo_id):
+        trabajo = Trabajo.query.get_or_404(trabajo_id)
+        return jsonify(trabajo_to_dict(trabajo))
+
+    @app.route("/trabajos/<int:trabajo_id>/descarga", methods=["GET"])
+    def descargar_trabajo(trabajo_id):
+        """El archivo resultado, en streaming (acepta Range para reanudar)."""
+        trabajo = Trabajo.query.get_or_404(trabajo_id)
+        if trabajo.estado != "terminado":
+            return jsonify({"error": f"el trabajo está {trabajo.estado}", "estado": trabajo.estado}), 409
+        ruta = ruta_resultado(trabajo)
+        if not os.path.exists(ruta):
+            return jsonify({"error": "el archivo ya no existe (ver podar-trabajos)"}), 410
+        extension = trabajo.archivo.rsplit(".", 1)[-1]
+        return send_file(
+            ruta,
+            mimetype=MIMETYPES.get(extension, "application/octet-stream"),
+            as_attachment=True,
+            download_name=trabajo.archivo,
+            conditional=True,
+        )
+
+    @app.cli.command("worker")
+    @click.option("--una-vez", is_flag=True, help="Sale cuando la cola queda vacía.")
+    @click.option("--espera", type=float, help="Segundos entre sondeos con la cola vacía (default TRABAJOS_ESPERA).")
+    def worker(una_vez, espera):
+        """Ejecuta los trabajos encolados en POST /trabajos. Se pueden correr varios."""
+        nombre = f"{os.uname().nodename}:{os.getpid()}"
+        click.echo(f"worker {nombre} esperando trabajos")
+        trabajar(nombre, una_vez=una_vez, espera=espera, log=click.echo)
+
+    @app.cli.command("podar-trabajos")
+    @click.option("--dias", default=7, show_default=True, help="Conserva los trabajos de los últimos N días.")
+    def podar_trabajos_cmd(dias):
+        """Borra los trabajos terminados viejos y sus archivos."""
+        click.echo(f"{podar_trabajos(dias)} trabajos borrados")
 
         # ---------- CRUD USUARIOS ----------
 
     @app.route("/usuarios", methods=["GET"])
+    @solo_lectura
     def listar_usuarios():
         """
         Lista todos los usuarios.
@@ -738,6 +1846,7 @@ def create_app():
         return jsonify(data)
 
     @app.route("/usuarios/<int:usuario_id>", methods=["GET"])
+    @solo_lectura
     def obtener_usuario(usuario_id):
         """
         Retorna un usuario específico.
@@ -751,6 +1860,7 @@ def create_app():
         })
 
     @app.route("/usuarios", methods=["POST"])
+    @valida("crear_usuario")
     def crear_usuario():
         """
         Crea un usuario nuevo.
@@ -792,6 +1902,7 @@ def create_app():
         }), 201
 
     @app.route("/usuarios/<int:usuario_id>", methods=["PUT", "PATCH"])
+    @valida("actualizar_usuario")
     def actualizar_usuario(usuario_id):
         """
         Actualiza datos del usuario.
@@ -841,6 +1952,7 @@ def create_app():
         return jsonify({"message": "Usuario eliminado"})
 
     @app.route("/auth/login", methods=["POST"])
+    @valida("login")
     def login():
         """
         Login básico.
@@ -875,6 +1987,7 @@ def create_app():
     # ---------- CRUD CATEGORIAS PRODUCTOS ----------
 
     @app.route("/categorias-productos", methods=["GET"])
+    @solo_lectura
     def listar_categorias_productos():
         categorias = CategoriaProducto.query.order_by(CategoriaProducto.nombre).all()
         return jsonify([
@@ -883,12 +1996,14 @@ def create_app():
                 "nombre": c.nombre,
                 "descripcion": c.descripcion,
                 "activo": c.activo,
+                "stock_minimo": c.stock_minimo,
             }
             for c in categorias
         ])
 
 
     @app.route("/categorias-productos", methods=["POST"])
+    @valida("crear_categoria_producto")
     def crear_categoria_producto():
         data = request.get_json()
         nombre = data.get("nombre")
@@ -902,6 +2017,7 @@ def create_app():
             nombre=nombre,
             descripcion=data.get("descripcion"),
             activo=data.get("activo", True),
+            stock_minimo=data.get("stock_minimo"),
         )
         db.session.add(c)
         db.session.commit()
@@ -909,6 +2025,7 @@ def create_app():
 
 
     @app.route("/categorias-productos/<int:cat_id>", methods=["PUT", "PATCH"])
+    @valida("actualizar_categoria_producto")
     def actualizar_categoria_producto(cat_id):
         c = CategoriaProducto.query.get_or_404(cat_id)
         data = request.get_json()
@@ -925,7 +2042,11 @@ def create_app():
         if "activo" in data:
             c.activo = bool(data["activo"])
 
+        if "stock_minimo" in data:
+            c.stock_minimo = data["stock_minimo"]
+
         db.session.commit()
+        olvidar_lookups(CategoriaProducto)
         return jsonify({"message": "Categoría de producto actualizada"})
 
 
@@ -934,11 +2055,13 @@ def create_app():
         c = CategoriaProducto.query.get_or_404(cat_id)
         db.session.delete(c)
         db.session.commit()
+        olvidar_lookups(CategoriaProducto)
         return jsonify({"message": "Categoría de producto eliminada"})
     
     # ---------- CRUD CATEGORIAS SERVICIOS ----------
 
     @app.route("/categorias-servicios", methods=["GET"])
+    @solo_lectura
     def listar_categorias_servicios():
         categorias = CategoriaServicio.query.order_by(CategoriaServicio.nombre).all()
         return jsonify([
@@ -953,6 +2076,7 @@ def create_app():
 
 
     @app.route("/categorias-servicios", methods=["POST"])
+    @valida("crear_categoria_servicio")
     def crear_categoria_servicio():
         data = request.get_json()
         nombre = data.get("nombre")
@@ -973,6 +2097,7 @@ def create_app():
 
 
     @app.route("/categorias-servicios/<int:cat_id>", methods=["PUT", "PATCH"])
+    @valida("actualizar_categoria_servicio")
     def actualizar_categoria_servicio(cat_id):
         c = CategoriaServicio.query.get_or_404(cat_id)
         data = request.get_json()
@@ -990,6 +2115,7 @@ def create_app():
             c.activo = bool(data["activo"])
 
         db.session.commit()
+        olvidar_lookups(CategoriaServicio)
         return jsonify({"message": "Categoría de servicio actualizada"})
 
 
@@ -998,12 +2124,14 @@ def create_app():
         c = CategoriaServicio.query.get_or_404(cat_id)
         db.session.delete(c)
         db.session.commit()
+        olvidar_lookups(CategoriaServicio)
         return jsonify({"message": "Categoría de servicio eliminada"})
 
 
     # ---------- CRUD MARCAS PRODUCTOS ----------
 
     @app.route("/marcas-productos", methods=["GET"])
+    @solo_lectura
     def listar_marcas_productos():
         marcas = MarcaProducto.query.order_by(MarcaProducto.nombre).all()
         return jsonify([
@@ -1018,6 +2146,7 @@ def create_app():
 
 
     @app.route("/marcas-productos", methods=["POST"])
+    @valida("crear_marca_producto")
     def crear_marca_producto():
         data = request.get_json()
         nombre = data.get("nombre")
@@ -1038,6 +2167,7 @@ def create_app():
 
 
     @app.route("/marcas-productos/<int:marca_id>", methods=["PUT", "PATCH"])
+    @valida("actualizar_marca_producto")
     def actualizar_marca_producto(marca_id):
         m = MarcaProducto.query.get_or_404(marca_id)
         data = request.get_json()
@@ -1055,6 +2185,7 @@ def create_app():
             m.activo = bool(data["activo"])
 
         db.session.commit()
+        olvidar_lookups(MarcaProducto)
         return jsonify({"message": "Marca de producto actualizada"})
 
 
@@ -1063,40 +2194,421 @@ def create_app():
         m = MarcaProducto.query.get_or_404(marca_id)
         db.session.delete(m)
         db.session.commit()
+        olvidar_lookups(MarcaProducto)
         return jsonify({"message": "Marca de producto eliminada"})
 
 
+    # =========================
+    # SUCURSALES
+    # =========================
+
+    def sucursal_to_dict(s):
+        return {
+            "id": s.id,
+            "nombre": s.nombre,
+            "direccion": s.direccion,
+            "telefono": s.telefono,
+            "activo": s.activo,
+            "creado_en": s.creado_en.isoformat(),
+        }
+
+    @app.route("/sucursales", methods=["GET"])
+    @solo_lectura
+    def listar_sucursales():
+        """Lista las sucursales. Opcional: ?solo_activas=true"""
+        query = Sucursal.query
+        if request.args.get("solo_activas", "").lower() == "true":
+            query = query.filter(Sucursal.activo.is_(True))
+        return jsonify([sucursal_to_dict(s) for s in query.order_by(Sucursal.nombre.asc())]), 200
+
+
+    @app.route("/sucursales/<int:sucursal_id>", methods=["GET"])
+    @solo_lectura
+    def obtener_sucursal(sucursal_id):
+        return jsonify(sucursal_to_dict(Sucursal.query.get_or_404(sucursal_id))), 200
+
+
+    @app.route("/sucursales", methods=["POST"])
+    @valida("crear_sucursal")
+    def crear_sucursal():
+        """
+        Body JSON:
+        {
+        "nombre": "Zona 10",
+        "direccion": "...",   # opcional
+        "telefono": "...",    # opcional
+        "activo": true        # opcional (default True)
+        }
+        """
+        data = request.get_json() or {}
+        nombre = (data.get("nombre") or "").strip()
+        if not nombre:
+            return jsonify({"error": "nombre es obligatorio"}), 400
+        if Sucursal.query.filter_by(nombre=nombre).first():
+            return jsonify({"error": "ya existe una sucursal con ese nombre"}), 400
+
+        nueva = Sucursal(
+            nombre=nombre,
+            direccion=data.get("direccion"),
+            telefono=data.get("telefono"),
+            activo=bool(data.get("activo", True)),
+        )
+        db.session.add(nueva)
+        db.session.commit()
+        return jsonify(sucursal_to_dict(nueva)), 201
+
+
+    @app.route("/sucursales/<int:sucursal_id>", methods=["PUT", "PATCH"])
+    @valida("actualizar_sucursal")
+    def actualizar_sucursal(sucursal_id):
+        """
+        Campos opcionales: nombre, direccion, telefono, activo.
+        No se borran sucursales: tienen órdenes y kardex; se desactivan con activo=false.
+        """
+        sucursal = Sucursal.query.get_or_404(sucursal_id)
+        data = request.get_json() or {}
+
+        if data.get("nombre"):
+            nombre = data["nombre"].strip()
+            otra = Sucursal.query.filter_by(nombre=nombre).first()
+            if otra and otra.id != sucursal.id:
+                return jsonify({"error": "ya existe una sucursal con ese nombre"}), 400
+            sucursal.nombre = nombre
+        if "direccion" in data:
+            sucursal.direccion = data["direccion"]
+        if "telefono" in data:
+            sucursal.telefono = data["telefono"]
+        if "activo" in data:
+            sucursal.activo = bool(data["activo"])
+
+        db.session.commit()
+        return jsonify(sucursal_to_dict(sucursal)), 200
+
+
+    @app.route("/sucursales/<int:sucursal_id>/stock", methods=["GET"])
+    @solo_lectura
+    def stock_sucursal(sucursal_id):
+        """
+        Existencias de la sucursal (solo productos con fila en stock_sucursales).
+        Opcional: ?bajo_minimo=true para las que están en o bajo el stock mínimo.
+        Lee un rango de la PK (sucursal_id, producto_id).
+        """
+        Sucursal.query.get_or_404(sucursal_id)
+        query = (
+            select(StockSucursal.producto_id, Producto.descripcion, StockSucursal.cantidad)
+            .join(Producto, Producto.id == StockSucursal.producto_id)
+            .where(StockSucursal.sucursal_id == sucursal_id)
+            .order_by(StockSucursal.producto_id)
+        )
+        if request.args.get("bajo_minimo", "").lower() == "true":
+            query = query.where(
+                StockSucursal.cantidad <= func.coalesce(Producto.stock_minimo, app.config["STOCK_MINIMO_DEFAULT"])
+            )
+        return jsonify(recortar_segun(request.args, [
+            {"producto_id": producto_id, "descripcion": descripcion, "cantidad": cantidad}
+            for producto_id, descripcion, cantidad in db.session.execute(query)
+        ])), 200
+
+
+    @app.route("/sucursales/<int:sucursal_id>/stock/<int:producto_id>", methods=["PUT"])
+    @valida("ajustar_stock_sucursal")
+    def ajustar_stock_sucursal(sucursal_id, producto_id):
+        """
+        Fija el stock de un producto en la sucursal (conteo físico).
+        Body JSON: {"cantidad": 12}
+        La diferencia queda en el kardex como 'ajuste' de esa sucursal y se
+        aplica también al total del producto.
+        """
+        Sucursal.query.get_or_404(sucursal_id)
+        producto = Producto.query.get_or_404(producto_id)
+        cantidad = request.get_json()["cantidad"]
+
+        actual = stock_en_sucursal(sucursal_id, producto_id, bloquear=True)
+        libro = LibroMovimientos(sucursal_id)
+        libro.registrar(producto.id, cantidad - actual, "ajuste")
+        libro.guardar()
+        db.session.commit()
+
+        return jsonify({"sucursal_id": sucursal_id, "producto_id": producto_id, "cantidad": cantidad}), 200
+
+
+    # =========================
+    # CITAS
+    # =========================
+
+    def fecha_local_a_utc(valor):
+        """ISO 8601; sin zona explícita se toma la hora local de la tienda."""
+        fecha = parse_iso_datetime(valor)
+        return a_utc_naive(fecha if fecha.tzinfo else fecha.replace(tzinfo=ZoneInfo(app.config["ZONA_HORARIA"])))
+
+    def dia_pedido():
+        """?fecha=YYYY-MM-DD en la zona de la tienda (default hoy). ValueError si no es válida."""
+        if request.args.get("fecha"):
+            return datetime.strptime(request.args["fecha"], "%Y-%m-%d").date()
+        return datetime.now(ZoneInfo(app.config["ZONA_HORARIA"])).date()
+
+    def leer_duracion(valor):
+        """Minutos -> timedelta (ValueError si no es entero positivo o pasa de MAX_DURACION)."""
+        duracion = timedelta(minutes=int(valor))
+        if not timedelta(0) < duracion <= MAX_DURACION:
+            raise ValueError
+        return duracion
+
+    @app.route("/disponibilidad", methods=["GET"])
+    @solo_lectura
+    def ver_disponibilidad():
+        """
+        Turnos libres para un servicio en un día, por empleada.
+
+        Query params:
+        - servicio_id: requerido
+        - fecha: YYYY-MM-DD en la zona de la tienda (default hoy)
+        - sucursal_id: default SUCURSAL_DEFAULT_ID
+        - empleada_id: solo esa empleada
+        - duracion_minutos: default la del servicio (o CITAS_DURACION_DEFAULT)
+
+        Solo salen las empleadas que hacen el servicio (ver /empleadas/<id>/servicios).
+
+        Respuesta: [{"empleada_id", "nombre", "horarios": ["2026-10-24T15:00:00", ...]}]
+        con los inicios en UTC, cada CITAS_PASO_MINUTOS.
+        """
+        servicio_id = request.args.get("servicio_id", type=int)
+        servicio = db.session.get(Servicio, servicio_id) if servicio_id is not None else None
+        if servicio is None:
+            return jsonify({"error": "servicio_id es requerido y debe existir"}), 400
+        try:
+            dia = dia_pedido()
+        except ValueError:
+            return jsonify({"error": "fecha debe tener formato YYYY-MM-DD"}), 400
+        try:
+            duracion = (
+                leer_duracion(request.args["duracion_minutos"]) if request.args.get("duracion_minutos")
+                else duracion_de([servicio])
+            )
+        except ValueError:
+            return jsonify({"error": "duracion_minutos debe ser un entero positivo"}), 400
+
+        sucursal_id = request.args.get("sucursal_id", app.config["SUCURSAL_DEFAULT_ID"], type=int)
+        empleada_id = request.args.get("empleada_id", type=int)
+        data = disponibilidad(sucursal_id, dia, duracion, [empleada_id] if empleada_id else None, [servicio.id])
+        return jsonify(data), 200
+
+
+    @app.route("/citas", methods=["GET"])
+    @solo_lectura
+    def listar_citas():
+        """
+        Citas de un día, por hora de inicio.
+
+        Query params:
+        - fecha: YYYY-MM-DD en la zona de la tienda (default hoy)
+        - sucursal_id, empleada_id: filtros opcionales
+        - incluir_canceladas: true para incluirlas (default false)
+        """
+        try:
+            dia = dia_pedido()
+        except ValueError:
+            return jsonify({"error": "fecha debe tener formato YYYY-MM-DD"}), 400
+        inicio, fin = rango_del_dia(dia)
+
+        query = select(Cita).where(Cita.inicio >= inicio, Cita.inicio < fin)
+        sucursal_id = request.args.get("sucursal_id", type=int)
+        empleada_id = request.args.get("empleada_id", type=int)
+        if sucursal_id is not None:
+            query = query.where(Cita.sucursal_id == sucursal_id)
+        if empleada_id is not None:
+            query = query.where(Cita.empleada_id == empleada_id)
+        if request.args.get("incluir_canceladas", "").lower() != "true":
+            query = query.where(Cita.estado != "cancelada")
+
+        citas = db.session.execute(query.order_by(Cita.inicio, Cita.id)).scalars()
+        return jsonify(recortar_segun(request.args, [cita_to_dict(c) for c in citas])), 200
+
+
+    @app.route("/citas/<int:cita_id>", methods=["GET"])
+    @solo_lectura
+    def obtener_cita(cita_id):
+        return jsonify(cita_to_dict(Cita.query.get_or_404(cita_id))), 200
+
+
+    def guardar_cita(cita, dias_afectados):
+        """Commit con el choque como 409 (en Postgres lo detecta el EXCLUDE aunque dos reservas corran a la vez)."""
+        try:
+            db.session.flush()
+            ocupada = cita.estado != "cancelada" and choques(cita.empleada_id, cita.inicio, cita.fin, cita.id)
+            if not ocupada:
+                db.session.commit()
+        except IntegrityError:
+            ocupada = True
+        if ocupada:
+            db.session.rollback()
+            return jsonify({"error": "la empleada ya tiene una cita en ese horario"}), 409
+        for sucursal_id, fecha in dias_afectados:
+            invalidar_agenda(sucursal_id, fecha)
+        return None
+
+
+    @app.route("/citas", methods=["POST"])
+    @valida("crear_cita")
+    def crear_cita():
+        """
+        Agenda una cita.
+        Body JSON:
+        {
+          "empleada_id": 3,
+          "servicio_id": 7,
+          "inicio": "2026-10-24T09:30:00",   // sin zona = hora de la tienda
+          "duracion_minutos": 45,            // opcional (default la del servicio)
+          "cliente_id": 12,                  // opcional
+          "notas": "..."                     // opcional
+        }
+        La sucursal es la de la empleada, que tiene que hacer el servicio.
+        409 si la empleada ya está ocupada.
+        """
+        data = request.get_json() or {}
+
+        empleada = db.session.get(Empleada, data["empleada_id"]) if data.get("empleada_id") else None
+        if not empleada or not empleada.activo:
+            return jsonify({"error": "empleada_id no existe o está inactiva"}), 400
+        servicio = db.session.get(Servicio, data["servicio_id"]) if data.get("servicio_id") else None
+        if not servicio:
+            return jsonify({"error": "servicio_id no existe"}), 400
+        if not db.session.get(EmpleadaServicio, (empleada.id, servicio.id)):
+            return jsonify({"error": "la empleada no hace ese servicio"}), 400
+        if data.get("cliente_id") is not None and not db.session.get(Cliente, data["cliente_id"]):
+            return jsonify({"error": "cliente_id no existe"}), 400
+        try:
+            inicio = fecha_local_a_utc(data.get("inicio"))
+        except (AttributeError, TypeError, ValueError):
+            return jsonify({"error": "inicio es requerido en formato ISO 8601"}), 400
+        try:
+            duracion = (
+                leer_duracion(data["duracion_minutos"]) if data.get("duracion_minutos") else duracion_de([servicio])
+            )
+        except (TypeError, ValueError):
+            return jsonify({"error": "duracion_minutos debe ser un entero positivo"}), 400
+
+        cita = Cita(
+            sucursal_id=empleada.sucursal_id,
+            empleada_id=empleada.id,
+            servicio_id=data["servicio_id"],
+            cliente_id=data.get("cliente_id"),
+            inicio=inicio,
+            fin=inicio + duracion,
+            notas=data.get("notas"),
+        )
+        db.session.add(cita)
+
+        error = guardar_cita(cita, [(cita.sucursal_id, cita.inicio)])
+        if error:
+            return error
+        return jsonify(cita_to_dict(cita)), 201
+
+
+    @app.route("/citas/<int:cita_id>", methods=["PUT", "PATCH"])
+    @valida("actualizar_cita")
+    def actualizar_cita(cita_id):
+        """
+        Reprograma o cambia el estado de una cita.
+        Campos opcionales: empleada_id, inicio, duracion_minutos, estado
+        (agendada | completada | cancelada), notas.
+        """
+        cita = Cita.query.get_or_404(cita_id)
+        data = request.get_json() or {}
+        antes = (cita.sucursal_id, cita.inicio)
+
+        if "estado" in data:
+            if data["estado"] not in ESTADOS_CITA:
+                return jsonify({"error": f"estado debe ser uno de {', '.join(ESTADOS_CITA)}"}), 400
+            cita.estado = data["estado"]
+        if "notas" in data:
+            cita.notas = data["notas"]
+        if data.get("empleada_id") is not None:
+            empleada = db.session.get(Empleada, data["empleada_id"])
+            if not empleada or not empleada.activo:
+                return jsonify({"error": "empleada_id no existe o está inactiva"}), 400
+            if not db.session.get(EmpleadaServicio, (empleada.id, cita.servicio_id)):
+                return jsonify({"error": "la empleada no hace ese servicio"}), 400
+            cita.empleada_id = empleada.id
+            cita.sucursal_id = empleada.sucursal_id
+        if "inicio" in data or "duracion_minutos" in data:
+            try:
+                inicio = fecha_local_a_utc(data["inicio"]) if "inicio" in data else cita.inicio
+                duracion = (
+                    leer_duracion(data["duracion_minutos"]) if "duracion_minutos" in data else cita.fin - cita.inicio
+                )
+            except (AttributeError, TypeError, ValueError):
+                return jsonify({"error": "inicio debe ser ISO 8601 y duracion_minutos un entero positivo"}), 400
+            cita.inicio, cita.fin = inicio, inicio + duracion
+
+        error = guardar_cita(cita, [antes, (cita.sucursal_id, cita.inicio)])
+        if error:
+            return error
+        return jsonify(cita_to_dict(cita)), 200
+
+
+    @app.route("/asignacion", methods=["GET"])
+    @solo_lectura
+    def sugerir_asignacion():
+        """
+        Empleadas que pueden atender un conjunto de servicios, de menos a más
+        cargada (items de órdenes de hoy en la sucursal).
+
+        Query params:
+        - servicio_ids: ids separados por coma (requerido)
+        - sucursal_id: default SUCURSAL_DEFAULT_ID
+        - inicio: ISO 8601 (sin zona = hora de la tienda). Si viene, se quitan
+          las que tienen una cita en [inicio, inicio + duración de los servicios)
+          y la carga es la de ese día.
+        """
+        try:
+            servicio_ids = {int(x) for x in request.args.get("servicio_ids", "").split(",") if x.strip()}
+        except ValueError:
+            return jsonify({"error": "servicio_ids debe ser una lista de enteros separados por coma"}), 400
+        if not servicio_ids:
+            return jsonify({"error": "servicio_ids es requerido"}), 400
+        servicios = db.session.execute(select(Servicio).where(Servicio.id.in_(servicio_ids))).scalars().all()
+        if len(servicios) != len(servicio_ids):
+            faltan = servicio_ids - {s.id for s in servicios}
+            return jsonify({"error": f"servicios que no existen: {sorted(faltan)}"}), 400
+
+        duracion = duracion_de(servicios)
+        inicio = fin = None
+        if request.args.get("inicio"):
+            try:
+                inicio = fecha_local_a_utc(request.args["inicio"])
+            except ValueError:
+                return jsonify({"error": "inicio debe estar en formato ISO 8601"}), 400
+            fin = inicio + duracion
+
+        sucursal_id = request.args.get("sucursal_id", app.config["SUCURSAL_DEFAULT_ID"], type=int)
+        return jsonify({
+            "servicio_ids": sorted(servicio_ids),
+            "duracion_minutos": int(duracion.total_seconds() // 60),
+            "inicio": inicio.isoformat() if inicio else None,
+            "fin": fin.isoformat() if fin else None,
+            "empleadas": ranking_asignacion(servicio_ids, sucursal_id, inicio, fin),
+        }), 200
+
+
     # =========================
     # CRUD CLIENTES
     # =========================
 
     @app.route("/clientes", methods=["GET"])
+    @solo_lectura
     def listar_clientes():
         """
         Lista todos los clientes.
         Opcional: ?q=texto para filtrar por nombre (para el Autocomplete).
         """
         q = request.args.get("q", type=str)
-
-        query = Cliente.query
-        if q:
-            # filtra por nombre que contenga 'q' (case-insensitive)
-            like = f"%{q}%"
-            query = query.filter(Cliente.nombre.ilike(like))
-
-        clientes = query.order_by(Cliente.nombre.asc()).all()
-
-        return jsonify([
-            {
-                "id": c.id,
-                "nombre": c.nombre,
-                "telefono": c.telefono,
-            }
-            for c in clientes
-        ]), 200
+        clientes = db.session.execute(consulta_clientes(q)).scalars()
+        return jsonify(recortar_segun(request.args, [cliente_to_dict(c) for c in clientes])), 200
 
 
     @app.route("/clientes/<int:cliente_id>", methods=["GET"])
+    @solo_lectura
     def obtener_cliente(cliente_id):
         """
         Obtener un cliente por ID.
@@ -1108,8 +2620,126 @@ def create_app():
             "telefono": cliente.telefono,
         }), 200
 
+    @app.route("/clientes/<int:cliente_id>/historial", methods=["GET"])
+    @solo_lectura
+    def historial_cliente(cliente_id):
+        """
+        Órdenes de la clienta, de la más reciente a la más antigua (vista resumen,
+        sin items), paginadas por cursor sobre ix_ordenes_cliente_fecha.
+
+        Query params:
+        - limite: órdenes por página (default 20, máximo 100)
+        - cursor: el valor de "siguiente" de la página anterior
+        - incluir_anuladas: true para incluir órdenes anuladas (default false)
+
+        Respuesta: {"ordenes": [...], "siguiente": "<cursor>" | null}
+        """
+        Cliente.query.get_or_404(cliente_id)
+        limite = min(max(request.args.get("limite", 20, type=int), 1), 100)
+        incluir_anuladas = request.args.get("incluir_anuladas", "").lower() == "true"
+
+        desde = None
+        if request.args.get("cursor"):
+            fecha_str, _, id_str = request.args["cursor"].rpartition("_")
+            try:
+                desde = (datetime.fromisoformat(fecha_str), int(id_str))
+            except ValueError:
+                return jsonify({"error": "cursor no válido"}), 400
+
+        def pagina(modelo, n):
+            query = (
+                consulta_ordenes_resumen(modelo, incluir_anuladas=incluir_anuladas)
+                .where(modelo.cliente_id == cliente_id)
+                .order_by(modelo.id.desc())
+                .limit(n)
+            )
+            if desde is not None:
+                fecha, orden_id = desde
+                # fecha <= x acota el rango del índice; el OR desempata por id
+                query = query.where(
+                    modelo.fecha <= fecha,
+                    or_(modelo.fecha < fecha, modelo.id < orden_id),
+                )
+            return db.session.execute(query).all()
+
+        # Pedimos una de más para saber si hay otra página
+        filas = pagina(Orden, limite + 1)
+        if len(filas) <= limite:
+            # Lo archivado es siempre más viejo que lo caliente: solo hace falta
+            # si la página no se llenó con órdenes calientes
+            filas += pagina(OrdenArchivo, limite + 1 - len(filas))
+
+        siguiente = None
+        if len(filas) > limite:
+            filas = filas[:limite]
+            siguiente = f"{filas[-1].fecha.isoformat()}_{filas[-1].id}"
+
+        return jsonify({
+            "ordenes": recortar_segun(request.args, [orden_resumen_dict(f) for f in filas]),
+            "siguiente": siguiente,
+        }), 200
+
+    @app.route("/clientes/<int:cliente_id>/resumen", methods=["GET"])
+    @solo_lectura
+    def resumen_cliente(cliente_id):
+        """
+        Resumen de la clienta para mostrar en caja: visitas, primera y última
+        visita, total gastado, ticket promedio y sus servicios más frecuentes.
+        Cuenta también las órdenes archivadas; no cuenta las anuladas.
+
+        Query params:
+        - favoritos: cuántos servicios devolver (default 3)
+        """
+        cliente = Cliente.query.get_or_404(cliente_id)
+
+        # Una sola agregación sobre ordenes + ordenes_archivo (índice por cliente_id, fecha)
+        ordenes = union_all(*[
+            select(modelo.fecha, modelo.total)
+            .where(modelo.cliente_id == cliente_id, modelo.anulada_en.is_(None))
+            for modelo in (Orden, OrdenArchivo)
+        ]).subquery()
+        stats = db.session.execute(
+            select(
+                func.count().label("visitas"),
+                func.min(ordenes.c.fecha).label("primera"),
+                func.max(ordenes.c.fecha).label("ultima"),
+                func.coalesce(func.sum(ordenes.c.total), 0).label("total"),
+            )
+        ).one()
+
+        # Servicios favoritos: los items de servicio de sus órdenes, agrupados
+        items = union_all(*[
+            select(item.servicio_id, item.cantidad)
+            .join(modelo, modelo.id == item.orden_id)
+            .where(modelo.cliente_id == cliente_id, modelo.anulada_en.is_(None), item.tipo == "servicio")
+            for modelo, item in ((Orden, OrdenItem), (OrdenArchivo, OrdenItemArchivo))
+        ]).subquery()
+        veces = func.sum(items.c.cantidad).label("veces")
+        favoritos = db.session.execute(
+            select(Servicio.id, Servicio.descripcion, veces)
+            .join(items, items.c.servicio_id == Servicio.id)
+            .group_by(Servicio.id, Servicio.descripcion)
+            .order_by(veces.desc(), Servicio.id)
+            .limit(max(request.args.get("favoritos", 3, type=int), 0))
+        ).all()
+
+        total = a_dinero(stats.total)
+        return jsonify({
+            "cliente": {"id": cliente.id, "nombre": cliente.nombre, "telefono": cliente.telefono},
+            "visitas": stats.visitas,
+            "primera_visita": stats.primera.isoformat() if stats.primera else None,
+            "ultima_visita": stats.ultima.isoformat() if stats.ultima else None,
+            "total_gastado": float(total),
+            "ticket_promedio": float((total / stats.visitas).quantize(CENTAVO)) if stats.visitas else 0.0,
+            "servicios_favoritos": [
+                {"servicio_id": f.id, "descripcion": f.descripcion, "veces": int(f.veces)}
+                for f in favoritos
+            ],
+        }), 200
+
 
     @app.route("/clientes", methods=["POST"])
+    @valida("crear_cliente")
     def crear_cliente():
         """
         Crear un nuevo cliente.
@@ -1142,6 +2772,7 @@ def create_app():
 
 
     @app.route("/clientes/<int:cliente_id>", methods=["PUT", "PATCH"])
+    @valida("actualizar_cliente")
     def actualizar_cliente(cliente_id):
         """
         Actualizar un cliente existente.
@@ -1194,18 +2825,24 @@ def create_app():
     # =========================
 
     @app.route("/empleadas", methods=["GET"])
+    @solo_lectura
     def listar_empleadas():
         """
         Lista todas las empleadas.
         Opcional:
         - ?solo_activas=true para filtrar
         - ?q=texto para buscar por nombre
+        - ?sucursal_id=N para las de una sucursal
         """
         q = request.args.get("q", type=str)
         solo_activas = request.args.get("solo_activas", "").lower() == "true"
+        sucursal_id = request.args.get("sucursal_id", type=int)
 
         query = Empleada.query
 
+        if sucursal_id is not None:
+            query = query.filter(Empleada.sucursal_id == sucursal_id)
+
         if q:
             like = f"%{q}%"
             query = query.filter(Empleada.nombre.ilike(like))
@@ -1215,19 +2852,21 @@ def create_app():
 
         empleadas = query.order_by(Empleada.nombre.asc()).all()
 
-        return jsonify([
+        return jsonify(recortar_segun(request.args, [
             {
                 "id": e.id,
                 "nombre": e.nombre,
                 "telefono": e.telefono,
                 "activo": e.activo,
+                "sucursal_id": e.sucursal_id,
                 "creado_en": e.creado_en.isoformat(),
             }
             for e in empleadas
-        ]), 200
+        ])), 200
 
 
     @app.route("/empleadas/<int:empleada_id>", methods=["GET"])
+    @solo_lectura
     def obtener_empleada(empleada_id):
         """
         Obtener una empleada por ID.
@@ -1238,11 +2877,13 @@ def create_app():
             "nombre": empleada.nombre,
             "telefono": empleada.telefono,
             "activo": empleada.activo,
+            "sucursal_id": empleada.sucursal_id,
             "creado_en": empleada.creado_en.isoformat(),
         }), 200
 
 
     @app.route("/empleadas", methods=["POST"])
+    @valida("crear_empleada")
     def crear_empleada():
         """
         Crear una nueva empleada.
@@ -1250,7 +2891,8 @@ def create_app():
         {
         "nombre": "Ana",
         "telefono": "+502 ...",   # opcional
-        "activo": true            # opcional (default True)
+        "activo": true,           # opcional (default True)
+        "sucursal_id": 2          # opcional (default SUCURSAL_DEFAULT_ID)
         }
         """
         data = request.get_json() or {}
@@ -1258,14 +2900,18 @@ def create_app():
         nombre = data.get("nombre")
         telefono = data.get("telefono")
         activo = data.get("activo", True)
+        sucursal_id = data.get("sucursal_id") or app.config["SUCURSAL_DEFAULT_ID"]
 
         if not nombre:
             return jsonify({"error": "nombre es obligatorio"}), 400
+        if not sucursal_activa(sucursal_id):
+            return jsonify({"error": "sucursal_id no existe o está inactiva"}), 400
 
         nueva = Empleada(
         nombre=nombre.strip(),
         telefono=telefono.strip() if telefono else None,
         activo=bool(activo),
+        sucursal_id=sucursal_id,
         )
 
         db.session.add(nueva)
@@ -1276,11 +2922,13 @@ def create_app():
             "nombre": nueva.nombre,
             "telefono": nueva.telefono,
             "activo": nueva.activo,
+            "sucursal_id": nueva.sucursal_id,
             "creado_en": nueva.creado_en.isoformat(),
         }), 201
 
 
     @app.route("/empleadas/<int:empleada_id>", methods=["PUT", "PATCH"])
+    @valida("actualizar_empleada")
     def actualizar_empleada(empleada_id):
         """
         Actualizar una empleada existente.
@@ -1288,7 +2936,8 @@ def create_app():
         {
         "nombre": "Nuevo nombre",
         "telefono": "Nuevo teléfono o null",
-        "activo": false
+        "activo": false,
+        "sucursal_id": 2
         }
         """
         empleada = Empleada.query.get_or_404(empleada_id)
@@ -1305,6 +2954,11 @@ def create_app():
         if "activo" in data:
             empleada.activo = bool(data["activo"])
 
+        if data.get("sucursal_id") is not None:
+            if not sucursal_activa(data["sucursal_id"]):
+                return jsonify({"error": "sucursal_id no existe o está inactiva"}), 400
+            empleada.sucursal_id = data["sucursal_id"]
+
         db.session.commit()
 
         return jsonify({
@@ -1312,10 +2966,58 @@ def create_app():
             "nombre": empleada.nombre,
             "telefono": empleada.telefono,
             "activo": empleada.activo,
+            "sucursal_id": empleada.sucursal_id,
             "creado_en": empleada.creado_en.isoformat(),
         }), 200
 
 
+    @app.route("/empleadas/<int:empleada_id>/servicios", methods=["GET"])
+    @solo_lectura
+    def servicios_de_empleada(empleada_id):
+        """Servicios que hace la empleada."""
+        Empleada.query.get_or_404(empleada_id)
+        filas = db.session.execute(
+            select(Servicio.id, Servicio.descripcion, Servicio.duracion_minutos)
+            .join(EmpleadaServicio, EmpleadaServicio.servicio_id == Servicio.id)
+            .where(EmpleadaServicio.empleada_id == empleada_id)
+            .order_by(Servicio.descripcion)
+        )
+        return jsonify([
+            {"id": id_, "descripcion": descripcion, "duracion_minutos": duracion}
+            for id_, descripcion, duracion in filas
+        ]), 200
+
+
+    @app.route("/empleadas/<int:empleada_id>/servicios", methods=["PUT"])
+    @valida("asignar_servicios_empleada")
+    def asignar_servicios_empleada(empleada_id):
+        """
+        Reemplaza los servicios que hace la empleada.
+        Body JSON: {"servicio_ids": [1, 4, 7]}
+        """
+        Empleada.query.get_or_404(empleada_id)
+        servicio_ids = set(request.get_json()["servicio_ids"])
+        existentes = set(db.session.execute(select(Servicio.id).where(Servicio.id.in_(servicio_ids))).scalars())
+        if existentes != servicio_ids:
+            return jsonify({"error": f"servicios que no existen: {sorted(servicio_ids - existentes)}"}), 400
+
+        actuales = set(db.session.execute(
+            select(EmpleadaServicio.servicio_id).where(EmpleadaServicio.empleada_id == empleada_id)
+        ).scalars())
+        if actuales - servicio_ids:
+            db.session.execute(delete(EmpleadaServicio).where(
+                EmpleadaServicio.empleada_id == empleada_id,
+                EmpleadaServicio.servicio_id.in_(actuales - servicio_ids),
+            ))
+        if servicio_ids - actuales:
+            db.session.execute(insert(EmpleadaServicio), [
+                {"empleada_id": empleada_id, "servicio_id": servicio_id} for servicio_id in servicio_ids - actuales
+            ])
+        registrar_ids("empleadas", [empleada_id], "update")
+        db.session.commit()
+        return jsonify({"empleada_id": empleada_id, "servicio_ids": sorted(servicio_ids)}), 200
+
+
     @app.route("/empleadas/<int:empleada_id>", methods=["DELETE"])
     def eliminar_empleada(empleada_id):
         """
@@ -1338,5 +3040,6 @@ def create_app():
 
 
 if __name__ == "__main__":
+    # Solo para desarrollo; en producción: gunicorn -c gunicorn.conf.py wsgi:app
     app = create_app()
-    app.run(debug=True)
+    app.run(debug=os.getenv("FLASK_DEBUG", "1") == "1")
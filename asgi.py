@@ -0,0 +1,239 @@
+"""
+Punto de entrada ASGI.
+
+    uvicorn asgi:app --workers 4 --port 8000
+
+Los listados de lectura más pesados (GET /productos, /servicios, /ordenes y
+/clientes) se atienden con handlers async sobre un engine async de SQLAlchemy
+(asyncpg en Postgres, aiosqlite en SQLite), así una consulta lenta no bloquea
+el worker. GET /eventos (Server-Sent Events) también es nativo: cada conexión
+es una tarea del event loop y no un thread. Todo lo demás pasa tal cual a la
+app Flask a través de WsgiToAsgi.
+Las respuestas son las mismas que las de las rutas Flask equivalentes.
+"""
+import asyncio
+from datetime import datetime
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import (
+    create_app,
+    a_utc_naive,
+    parse_iso_datetime,
+    consulta_productos,
+    consulta_servicios,
+    consulta_clientes,
+    consulta_ordenes,
+    consulta_ordenes_resumen,
+    consulta_horizonte_archivo,
+    producto_listado_dict,
+    servicio_listado_dict,
+    cliente_to_dict,
+    orden_to_dict,
+    orden_resumen_dict,
+)
+from catalogo import cache_catalogo, etag_catalogo
+from eventos import SuscripcionAsync, broker, formato_sse, iniciar_oyente
+from models import db, Orden, OrdenArchivo, VersionCatalogo
+from respuestas import comprimir, elegir_codificacion, pide_recorte, recortar_segun
+
+DRIVERS_ASYNC = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def url_async(url: str) -> str:
+    """postgresql://... -> postgresql+asyncpg://..., sqlite:///... -> sqlite+aiosqlite:///..."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in DRIVERS_ASYNC:
+        raise ValueError(f"no hay driver async configurado para '{backend}'")
+    return url.set(drivername=DRIVERS_ASYNC[backend]).render_as_string(hide_password=False)
+
+
+class AppAsgi:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+
+        config = flask_app.config
+        url = config.get("ASYNC_DATABASE_URL") or url_async(config["SQLALCHEMY_DATABASE_URI"])
+        self.engine = create_async_engine(url, **config.get("ASYNC_ENGINE_OPTIONS", {}))
+        self.sesiones = async_sessionmaker(self.engine, expire_on_commit=False)
+
+        self.rutas = {
+            "/productos": self.listar_productos,
+            "/servicios": self.listar_servicios,
+            "/ordenes": self.listar_ordenes,
+            "/clientes": self.listar_clientes,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+
+        if scope["type"] == "http" and scope["method"] == "GET":
+            args = {k: v[-1] for k, v in parse_qs(scope["query_string"].decode()).items()}
+            if scope["path"] == "/eventos":
+                return await self.eventos(args, receive, send)
+            handler = self.rutas.get(scope["path"])
+            if handler is not None:
+                headers = dict(scope["headers"])
+                return await handler(args, headers, send)
+
+        await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif mensaje["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def serializar(self, data) -> bytes:
+        """Mismos bytes que jsonify() en la app Flask."""
+        return self.flask_app.json.response(data).get_data()
+
+    async def responder(self, send, data, status=200, headers=None, crudo=False, peticion=None):
+        """
+        Envía la respuesta JSON. Si se pasan los headers de la `peticion`, comprime
+        igual que init_compresion en la app Flask.
+        """
+        cuerpo = data if crudo else self.serializar(data)
+        headers = dict(headers or {})
+        encabezados = [
+            (b"content-type", b"application/json"),
+            # Igual que flask-cors con origins="*"
+            (b"access-control-allow-origin", b"*"),
+        ]
+        if status == 200 and peticion is not None:
+            encabezados.append((b"vary", b"Accept-Encoding"))
+            codificacion = elegir_codificacion(peticion.get(b"accept-encoding", b"").decode())
+            if codificacion and len(cuerpo) >= self.flask_app.config["COMPRESION_MIN_BYTES"]:
+                cuerpo = comprimir(cuerpo, codificacion, self.flask_app.config["COMPRESION_NIVEL"])
+                encabezados.append((b"content-encoding", codificacion.encode()))
+                if "etag" in headers:
+                    headers["etag"] = "W/" + headers["etag"]
+        encabezados.append((b"content-length", str(len(cuerpo)).encode()))
+        for nombre, valor in headers.items():
+            encabezados.append((nombre.encode(), valor.encode()))
+        await send({"type": "http.response.start", "status": status, "headers": encabezados})
+        await send({"type": "http.response.body", "body": cuerpo})
+
+    # ---------- Handlers ----------
+
+    async def responder_catalogo(self, nombre, consulta, a_dict, args, headers, send):
+        """Mismo esquema de ETag + cache por versión que respuesta_catalogo en app.py."""
+        async with self.sesiones() as sesion:
+            version = await sesion.scalar(
+                select(VersionCatalogo.version).where(VersionCatalogo.nombre == nombre)
+            ) or 0
+            etag = etag_catalogo(nombre, version)
+            if f'"{etag}"' in headers.get(b"if-none-match", b"").decode():
+                return await self.responder(send, b"", status=304, headers={"etag": f'"{etag}"'}, crudo=True)
+
+            if pide_recorte(args):
+                filas = (await sesion.scalars(consulta)).all()
+                data = recortar_segun(args, [a_dict(f) for f in filas])
+                return await self.responder(send, data, peticion=headers)
+
+            payload = cache_catalogo.get(nombre, version)
+            if payload is None:
+                filas = (await sesion.scalars(consulta)).all()
+                payload = self.serializar([a_dict(f) for f in filas])
+                cache_catalogo.set(nombre, version, payload)
+
+        await self.responder(send, payload, headers={"etag": f'"{etag}"'}, crudo=True, peticion=headers)
+
+    async def listar_productos(self, args, headers, send):
+        await self.responder_catalogo("productos", consulta_productos(), producto_listado_dict, args, headers, send)
+
+    async def listar_servicios(self, args, headers, send):
+        await self.responder_catalogo("servicios", consulta_servicios(), servicio_listado_dict, args, headers, send)
+
+    async def listar_clientes(self, args, headers, send):
+        async with self.sesiones() as sesion:
+            clientes = (await sesion.scalars(consulta_clientes(args.get("q")))).all()
+        data = recortar_segun(args, [cliente_to_dict(c) for c in clientes])
+        await self.responder(send, data, peticion=headers)
+
+    async def listar_ordenes(self, args, headers, send):
+        """Misma semántica que listar_ordenes en app.py (rango, anuladas, sucursal, vista y poda del archivo)."""
+        fechas = {}
+        for campo in ("inicio", "fin"):
+            try:
+                fechas[campo] = parse_iso_datetime(args.get(campo))
+            except Exception:
+                return await self.responder(
+                    send, {"error": f"parametro '{campo}' debe estar en formato ISO 8601"}, status=400
+                )
+        inicio, fin = fechas["inicio"], fechas["fin"]
+        incluir_anuladas = args.get("incluir_anuladas", "").lower() == "true"
+        resumen = args.get("vista") == "resumen"
+        try:
+            sucursal_id = int(args["sucursal_id"]) if args.get("sucursal_id") else None
+        except ValueError:
+            return await self.responder(send, {"error": "parametro 'sucursal_id' debe ser entero"}, status=400)
+
+        async with self.sesiones() as sesion:
+            async def leer(modelo):
+                if resumen:
+                    return (await sesion.execute(consulta_ordenes_resumen(modelo, inicio, fin, incluir_anuladas, sucursal_id))).all()
+                return (await sesion.scalars(consulta_ordenes(modelo, inicio, fin, incluir_anuladas, sucursal_id))).all()
+
+            ordenes = await leer(Orden)
+
+            horizonte = await sesion.scalar(consulta_horizonte_archivo()) or datetime.min
+            if inicio is None or a_utc_naive(inicio) <= horizonte:
+                archivadas = await leer(OrdenArchivo)
+                if archivadas:
+                    ordenes = sorted(list(ordenes) + list(archivadas), key=lambda o: o.fecha, reverse=True)
+
+            a_dict = orden_resumen_dict if resumen else orden_to_dict
+            data = recortar_segun(args, [a_dict(o) for o in ordenes])
+        await self.responder(send, data, peticion=headers)
+
+    async def eventos(self, args, receive, send):
+        """Mismo canal que /eventos en app.py; la conexión vive hasta el http.disconnect."""
+        config = self.flask_app.config
+        if len(broker) >= config["EVENTOS_MAX_SUSCRIPTORES"]:
+            return await self.responder(
+                send, {"error": "demasiadas conexiones de eventos en este proceso"}, status=503,
+                headers={"retry-after": "10"},
+            )
+        with self.flask_app.app_context():
+            iniciar_oyente(db.engine)
+        tipos = [t.strip() for t in args.get("tipos", "").split(",") if t.strip()]
+        suscripcion = broker.agregar(SuscripcionAsync(asyncio.get_running_loop(), tipos))
+
+        async def enviar():
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+                (b"access-control-allow-origin", b"*"),
+            ]})
+            texto = "retry: 3000\n\n"
+            while True:
+                await send({"type": "http.response.body", "body": texto.encode(), "more_body": True})
+                evento = await suscripcion.siguiente(config["EVENTOS_HEARTBEAT"])
+                texto = formato_sse(evento) if evento is not None else ": ping\n\n"
+
+        envio = asyncio.create_task(enviar())
+        try:
+            while (await receive())["type"] != "http.disconnect":
+                pass
+        finally:
+            envio.cancel()
+            broker.quitar(suscripcion)
+
+
+app = AppAsgi(create_app())
@@ -0,0 +1,101 @@
+"""
+Prueba de carga HTTP simple (solo stdlib) contra un servidor ya levantado.
+
+Sirve para comparar despliegues, p. ej. WSGI vs ASGI con la misma BD:
+
+    gunicorn -w 4 -b :8000 "app:create_app()"
+    uvicorn asgi:app --workers 4 --port 8001
+
+    python bench/carga.py --url http://localhost:8000 --concurrencia 32 --duracion 20
+    python bench/carga.py --url http://localhost:8001 --concurrencia 32 --duracion 20
+
+Imprime (o guarda con --salida) un JSON con requests/s y percentiles de
+latencia por ruta.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+RUTAS_DEFAULT = ["/productos", "/servicios", "/clientes", "/ordenes"]
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    valores = sorted(valores)
+    k = min(len(valores) - 1, max(0, round(p / 100 * (len(valores) - 1))))
+    return valores[k]
+
+
+def trabajador(base, ruta, fin, latencias, errores):
+    partes = urlsplit(base)
+    conexion = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=30)
+    while time.perf_counter() < fin:
+        inicio = time.perf_counter()
+        try:
+            conexion.request("GET", ruta)
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            if respuesta.status >= 400:
+                errores.append(respuesta.status)
+                continue
+        except (OSError, http.client.HTTPException) as e:
+            errores.append(type(e).__name__)
+            conexion.close()
+            conexion = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=30)
+            continue
+        latencias.append(time.perf_counter() - inicio)
+    conexion.close()
+
+
+def medir_ruta(base, ruta, concurrencia, duracion):
+    latencias, errores = [], []
+    fin = time.perf_counter() + duracion
+    hilos = [
+        threading.Thread(target=trabajador, args=(base, ruta, fin, latencias, errores))
+        for _ in range(concurrencia)
+    ]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    ms = [x * 1000 for x in latencias]
+    return {
+        "requests": len(latencias),
+        "errores": len(errores),
+        "rps": round(len(latencias) / duracion, 1),
+        "p50_ms": round(percentil(ms, 50), 2) if ms else None,
+        "p95_ms": round(percentil(ms, 95), 2) if ms else None,
+        "p99_ms": round(percentil(ms, 99), 2) if ms else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--rutas", nargs="+", default=RUTAS_DEFAULT)
+    parser.add_argument("--concurrencia", type=int, default=16)
+    parser.add_argument("--duracion", type=float, default=10, help="segundos por ruta")
+    parser.add_argument("--salida", help="archivo JSON donde guardar el resultado")
+    args = parser.parse_args()
+
+    resultado = {
+        "url": args.url,
+        "concurrencia": args.concurrencia,
+        "duracion": args.duracion,
+        "rutas": {ruta: medir_ruta(args.url, ruta, args.concurrencia, args.duracion) for ruta in args.rutas},
+    }
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    print(texto)
+
+
+if __name__ == "__main__":
+    main()
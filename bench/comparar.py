@@ -0,0 +1,87 @@
+"""
+Compara dos reportes de bench/rutas.py y marca las regresiones.
+
+    python bench/comparar.py /tmp/antes.json /tmp/despues.json --tolerancia 20
+
+Una ruta se marca como regresión si:
+- su p50 sube más de --tolerancia % (y más de --minimo-ms, para ignorar ruido
+  en rutas de 1-2 ms),
+- ejecuta más consultas SQL por request que antes, o
+- cambia el status de la respuesta.
+
+Sale con código 1 si hay alguna regresión, para poder usarlo en CI.
+"""
+import argparse
+import json
+import sys
+
+
+def cargar(ruta):
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def delta_pct(antes, despues):
+    if not antes:
+        return None
+    return round((despues - antes) / antes * 100, 1)
+
+
+def comparar(base, nuevo, tolerancia, minimo_ms):
+    filas, regresiones = [], []
+    rutas = sorted(set(base["rutas"]) | set(nuevo["rutas"]))
+    for ruta in rutas:
+        a, b = base["rutas"].get(ruta), nuevo["rutas"].get(ruta)
+        if a is None or b is None:
+            filas.append((ruta, "solo en " + ("nuevo" if a is None else "base"), "", "", ""))
+            continue
+
+        motivos = []
+        pct = delta_pct(a["p50_ms"], b["p50_ms"])
+        if pct is not None and pct > tolerancia and b["p50_ms"] - a["p50_ms"] > minimo_ms:
+            motivos.append(f"p50 +{pct}%")
+        if b["consultas"] > a["consultas"]:
+            motivos.append(f"consultas {a['consultas']}->{b['consultas']}")
+        if b["status"] != a["status"]:
+            motivos.append(f"status {a['status']}->{b['status']}")
+        if motivos:
+            regresiones.append((ruta, motivos))
+
+        filas.append((
+            ruta,
+            f"{a['p50_ms']} -> {b['p50_ms']} ms" + (f" ({pct:+}%)" if pct is not None else ""),
+            f"{a['consultas']} -> {b['consultas']}",
+            f"{a['bytes']} -> {b['bytes']}",
+            "REGRESION: " + ", ".join(motivos) if motivos else "",
+        ))
+    return filas, regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("nuevo")
+    parser.add_argument("--tolerancia", type=float, default=20, help="%% de aumento del p50 permitido")
+    parser.add_argument("--minimo-ms", type=float, default=1.0, help="aumento absoluto mínimo para marcar")
+    args = parser.parse_args()
+
+    base, nuevo = cargar(args.base), cargar(args.nuevo)
+    print(f"base:  {base['meta'].get('commit')} ({base['meta'].get('dialecto')}, {base['meta'].get('filas')})")
+    print(f"nuevo: {nuevo['meta'].get('commit')} ({nuevo['meta'].get('dialecto')}, {nuevo['meta'].get('filas')})")
+    if base["meta"].get("filas") != nuevo["meta"].get("filas"):
+        print("AVISO: los reportes no se hicieron con los mismos volúmenes de datos")
+    print()
+
+    filas, regresiones = comparar(base, nuevo, args.tolerancia, args.minimo_ms)
+    ancho = max(len(f[0]) for f in filas) if filas else 0
+    print(f"{'ruta':{ancho}}  {'p50':28} {'consultas':10} {'bytes':20}")
+    for ruta, p50, consultas, tam, nota in filas:
+        print(f"{ruta:{ancho}}  {p50:28} {consultas:10} {tam:20} {nota}")
+
+    print()
+    print(f"{len(regresiones)} regresiones" if regresiones else "sin regresiones")
+    sys.exit(1 if regresiones else 0)
+
+
+if __name__ == "__main__":
+    main()
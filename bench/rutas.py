@@ -0,0 +1,240 @@
+"""
+Benchmark por ruta dentro del proceso (test client de Flask, sin red).
+
+    python bench/rutas.py --db sqlite:////tmp/kiara-bench.db --sembrar --salida /tmp/antes.json
+    git checkout otra-rama
+    python bench/rutas.py --db sqlite:////tmp/kiara-bench.db --salida /tmp/despues.json
+    python bench/comparar.py /tmp/antes.json /tmp/despues.json
+
+Recorre todas las rutas GET de app.py (los <int:...> se llenan con ids que
+existen en la BD) más las de variantes(), y por cada una mide:
+
+- primera_ms / consultas_primera: la primera llamada, con caches fríos
+- p50_ms, p95_ms, media_ms, rps: las --iteraciones siguientes, una tras otra
+- consultas: SQL ejecutados por request (mediana)
+- bytes y status de la respuesta
+
+Con --escrituras también mide POST /ordenes, PATCH /productos/<id> y
+POST /clientes (ensucian la BD: volver a sembrar antes de comparar).
+
+Para throughput con concurrencia real a través de HTTP usar bench/carga.py.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from sembrar import agregar_argumentos, sembrar, volumenes_desde  # noqa: E402
+
+# Rutas que no se miden (no dependen de la BD, no son GET de datos o no terminan)
+EXCLUIDAS = {"static", "eventos"}
+
+# Parámetro de la URL -> modelo de donde sacar un id existente
+PARAMETROS_ID = {
+    "producto_id": "Producto",
+    "servicio_id": "Servicio",
+    "orden_id": "Orden",
+    "cliente_id": "Cliente",
+    "empleada_id": "Empleada",
+    "usuario_id": "Usuario",
+    "marca_id": "MarcaProducto",
+    "cat_id": "CategoriaProducto",
+    "sucursal_id": "Sucursal",
+    "cita_id": "Cita",
+}
+
+# Rutas con query params obligatorios: endpoint -> {query param: id de ejemplo}
+PARAMETROS_CONSULTA = {
+    "ver_disponibilidad": {"servicio_id": "servicio_id"},
+    "sugerir_asignacion": {"servicio_ids": "servicio_id"},
+    "buscar_catalogo": {"q": "producto_id"},  # "Producto <id>" -> pocos resultados
+}
+
+
+def variantes():
+    """(nombre en el reporte, url)"""
+    hace_30 = (datetime.utcnow() - timedelta(days=30)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    fijas = [
+        "/ordenes?incluir_anuladas=true",
+        "/ordenes?vista=resumen",
+        "/ordenes?fields=id,codigo,fecha,total,cliente.nombre",
+        "/productos?compacto=true",
+        "/productos/export?formato=json",
+        "/productos/bajo-stock?dias=90",
+        "/clientes?q=Clienta%2010",
+        "/buscar?q=producto",  # coincide con todo el catálogo: el peor caso para el orden
+    ]
+    return [("/ordenes?inicio=<hace 30 días>", f"/ordenes?inicio={hace_30}")] + [(url, url) for url in fijas]
+
+
+def commit_actual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ids_de_ejemplo(db, models):
+    """Un id "del medio" por modelo, para no caer siempre en el primero."""
+    ids = {}
+    for parametro, nombre in PARAMETROS_ID.items():
+        modelo = getattr(models, nombre)
+        existentes = db.session.scalars(db.select(modelo.id).order_by(modelo.id)).all()
+        ids[parametro] = existentes[len(existentes) // 2] if existentes else 1
+    # /productos/por-codigo/<codigo>: el sku del mismo producto
+    producto = db.session.get(models.Producto, ids["producto_id"])
+    ids["codigo"] = producto.sku if producto is not None and producto.sku else "0"
+    return ids
+
+
+def rutas_get(app, ids):
+    """(nombre en el reporte, url). El nombre es la regla, así no cambia entre corridas."""
+    from flask import url_for
+
+    rutas = []
+    for regla in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if regla.endpoint in EXCLUIDAS or "GET" not in regla.methods:
+            continue
+        valores = {arg: ids.get(arg, 1) for arg in regla.arguments}
+        valores.update({q: ids.get(arg, 1) for q, arg in PARAMETROS_CONSULTA.get(regla.endpoint, {}).items()})
+        with app.test_request_context():
+            rutas.append((regla.rule, url_for(regla.endpoint, **valores)))
+    return rutas
+
+
+def escrituras(ids):
+    """(método, nombre en el reporte, url, generador de body por iteración)"""
+    corrida = int(time.time())
+    return [
+        ("POST", "/ordenes", "/ordenes", lambda i: {
+            "codigo": f"BN-{corrida % 100000}-{i}",
+            "tipo_pago": "efectivo",
+            "cliente": {"id": ids["cliente_id"]},
+            "items": [
+                {"tipo": "servicio", "servicio_id": ids["servicio_id"], "cantidad": 1,
+                 "precio_unitario": 150, "empleada_id": ids["empleada_id"]},
+                {"tipo": "producto", "producto_id": ids["producto_id"], "cantidad": 1,
+                 "precio_unitario": 80, "empleada_id": ids["empleada_id"]},
+            ],
+        }),
+        ("PATCH", "/productos/<int:producto_id>", f"/productos/{ids['producto_id']}", lambda i: {"precio": 100 + i % 50}),
+        ("POST", "/clientes", "/clientes", lambda i: {"nombre": f"Bench {corrida}-{i}", "telefono": f"bench-{corrida}-{i}"}),
+    ]
+
+
+def medir(cliente, contador, metodo, url, iteraciones, body=None):
+    def llamar(i):
+        contador["n"] = 0
+        inicio = time.perf_counter()
+        respuesta = cliente.open(url, method=metodo, json=body(i) if body else None)
+        datos = respuesta.get_data()  # consume también las respuestas en streaming
+        return time.perf_counter() - inicio, contador["n"], respuesta.status_code, len(datos)
+
+    primera, consultas_primera, status, tam = llamar(0)
+    latencias, consultas = [], []
+    inicio_total = time.perf_counter()
+    for i in range(1, iteraciones + 1):
+        segundos, n, status, tam = llamar(i)
+        latencias.append(segundos * 1000)
+        consultas.append(n)
+    total = time.perf_counter() - inicio_total
+
+    latencias.sort()
+    return {
+        "status": status,
+        "bytes": tam,
+        "consultas_primera": consultas_primera,
+        "consultas": int(statistics.median(consultas)),
+        "primera_ms": round(primera * 1000, 2),
+        "p50_ms": round(statistics.median(latencias), 2),
+        "p95_ms": round(latencias[min(len(latencias) - 1, round(0.95 * (len(latencias) - 1)))], 2),
+        "media_ms": round(statistics.fmean(latencias), 2),
+        "rps": round(iteraciones / total, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", required=True, help="URL de la BD (se usa como DATABASE_URL)")
+    parser.add_argument("--sembrar", action="store_true", help="resetea y siembra la BD antes de medir")
+    parser.add_argument("--iteraciones", type=int, default=20)
+    parser.add_argument("--solo", nargs="+", help="medir solo las rutas que empiezan con estos prefijos")
+    parser.add_argument("--escrituras", action="store_true")
+    parser.add_argument("--salida", help="archivo JSON donde guardar el reporte")
+    agregar_argumentos(parser)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.db
+    from sqlalchemy import event
+
+    import models
+    from app import create_app
+    from models import db
+
+    app = create_app()
+    cliente = app.test_client()
+    contador = {"n": 0}
+
+    with app.app_context():
+        volumenes = None
+        if args.sembrar:
+            volumenes = volumenes_desde(args)
+            sembrar(volumenes, reset=True)
+        filas = {
+            tabla: db.session.scalar(db.select(db.func.count()).select_from(db.table(tabla)))
+            for tabla in ("clientes", "productos", "servicios", "empleadas", "ordenes", "orden_items")
+        }
+        ids = ids_de_ejemplo(db, models)
+        dialecto = db.engine.dialect.name
+        db.session.remove()
+
+        @event.listens_for(db.engine, "before_cursor_execute")
+        def contar(*_):
+            contador["n"] += 1
+
+    escenarios = [("GET", nombre, url, None) for nombre, url in rutas_get(app, ids) + variantes()]
+    if args.escrituras:
+        escenarios += escrituras(ids)
+    if args.solo:
+        escenarios = [e for e in escenarios if any(e[2].startswith(p) for p in args.solo)]
+
+    resultados = {}
+    for metodo, nombre, url, body in escenarios:
+        resultado = medir(cliente, contador, metodo, url, args.iteraciones, body)
+        resultados[f"{metodo} {nombre}"] = resultado
+        print(f"{metodo:6} {nombre:60} {resultado['p50_ms']:>9} ms", file=sys.stderr)
+
+    reporte = {
+        "meta": {
+            "commit": commit_actual(),
+            "fecha": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "dialecto": dialecto,
+            "python": platform.python_version(),
+            "iteraciones": args.iteraciones,
+            "volumenes": volumenes,
+            "filas": filas,
+        },
+        "rutas": resultados,
+    }
+
+    texto = json.dumps(reporte, indent=2, sort_keys=True, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
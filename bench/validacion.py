@@ -0,0 +1,98 @@
+"""
+Microbenchmark de la validación de payloads (esquemas.py), sin BD ni red.
+
+    python bench/validacion.py
+    python bench/validacion.py --repeticiones 20000 --salida /tmp/validacion.json
+
+Por cada payload de ejemplo mide cuánto tarda validarlo (us por request,
+mediana de --rondas rondas) y, como referencia, cuánto tarda json.loads del
+mismo cuerpo, que cualquier request ya paga. Las órdenes van con 1, 6 y 50
+items para ver cómo crece con el tamaño.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from esquemas import VALIDADORES, validar  # noqa: E402
+
+
+def item(i):
+    if i % 2:
+        return {"tipo": "servicio", "servicio_id": i, "cantidad": 1, "precio_unitario": 400, "empleada_id": 1}
+    return {"tipo": "producto", "sku": f"75{i:011d}", "cantidad": 2, "precio_unitario": "250.00", "empleada_id": 2}
+
+
+def orden(n_items):
+    return {
+        "codigo": "ORD-000123",
+        "tipo_pago": "tarjeta",
+        "referencia": "TRX123",
+        "fecha": "2026-10-24T10:10:00Z",
+        "descuento": 25.5,
+        "cliente": {"nombre": "Ana López", "telefono": "+502 5555 1111"},
+        "items": [item(i) for i in range(n_items)],
+    }
+
+
+PAYLOADS = [
+    ("crear_producto", "crear_producto", {
+        "descripcion": "Shampoo reparador 500 ml", "sku": "7501234567890", "marca": "Marca 3",
+        "categoria": "Cuidado capilar", "costo": 45.5, "precio": 89.9, "cantidad": 12, "stock_minimo": 4,
+    }),
+    ("actualizar_producto", "actualizar_producto", {"precio": 95, "stock_minimo": None}),
+    ("crear_cita", "crear_cita", {"empleada_id": 3, "servicio_id": 7, "inicio": "2026-10-24T09:30:00"}),
+    ("actualizar_productos_bulk", "actualizar_productos_bulk", {
+        "filtro": {"categoria_id": 2, "ids": list(range(1, 101))}, "precio": {"porcentaje": 10}, "dry_run": True,
+    }),
+    ("crear_orden (1 item)", "crear_orden", orden(1)),
+    ("crear_orden (6 items)", "crear_orden", orden(6)),
+    ("crear_orden (50 items)", "crear_orden", orden(50)),
+    ("crear_orden (6 items, con errores)", "crear_orden", {**orden(6), "tipo_pago": None, "items": [{}] * 6}),
+]
+
+
+def medir(funcion, repeticiones, rondas):
+    """Mediana de us por llamada entre `rondas` corridas de `repeticiones` llamadas."""
+    tiempos = []
+    for _ in range(rondas):
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            funcion()
+        tiempos.append((time.perf_counter() - inicio) / repeticiones * 1e6)
+    return round(statistics.median(tiempos), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=5000)
+    parser.add_argument("--rondas", type=int, default=5)
+    parser.add_argument("--salida", help="archivo JSON donde guardar el resultado")
+    args = parser.parse_args()
+
+    resultado = {"esquemas": len(VALIDADORES), "payloads": {}}
+    for nombre, esquema, payload in PAYLOADS:
+        cuerpo = json.dumps(payload)
+        validar_us = medir(lambda: validar(esquema, payload), args.repeticiones, args.rondas)
+        json_us = medir(lambda: json.loads(cuerpo), args.repeticiones, args.rondas)
+        resultado["payloads"][nombre] = {
+            "bytes": len(cuerpo),
+            "errores": len(validar(esquema, payload)),
+            "validar_us": validar_us,
+            "json_loads_us": json_us,
+            "relacion": round(validar_us / json_us, 2) if json_us else None,
+        }
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    print(texto)
+
+
+if __name__ == "__main__":
+    main()
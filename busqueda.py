@@ -0,0 +1,191 @@
+"""
+Búsqueda en el catálogo (GET /buscar?q=): productos y servicios por
+descripción, marca y categoría, sin importar acentos ni mayúsculas, con
+prefijos ("sham" encuentra "Shampoo").
+
+Postgres: productos.busqueda y servicios.busqueda son columnas generadas
+(tsvector 'spanish' sobre kiara_unaccent(descripcion), ver models.py) con
+índice GIN. Las marcas y categorías son pocas: las que coinciden se buscan
+directo y traen sus productos por ix_productos_marca / ix_productos_categoria.
+Cada palabra tiene que aparecer en la descripción, la marca o la categoría
+("shampoo loreal" encuentra el shampoo de marca L'Oréal), igual que en FTS5;
+se arma como un AND de ORs por palabra para que sigan sirviendo los índices.
+Orden: primero lo que coincide entero en la descripción (por ts_rank),
+después por marca y por categoría. Una sola consulta (UNION ALL) con LIMIT.
+
+SQLite (desarrollo y pruebas): una tabla FTS5 temporal por conexión, con
+unicode61 remove_diacritics, que se rearma cuando cambia la versión de los
+catálogos (catalogo_versiones). Mismo orden por columna, bm25 desempata.
+"""
+import re
+
+from sqlalchemy import and_, case, func, literal, literal_column, null, or_, select, text, union_all
+
+from catalogo import version_catalogo
+from models import db, CategoriaProducto, CategoriaServicio, MarcaProducto, Producto, Servicio
+
+TIPOS = ("producto", "servicio")
+TERMINO = re.compile(r"\w+")
+CONFIG = literal_column("'spanish'::regconfig")
+
+# Bono en el rank según dónde coincide la búsqueda
+BONO_DESCRIPCION, BONO_MARCA, BONO_CATEGORIA = 1.0, 0.5, 0.25
+
+
+def terminos(q: str) -> list:
+    """Palabras de la búsqueda (sin operadores: todo lo que no es letra o número se descarta)."""
+    return TERMINO.findall(q or "")
+
+
+def buscar(q: str, limite: int = 20, tipo: str = None) -> list:
+    palabras = terminos(q)
+    if not palabras:
+        return []
+    if db.engine.dialect.name == "postgresql":
+        filas = _buscar_postgres(palabras, limite, tipo)
+    else:
+        filas = _buscar_sqlite(palabras, limite, tipo)
+    return [
+        {
+            "tipo": f.tipo,
+            "id": f.id,
+            "descripcion": f.descripcion,
+            "marca": f.marca,
+            "categoria": f.categoria,
+            "precio": float(f.precio),
+            "rank": round(float(f.rank), 4),
+        }
+        for f in filas
+    ]
+
+
+# ---------- Postgres ----------
+
+def _vector(columna):
+    return func.to_tsvector(CONFIG, func.kiara_unaccent(columna))
+
+
+def _tsquery(texto):
+    return func.to_tsquery(CONFIG, func.kiara_unaccent(texto))
+
+
+def _consulta_postgres(modelo, marca, categoria, palabras):
+    busqueda = literal_column(f"{modelo.__tablename__}.busqueda")
+
+    def coincide(consulta):
+        """(en_descripcion, en_marca, en_categoria) para una tsquery."""
+        en_categoria = modelo.categoria_id.in_(
+            select(categoria.id).where(_vector(categoria.nombre).op("@@")(consulta))
+        )
+        en_marca = None
+        if marca is not None:
+            en_marca = modelo.marca_id.in_(select(marca.id).where(_vector(marca.nombre).op("@@")(consulta)))
+        return busqueda.op("@@")(consulta), en_marca, en_categoria
+
+    # Filtro: cada palabra en algún campo
+    condiciones = [
+        or_(*[c for c in coincide(_tsquery(f"{palabra}:*")) if c is not None])
+        for palabra in palabras
+    ]
+
+    # Rank: bonos si todas las palabras caen en un mismo campo; ts_rank con
+    # cualquiera de las palabras desempata
+    todas = _tsquery(" & ".join(f"{p}:*" for p in palabras))
+    alguna = _tsquery(" | ".join(f"{p}:*" for p in palabras))
+    en_descripcion, en_marca, en_categoria = coincide(todas)
+    rank = (
+        case((en_descripcion, BONO_DESCRIPCION), else_=0)
+        + case((en_categoria, BONO_CATEGORIA), else_=0)
+        + func.ts_rank(busqueda, alguna)
+    )
+    columnas = [modelo.id, modelo.descripcion]
+    if marca is not None:
+        rank = rank + case((en_marca, BONO_MARCA), else_=0)
+        columnas.append(marca.nombre.label("marca"))
+    else:
+        columnas.append(null().label("marca"))
+
+    query = select(
+        literal(modelo.__name__.lower()).label("tipo"),
+        *columnas,
+        categoria.nombre.label("categoria"),
+        modelo.precio,
+        rank.label("rank"),
+    )
+    if marca is not None:
+        query = query.outerjoin(marca, marca.id == modelo.marca_id)
+    return query.outerjoin(categoria, categoria.id == modelo.categoria_id).where(and_(*condiciones))
+
+
+def _buscar_postgres(palabras, limite, tipo):
+    # Las stopwords ("de", "para") dan una tsquery vacía, que no coincide con
+    # nada: se descartan antes, como hace to_tsquery dentro de un AND
+    lexemas = db.session.execute(select(*[func.numnode(_tsquery(f"{p}:*")) for p in palabras])).one()
+    palabras = [p for p, n in zip(palabras, lexemas) if n]
+    if not palabras:
+        return []
+
+    partes = []
+    if tipo in (None, "producto"):
+        partes.append(_consulta_postgres(Producto, MarcaProducto, CategoriaProducto, palabras))
+    if tipo in (None, "servicio"):
+        partes.append(_consulta_postgres(Servicio, None, CategoriaServicio, palabras))
+    todas = union_all(*partes).subquery()
+    return db.session.execute(
+        select(todas).order_by(todas.c.rank.desc(), todas.c.tipo, todas.c.id).limit(limite)
+    ).all()
+
+
+# ---------- SQLite (FTS5) ----------
+
+def _preparar_fts():
+    """Arma (o rearma) la tabla FTS5 temporal de esta conexión si cambió algún catálogo."""
+    conexion = db.session.connection()
+    versiones = (version_catalogo("productos"), version_catalogo("servicios"))
+    info = conexion.connection.info
+    if info.get("busqueda_fts") == versiones:
+        return
+    conexion.exec_driver_sql(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS temp.busqueda_fts USING fts5("
+        "tipo UNINDEXED, ref_id UNINDEXED, precio UNINDEXED, descripcion, marca, categoria, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    conexion.exec_driver_sql("DELETE FROM temp.busqueda_fts")
+    conexion.exec_driver_sql(
+        "INSERT INTO temp.busqueda_fts (tipo, ref_id, precio, descripcion, marca, categoria) "
+        "SELECT 'producto', p.id, p.precio, p.descripcion, coalesce(m.nombre, ''), coalesce(c.nombre, '') "
+        "FROM productos p "
+        "LEFT JOIN marcas_productos m ON m.id = p.marca_id "
+        "LEFT JOIN categorias_productos c ON c.id = p.categoria_id"
+    )
+    conexion.exec_driver_sql(
+        "INSERT INTO temp.busqueda_fts (tipo, ref_id, precio, descripcion, marca, categoria) "
+        "SELECT 'servicio', s.id, s.precio, s.descripcion, '', coalesce(c.nombre, '') "
+        "FROM servicios s LEFT JOIN categorias_servicios c ON c.id = s.categoria_id"
+    )
+    # Sin commit el rollback al devolver la conexión al pool se lleva la tabla
+    db.session.commit()
+    info["busqueda_fts"] = versiones
+
+
+def _buscar_sqlite(palabras, limite, tipo):
+    _preparar_fts()
+    consulta = " ".join(f'"{p}"*' for p in palabras)
+    # Mismos bonos que en Postgres según la columna que coincide; bm25 desempata
+    bonos = " + ".join(
+        f"CASE WHEN rowid IN (SELECT rowid FROM temp.busqueda_fts WHERE busqueda_fts MATCH '{columna} : ' || :grupo) "
+        f"THEN {bono} ELSE 0 END"
+        for columna, bono in (
+            ("descripcion", BONO_DESCRIPCION), ("marca", BONO_MARCA), ("categoria", BONO_CATEGORIA),
+        )
+    )
+    filtro = "AND tipo = :tipo" if tipo else ""
+    return db.session.execute(
+        text(
+            "SELECT tipo, ref_id AS id, descripcion, nullif(marca, '') AS marca, nullif(categoria, '') AS categoria, "
+            f"precio, {bonos} - bm25(busqueda_fts) / 100 AS rank "
+            f"FROM temp.busqueda_fts WHERE busqueda_fts MATCH :consulta {filtro} "
+            "ORDER BY rank DESC, tipo, id LIMIT :limite"
+        ),
+        {"consulta": consulta, "grupo": f"({consulta})", "tipo": tipo, "limite": limite},
+    ).all()
@@ -0,0 +1,166 @@
+"""
+Bitácora de cambios (tabla `cambios`) para sincronización incremental.
+
+- Todo lo que pasa por el ORM queda registrado solo: el evento after_flush
+  agrega una fila por objeto creado, modificado o borrado, con la fila
+  completa en `datos`.
+- Los caminos masivos (INSERT/UPDATE/DELETE set-based, import, archivo) no
+  disparan eventos por objeto y tienen que llamar a registrar_ids o
+  registrar_consulta. Ahí `datos` queda en NULL y cambios_desde lo completa
+  al leer con la fila actual.
+
+El orden de `seq` tiene que coincidir con el orden de commit, si no un
+cliente podría saltarse un cambio que se confirmó tarde. Por eso las filas
+se juntan en la sesión durante la transacción y se insertan todas juntas en
+before_commit, justo después de tomar un advisory lock de transacción (solo
+Postgres; en SQLite la escritura ya es serial). El lock se tiene solo entre
+ese INSERT y el commit, no durante toda la transacción: un import largo no
+frena las demás escrituras.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import event, func, insert, select
+from sqlalchemy.orm import Session
+
+from models import db, Cambio
+
+# Tablas internas que no se publican (y la propia bitácora)
+# (empleada_servicios no tiene id propio: sus cambios se publican como update de la empleada)
+TABLAS_EXCLUIDAS = {
+    "cambios", "catalogo_versiones", "empleada_servicios", "movimientos_inventario", "snapshots_stock",
+    "stock_sucursales", "trabajos",
+}
+# Columnas que nunca salen en `datos`
+COLUMNAS_PRIVADAS = {"usuarios": {"password_hash"}}
+
+LLAVE_LOCK = 0x6B69617261  # "kiara"
+
+
+def _modelos():
+    return {m.class_.__tablename__: m.class_ for m in db.Model.registry.mappers}
+
+
+def _a_json(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+def fila_a_dict(obj) -> dict:
+    """Columnas del objeto en un dict serializable a JSON (sin las privadas)."""
+    privadas = COLUMNAS_PRIVADAS.get(obj.__tablename__, ())
+    return {
+        attr.key: _a_json(getattr(obj, attr.key))
+        for attr in obj.__mapper__.column_attrs
+        if attr.key not in privadas
+    }
+
+
+def bloquear_bitacora(conexion):
+    """Serializa las escrituras a la bitácora hasta el fin de la transacción (solo Postgres)."""
+    if conexion.dialect.name == "postgresql":
+        conexion.execute(select(func.pg_advisory_xact_lock(LLAVE_LOCK)))
+
+
+def _pendientes(session) -> list:
+    return session.info.setdefault("cambios_pendientes", [])
+
+
+def registrar_ids(tabla: str, ids, operacion: str):
+    """Registra `operacion` para una lista de ids ya conocida (se escribe al hacer commit)."""
+    if tabla in TABLAS_EXCLUIDAS:
+        return
+    _pendientes(db.session).extend(
+        {"tabla": tabla, "registro_id": id_, "operacion": operacion, "datos": None} for id_ in ids
+    )
+
+
+def registrar_consulta(tabla: str, ids_select, operacion: str):
+    """
+    Registra `operacion` para los ids que devuelve un SELECT. Para UPDATE/DELETE
+    masivos: llamar antes, con el mismo WHERE (los ids se leen ahora).
+    """
+    if tabla in TABLAS_EXCLUIDAS:
+        return
+    registrar_ids(tabla, db.session.execute(ids_select).scalars().all(), operacion)
+
+
+@event.listens_for(Session, "after_flush")
+def _registrar_en_flush(session, flush_context):
+    filas = _pendientes(session)
+    for operacion, objetos in (("insert", session.new), ("update", session.dirty), ("delete", session.deleted)):
+        for obj in objetos:
+            tabla = getattr(obj, "__tablename__", None)
+            if tabla is None or tabla in TABLAS_EXCLUIDAS:
+                continue
+            if operacion == "update" and not session.is_modified(obj, include_collections=False):
+                continue
+            filas.append({
+                "tabla": tabla,
+                "registro_id": obj.id,
+                "operacion": operacion,
+                "datos": None if operacion == "delete" else fila_a_dict(obj),
+            })
+
+
+@event.listens_for(Session, "before_commit")
+def _escribir_bitacora(session):
+    # El flush del commit viene después de este evento: se adelanta para juntar todo
+    session.flush()
+    filas = session.info.pop("cambios_pendientes", None)
+    if not filas:
+        return
+
+    conexion = session.connection()
+    bloquear_bitacora(conexion)
+    ahora = datetime.utcnow()
+    for fila in filas:
+        fila["fecha"] = ahora
+    conexion.execute(insert(Cambio.__table__), filas)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_pendientes(session):
+    session.info.pop("cambios_pendientes", None)
+
+
+def cambios_desde(desde: int, limite: int, tablas=None):
+    """
+    Hasta `limite` cambios con seq > desde, en orden. Devuelve (cambios, hay_mas).
+    Los que vienen sin `datos` (caminos masivos) se completan con la fila
+    actual, una consulta por tabla.
+    """
+    query = select(Cambio).where(Cambio.seq > desde).order_by(Cambio.seq).limit(limite + 1)
+    if tablas:
+        query = query.where(Cambio.tabla.in_(tablas))
+    filas = db.session.execute(query).scalars().all()
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+
+    faltantes = {}
+    for c in filas:
+        if c.datos is None and c.operacion != "delete":
+            faltantes.setdefault(c.tabla, set()).add(c.registro_id)
+    actuales = {}
+    modelos = _modelos()
+    for tabla, ids in faltantes.items():
+        modelo = modelos[tabla]
+        for obj in db.session.execute(select(modelo).where(modelo.id.in_(ids))).scalars():
+            actuales[(tabla, obj.id)] = fila_a_dict(obj)
+
+    cambios = [
+        {
+            "seq": c.seq,
+            "tabla": c.tabla,
+            "id": c.registro_id,
+            "operacion": c.operacion,
+            # Si ya no existe, más adelante viene su 'delete'
+            "datos": c.datos if c.datos is not None else actuales.get((c.tabla, c.registro_id)),
+            "fecha": c.fecha.isoformat(),
+        }
+        for c in filas
+    ]
+    return cambios, hay_mas
@@ -0,0 +1,195 @@
+from datetime import datetime
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from cache import TTLCache
+from cambios import registrar_ids
+from config import Config
+from models import db, insert_para_dialecto, VersionCatalogo, Producto, Servicio, MarcaProducto, CategoriaProducto, CategoriaServicio
+
+
+# Qué catálogo se invalida cuando cambia cada modelo
+CATALOGO_POR_MODELO = {
+    Producto: "productos",
+    MarcaProducto: "productos",
+    CategoriaProducto: "productos",
+    Servicio: "servicios",
+    CategoriaServicio: "servicios",
+}
+
+
+def version_catalogo(nombre: str) -> int:
+    """Versión actual de un catálogo (lectura por PK, barata)."""
+    version = db.session.execute(
+        select(VersionCatalogo.version).where(VersionCatalogo.nombre == nombre)
+    ).scalar()
+    return version or 0
+
+
+def invalidar_catalogo(*nombres: str, conexion=None):
+    """
+    Sube la versión de los catálogos dentro de la transacción actual.
+    Con eso cambian sus ETags y se descarta el cache en todos los procesos.
+    """
+    conexion = conexion if conexion is not None else db.session.connection()
+    for nombre in nombres:
+        stmt = insert_para_dialecto(VersionCatalogo.__table__).values(nombre=nombre, version=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["nombre"],
+            set_={"version": VersionCatalogo.__table__.c.version + 1},
+        )
+        conexion.execute(stmt)
+
+
+class CacheCatalogo:
+    """
+    Guarda la respuesta serializada de cada listado junto con la versión con la
+    que se generó. Si la versión en la BD cambió, la entrada ya no sirve.
+    """
+
+    def __init__(self):
+        self._entradas = {}
+
+    def get(self, nombre: str, version: int):
+        entrada = self._entradas.get(nombre)
+        if entrada is not None and entrada[0] == version:
+            return entrada[1]
+        return None
+
+    def set(self, nombre: str, version: int, payload: bytes):
+        self._entradas[nombre] = (version, payload)
+
+
+cache_catalogo = CacheCatalogo()
+
+
+def etag_catalogo(nombre: str, version: int) -> str:
+    return f"{nombre}-{version}"
+
+
+# ---------- Códigos de barras (sku) ----------
+
+# sku -> (versión de "productos", respuesta serializada o None si no existe).
+# Como cache_catalogo: cualquier escritura de productos, en cualquier proceso,
+# sube la versión y la entrada deja de servir.
+cache_codigos = TTLCache(Config.CODIGOS_CACHE_TAMANO, Config.CODIGOS_CACHE_TTL)
+
+
+def normalizar_sku(valor):
+    """El sku como se guarda y se busca: texto sin espacios alrededor, vacío -> None."""
+    if valor is None:
+        return None
+    valor = str(valor).strip()
+    return valor or None
+
+
+# ---------- Lookups nombre -> id (marcas y categorías) ----------
+
+# nombre -> (versión del lookup, id). La versión (catalogo_versiones, con el
+# nombre de la tabla) sube al renombrar o borrar una marca/categoría en
+# cualquier proceso; las entradas de una versión anterior se ignoran.
+_lookups = {
+    modelo: TTLCache(Config.LOOKUP_CACHE_TAMANO, Config.LOOKUP_CACHE_TTL)
+    for modelo in (MarcaProducto, CategoriaProducto, CategoriaServicio)
+}
+
+
+def _version_lookup(modelo) -> int:
+    """Versión del lookup, leída una vez por transacción (un import resuelve miles de nombres)."""
+    versiones = db.session.info.setdefault("versiones_lookup", {})
+    if modelo not in versiones:
+        versiones[modelo] = version_catalogo(modelo.__tablename__)
+    return versiones[modelo]
+
+
+def resolver_lookup(modelo, nombre: str) -> int:
+    """
+    Id de la marca/categoría con ese nombre, creándola si no existe.
+
+    Usa INSERT ... ON CONFLICT DO NOTHING RETURNING, así dos requests que crean
+    el mismo nombre a la vez no chocan. El resultado se guarda en el cache
+    recién cuando la transacción hace commit (ver _promover_lookups), para no
+    cachear ids que terminen en rollback.
+    """
+    nombre = str(nombre)
+    pendientes = db.session.info.setdefault("lookups_pendientes", {})
+    clave = (modelo, nombre)
+    if clave in pendientes:
+        return pendientes[clave][1]
+
+    version = _version_lookup(modelo)
+    entrada = _lookups[modelo].get(nombre)
+    if entrada is not None and entrada[0] == version:
+        return entrada[1]
+
+    stmt = (
+        insert_para_dialecto(modelo.__table__)
+        .values(nombre=nombre, activo=True, creado_en=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=["nombre"])
+        .returning(modelo.__table__.c.id)
+    )
+    id_ = db.session.execute(stmt).scalar()
+    if id_ is None:
+        # Ya existía (o la acaba de crear otra transacción)
+        id_ = db.session.execute(select(modelo.id).where(modelo.nombre == nombre)).scalar_one()
+    else:
+        registrar_ids(modelo.__tablename__, [id_], "insert")
+
+    pendientes[clave] = (version, id_)
+    return id_
+
+
+def olvidar_lookups(modelo):
+    """
+    Vacía el cache de un modelo en este proceso (al renombrar o borrar marcas/categorías).
+    Los demás procesos se enteran por la versión, que sube en _invalidar_en_flush.
+    """
+    _lookups[modelo].clear()
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidar_en_flush(session, flush_context):
+    """Cualquier alta/baja/cambio de un modelo de catálogo sube su versión (una vez por transacción)."""
+    pendientes = set()
+    for obj in list(session.new) + list(session.deleted):
+        nombre = CATALOGO_POR_MODELO.get(type(obj))
+        if nombre:
+            pendientes.add(nombre)
+    for obj in session.dirty:
+        nombre = CATALOGO_POR_MODELO.get(type(obj))
+        if nombre and session.is_modified(obj, include_collections=False):
+            pendientes.add(nombre)
+
+    # Renombrar o borrar una marca/categoría deja viejos los lookups nombre -> id
+    for obj in session.deleted:
+        if type(obj) in _lookups:
+            pendientes.add(obj.__tablename__)
+    for obj in session.dirty:
+        if type(obj) in _lookups and session.is_modified(obj, include_collections=False):
+            pendientes.add(obj.__tablename__)
+
+    invalidar_una_vez(session, *pendientes)
+
+
+def invalidar_una_vez(session, *nombres: str):
+    """Como invalidar_catalogo, pero sin volver a subir lo que ya subió esta transacción."""
+    ya_invalidados = session.info.setdefault("catalogos_invalidados", set())
+    pendientes = set(nombres) - ya_invalidados
+    if pendientes:
+        invalidar_catalogo(*sorted(pendientes), conexion=session.connection())
+        ya_invalidados.update(pendientes)
+
+
+@event.listens_for(Session, "after_commit")
+def _promover_lookups(session):
+    for (modelo, nombre), entrada in session.info.pop("lookups_pendientes", {}).items():
+        _lookups[modelo].set(nombre, entrada)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _limpiar_invalidados(session):
+    session.info.pop("catalogos_invalidados", None)
+    session.info.pop("lookups_pendientes", None)
+    session.info.pop("versiones_lookup", None)
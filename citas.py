@@ -0,0 +1,229 @@
+"""
+Agenda de citas (GET /disponibilidad, /citas).
+
+Una cita ocupa a su empleada en [inicio, fin) (UTC, como todas las fechas).
+Que dos citas no canceladas de la misma empleada no se encimen lo garantiza
+la BD en Postgres (EXCLUDE USING gist sobre tsrange, ver models.Cita); en
+SQLite lo revisa choques() antes de guardar.
+
+Disponibilidad de un día: una consulta trae las citas de la sucursal que
+tocan el día (ix_citas_sucursal_inicio), ya ordenadas por empleada e inicio,
+y los huecos de cada empleada salen de recorrer su lista una vez. Ninguna
+cita dura más de MAX_DURACION, así el rango sobre `inicio` queda acotado por
+los dos lados.
+
+Solo se ofrecen las empleadas que hacen el servicio (empleada_servicios), y
+ranking_asignacion() ordena a las que pueden atender un conjunto de
+servicios por cuántos items llevan hoy.
+
+Un sábado se piden los mismos días cientos de veces: las ocupaciones se
+cachean CITAS_CACHE_TTL segundos por (sucursal, día). Lo que se escribe en
+este proceso invalida su entrada; otro proceso puede ofrecer por unos
+segundos un turno que ya se tomó, y el POST lo rechaza con 409.
+"""
+import math
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import func, select
+
+from cache import TTLCache
+from config import Config
+from models import db, Cita, Empleada, EmpleadaServicio, Orden, OrdenItem
+
+ESTADOS = ("agendada", "completada", "cancelada")
+MAX_DURACION = timedelta(hours=12)
+
+cache_ocupaciones = TTLCache(256, Config.CITAS_CACHE_TTL)
+
+
+def dia_local(fecha: datetime) -> date:
+    """Día de la tienda (ZONA_HORARIA) de una fecha UTC sin zona."""
+    return fecha.replace(tzinfo=timezone.utc).astimezone(ZoneInfo(Config.ZONA_HORARIA)).date()
+
+
+def rango_del_dia(dia: date):
+    """[00:00, 24:00) del día de la tienda, en UTC sin zona."""
+    inicio = datetime.combine(dia, time(), tzinfo=ZoneInfo(Config.ZONA_HORARIA))
+    return tuple(f.astimezone(timezone.utc).replace(tzinfo=None) for f in (inicio, inicio + timedelta(days=1)))
+
+
+def horario_del_dia(dia: date):
+    """(apertura, cierre) de la tienda ese día, en UTC sin zona."""
+    zona = ZoneInfo(Config.ZONA_HORARIA)
+    return tuple(
+        datetime.combine(dia, time.fromisoformat(hora), tzinfo=zona).astimezone(timezone.utc).replace(tzinfo=None)
+        for hora in (Config.CITAS_APERTURA, Config.CITAS_CIERRE)
+    )
+
+
+def ocupaciones(sucursal_id: int, dia: date) -> dict:
+    """{empleada_id: [(inicio, fin), ...]} de las citas no canceladas del día, ordenadas."""
+    clave = (sucursal_id, dia)
+    resultado = cache_ocupaciones.get(clave)
+    if resultado is None:
+        desde, hasta = horario_del_dia(dia)
+        resultado = {}
+        filas = db.session.execute(
+            select(Cita.empleada_id, Cita.inicio, Cita.fin)
+            .where(
+                Cita.sucursal_id == sucursal_id,
+                Cita.inicio > desde - MAX_DURACION,
+                Cita.inicio < hasta,
+                Cita.fin > desde,
+                Cita.estado != "cancelada",
+            )
+            .order_by(Cita.empleada_id, Cita.inicio)
+        )
+        for empleada_id, inicio, fin in filas:
+            resultado.setdefault(empleada_id, []).append((inicio, fin))
+        cache_ocupaciones.set(clave, resultado)
+    return resultado
+
+
+def invalidar(sucursal_id: int, *fechas: datetime):
+    for fecha in fechas:
+        cache_ocupaciones.pop((sucursal_id, dia_local(fecha)))
+
+
+def horarios_libres(ocupadas, desde: datetime, hasta: datetime, duracion: timedelta, paso: timedelta):
+    """
+    Inicios posibles (desde, desde + paso, ...) de un turno de `duracion` que
+    termina antes de `hasta` y no se encima con `ocupadas` (ordenadas por inicio).
+    """
+    libres = []
+    t = desde
+    for inicio, fin in list(ocupadas) + [(hasta, hasta)]:
+        while t + duracion <= min(inicio, hasta):
+            libres.append(t)
+            t += paso
+        if fin > t:
+            # Primer paso de la grilla en o después de que termina la ocupada
+            t = desde + math.ceil((fin - desde) / paso) * paso
+    return libres
+
+
+def duracion_de(servicios) -> timedelta:
+    """Duración de una cita con esos servicios (los que no tienen dato cuentan CITAS_DURACION_DEFAULT)."""
+    return timedelta(minutes=sum(s.duracion_minutos or Config.CITAS_DURACION_DEFAULT for s in servicios))
+
+
+def con_habilidades(servicio_ids):
+    """SELECT de las empleadas que hacen todos esos servicios (por ix_empleada_servicios_servicio)."""
+    ids = set(servicio_ids)
+    return (
+        select(EmpleadaServicio.empleada_id)
+        .where(EmpleadaServicio.servicio_id.in_(ids))
+        .group_by(EmpleadaServicio.empleada_id)
+        .having(func.count() == len(ids))
+    )
+
+
+def disponibilidad(sucursal_id: int, dia: date, duracion: timedelta, empleada_ids=None, servicio_ids=None) -> list:
+    """
+    Turnos libres del día por empleada activa de la sucursal que hace los
+    servicios pedidos (las que no tienen ninguno libre también salen).
+    """
+    apertura, cierre = horario_del_dia(dia)
+    paso = timedelta(minutes=Config.CITAS_PASO_MINUTOS)
+    desde = apertura
+    ahora = datetime.utcnow()
+    if ahora > desde:
+        # Hoy: solo lo que todavía no empezó, alineado a la grilla
+        desde = apertura + math.ceil((ahora - apertura) / paso) * paso
+
+    query = select(Empleada.id, Empleada.nombre).where(
+        Empleada.sucursal_id == sucursal_id, Empleada.activo.is_(True)
+    )
+    if empleada_ids is not None:
+        query = query.where(Empleada.id.in_(empleada_ids))
+    if servicio_ids:
+        query = query.where(Empleada.id.in_(con_habilidades(servicio_ids)))
+
+    ocupadas = ocupaciones(sucursal_id, dia)
+    return [
+        {
+            "empleada_id": empleada_id,
+            "nombre": nombre,
+            "horarios": [
+                t.isoformat() for t in horarios_libres(ocupadas.get(empleada_id, ()), desde, cierre, duracion, paso)
+            ],
+        }
+        for empleada_id, nombre in db.session.execute(query.order_by(Empleada.nombre))
+    ]
+
+
+def choques(empleada_id: int, inicio: datetime, fin: datetime, excluir_id: int = None) -> bool:
+    """¿La empleada tiene otra cita no cancelada que se encima con [inicio, fin)?"""
+    query = select(Cita.id).where(
+        Cita.empleada_id == empleada_id,
+        Cita.inicio > inicio - MAX_DURACION,
+        Cita.inicio < fin,
+        Cita.fin > inicio,
+        Cita.estado != "cancelada",
+    )
+    if excluir_id is not None:
+        query = query.where(Cita.id != excluir_id)
+    return db.session.execute(query.limit(1)).first() is not None
+
+
+def ranking_asignacion(servicio_ids, sucursal_id: int, inicio: datetime = None, fin: datetime = None) -> list:
+    """
+    Empleadas activas de la sucursal que hacen todos los servicios, de menos a
+    más cargada: items de órdenes no anuladas de la sucursal en el día de la
+    tienda (de `inicio`, o de hoy). Con inicio/fin se descartan las que tienen
+    una cita que se encima. Todo en una consulta.
+    """
+    desde, hasta = rango_del_dia(dia_local(inicio or datetime.utcnow()))
+    carga = (
+        select(OrdenItem.empleada_id, func.count(OrdenItem.id).label("n_items"))
+        .join(Orden, Orden.id == OrdenItem.orden_id)
+        .where(
+            Orden.sucursal_id == sucursal_id,
+            Orden.fecha >= desde,
+            Orden.fecha < hasta,
+            Orden.anulada_en.is_(None),
+        )
+        .group_by(OrdenItem.empleada_id)
+        .subquery()
+    )
+    items = func.coalesce(carga.c.n_items, 0)
+    query = (
+        select(Empleada.id, Empleada.nombre, items.label("items"))
+        .outerjoin(carga, carga.c.empleada_id == Empleada.id)
+        .where(
+            Empleada.sucursal_id == sucursal_id,
+            Empleada.activo.is_(True),
+            Empleada.id.in_(con_habilidades(servicio_ids)),
+        )
+        .order_by(items, Empleada.nombre)
+    )
+    if inicio is not None:
+        ocupada = select(Cita.id).where(
+            Cita.empleada_id == Empleada.id,
+            Cita.inicio > inicio - MAX_DURACION,
+            Cita.inicio < fin,
+            Cita.fin > inicio,
+            Cita.estado != "cancelada",
+        )
+        query = query.where(~ocupada.exists())
+    return [
+        {"empleada_id": empleada_id, "nombre": nombre, "items_hoy": n}
+        for empleada_id, nombre, n in db.session.execute(query)
+    ]
+
+
+def cita_to_dict(cita: Cita) -> dict:
+    return {
+        "id": cita.id,
+        "sucursal_id": cita.sucursal_id,
+        "empleada_id": cita.empleada_id,
+        "servicio_id": cita.servicio_id,
+        "cliente_id": cita.cliente_id,
+        "inicio": cita.inicio.isoformat(),
+        "fin": cita.fin.isoformat(),
+        "duracion_minutos": int((cita.fin - cita.inicio).total_seconds() // 60),
+        "estado": cita.estado,
+        "notas": cita.notas,
+        "creado_en": cita.creado_en.isoformat() if cita.creado_en else None,
+    }
@@ -0,0 +1,497 @@
+"""
+Esquemas de los JSON que reciben las rutas de escritura.
+
+Cada esquema es un dict {campo: Campo(...)} (más reglas entre campos) y se
+compila una sola vez, al importar el módulo, en una función que recorre el
+payload completo (cada item de una orden incluido) y junta todos los
+problemas en vez de parar en el primero. Las rutas lo aplican con
+@valida("nombre"), antes de cualquier consulta:
+
+    400 {"error": "datos inválidos",
+         "errores": [{"campo": "items[2].precio_unitario", "error": "es requerido"}, ...]}
+
+Solo se revisan forma, tipos y rangos; lo que depende de la BD (que el
+producto exista, que la empleada haga el servicio, stock) sigue en la ruta.
+Los campos que el esquema no conoce se ignoran: hay clientes que mandan de más.
+
+POST /productos/import no tiene esquema: el archivo (CSV, JSON o NDJSON) se
+lee en streaming y cada fila se valida aparte (importacion._limpiar_fila),
+así una fila mala se reporta sin rechazar el archivo entero.
+"""
+import functools
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from flask import jsonify, request
+
+from citas import ESTADOS as ESTADOS_CITA
+from reportes import CRITERIOS_TOP
+from trabajos import TIPOS as TIPOS_TRABAJO
+
+TIPOS_ITEM = ("producto", "servicio")
+MODOS_AJUSTE = ("porcentaje", "monto", "valor")
+MAX_ERRORES = 50  # una orden con miles de items malos no devuelve miles de errores
+
+
+class Campo:
+    """
+    tipo: texto | entero | numero | booleano | fecha | objeto | lista.
+    nulo: si acepta null (default: solo los que no son requeridos).
+    minimo/maximo: rango (entero, numero); max_largo: texto.
+    opciones: valores permitidos. campos/reglas: de un objeto. items: Campo de cada elemento de una lista.
+    """
+
+    def __init__(self, tipo, requerido=False, nulo=None, minimo=None, maximo=None, max_largo=None,
+                 opciones=None, campos=None, reglas=(), items=None, min_items=None):
+        self.tipo = tipo
+        self.requerido = requerido
+        self.nulo = (not requerido) if nulo is None else nulo
+        self.minimo = minimo
+        self.maximo = maximo
+        self.max_largo = max_largo
+        self.opciones = opciones
+        self.campos = campos
+        self.reglas = reglas
+        self.items = items
+        self.min_items = min_items
+
+    def opcional(self):
+        """El mismo campo, sin ser requerido (para PUT/PATCH); sigue sin aceptar null si no lo aceptaba."""
+        copia = Campo.__new__(Campo)
+        copia.__dict__.update(self.__dict__, requerido=False)
+        return copia
+
+
+def parcial(campos: dict) -> dict:
+    """Esquema de actualización: los mismos campos, todos opcionales."""
+    return {nombre: campo.opcional() for nombre, campo in campos.items()}
+
+
+# ---------- Reglas entre campos de un objeto ----------
+
+def uno_de(*nombres, cuando=None):
+    """Al menos uno de los campos tiene que venir (no null). cuando=(campo, valor) la limita a ese caso."""
+    mensaje = f"requiere {' o '.join(nombres)}"
+
+    if cuando is not None:
+        mensaje += f" cuando {cuando[0]}='{cuando[1]}'"
+
+    def regla(obj):
+        if cuando is not None and obj.get(cuando[0]) != cuando[1]:
+            return None
+        for nombre in nombres:
+            if obj.get(nombre) is not None:
+                return None
+        return mensaje
+
+    return regla
+
+
+def solo_uno_de(*nombres):
+    """Exactamente uno de esos campos y ningún otro (p. ej. el modo de un ajuste masivo)."""
+    mensaje = f"requiere exactamente uno de {', '.join(nombres)}"
+
+    def regla(obj):
+        if len(obj) != 1 or next(iter(obj)) not in nombres:
+            return mensaje
+        return None
+
+    return regla
+
+
+def todos_o_id(*nombres):
+    """Objeto referenciado por id, o con todos esos campos para buscarlo/crearlo."""
+    def regla(obj):
+        if obj.get("id") is None and any(not obj.get(n) for n in nombres):
+            return f"requiere id, o {' y '.join(nombres)}"
+        return None
+
+    return regla
+
+
+# ---------- Compilación ----------
+
+def _es_entero(valor):
+    return isinstance(valor, int) and not isinstance(valor, bool)
+
+
+def _es_numero(valor):
+    if isinstance(valor, bool):
+        return False
+    if isinstance(valor, (int, float)):
+        return valor == valor and valor not in (float("inf"), float("-inf"))
+    if isinstance(valor, str):
+        try:
+            return Decimal(valor).is_finite()
+        except InvalidOperation:
+            return False
+    return False
+
+
+def _a_numero(valor):
+    # Los montos pueden venir como texto ("250.00"); ya se sabe que es numérico
+    return Decimal(valor) if isinstance(valor, str) else valor
+
+
+def _es_fecha(valor):
+    if not isinstance(valor, str) or not valor:
+        return False
+    try:
+        datetime.fromisoformat(valor[:-1] + "+00:00" if valor.endswith("Z") else valor)
+    except ValueError:
+        return False
+    return True
+
+
+TIPOS = {
+    "texto": (lambda v: isinstance(v, str), "debe ser texto"),
+    "entero": (_es_entero, "debe ser entero"),
+    "numero": (_es_numero, "debe ser numérico"),
+    # activo=1/0 lo mandan algunos clientes viejos
+    "booleano": (lambda v: isinstance(v, bool) or v in (0, 1), "debe ser true o false"),
+    "fecha": (_es_fecha, "debe ser fecha ISO 8601"),
+    "objeto": (lambda v: isinstance(v, dict), "debe ser un objeto"),
+    "lista": (lambda v: isinstance(v, list), "debe ser una lista"),
+}
+
+
+def _compilar_campo(campo: Campo):
+    """
+    Función (valor, ruta, errores) para un campo presente y no null. Solo
+    arma los chequeos que el campo usa, así no se repasan restricciones que no tiene.
+    """
+    es_tipo, mensaje_tipo = TIPOS[campo.tipo]
+    chequeos = []
+    if campo.tipo == "texto" and not campo.nulo:
+        chequeos.append(lambda v: "no puede ser vacío" if not v.strip() else None)
+    if campo.max_largo is not None:
+        largo = campo.max_largo
+        chequeos.append(lambda v: f"máximo {largo} caracteres" if len(v) > largo else None)
+    if campo.minimo is not None:
+        minimo = campo.minimo
+        chequeos.append(lambda v: f"debe ser >= {minimo}" if _a_numero(v) < minimo else None)
+    if campo.maximo is not None:
+        maximo = campo.maximo
+        chequeos.append(lambda v: f"debe ser <= {maximo}" if _a_numero(v) > maximo else None)
+    if campo.opciones is not None:
+        opciones = frozenset(campo.opciones)
+        mensaje = f"debe ser uno de {', '.join(campo.opciones)}"
+        chequeos.append(lambda v: mensaje if v not in opciones else None)
+    if campo.min_items is not None:
+        min_items = campo.min_items
+        chequeos.append(lambda v: f"debe tener al menos {min_items} elemento(s)" if len(v) < min_items else None)
+
+    anidado = None
+    if campo.tipo == "objeto" and campo.campos is not None:
+        anidado = compilar(campo.campos, campo.reglas)
+    elif campo.tipo == "lista" and campo.items is not None:
+        elemento = _compilar_presente(campo.items)
+
+        def anidado(lista, ruta, errores):
+            for i, item in enumerate(lista):
+                elemento(item, f"{ruta}[{i}]", errores)
+                if len(errores) >= MAX_ERRORES:
+                    return
+
+    def validar_valor(valor, ruta, errores):
+        if not es_tipo(valor):
+            errores.append({"campo": ruta, "error": mensaje_tipo})
+            return
+        for chequeo in chequeos:
+            error = chequeo(valor)
+            if error:
+                errores.append({"campo": ruta, "error": error})
+                return
+        if anidado is not None:
+            anidado(valor, ruta, errores)
+
+    return validar_valor
+
+
+def _compilar_presente(campo: Campo):
+    """Como _compilar_campo, pero resolviendo null (elementos de una lista)."""
+    validar_valor = _compilar_campo(campo)
+
+    def validar_elemento(valor, ruta, errores):
+        if valor is None:
+            if not campo.nulo:
+                errores.append({"campo": ruta, "error": "no puede ser null"})
+            return
+        validar_valor(valor, ruta, errores)
+
+    return validar_elemento
+
+
+def compilar(campos: dict, reglas=()):
+    """
+    Función (data, ruta, errores) que valida un objeto con esos campos.
+    Recorre lo que trae el payload, no todo el esquema: la mayoría de los
+    campos son opcionales y no vienen (un item de orden usa 4-5 de 8).
+    """
+    requeridos = tuple(nombre for nombre, campo in campos.items() if campo.requerido)
+    tabla = {nombre: (campo.nulo or campo.requerido, _compilar_campo(campo)) for nombre, campo in campos.items()}
+    reglas = tuple(reglas)
+
+    def validar_objeto(data, ruta, errores):
+        prefijo = f"{ruta}." if ruta else ""
+        for nombre in requeridos:
+            if data.get(nombre) is None:
+                errores.append({"campo": prefijo + nombre, "error": "es requerido"})
+        for nombre, valor in data.items():
+            entrada = tabla.get(nombre)
+            if entrada is None:
+                continue
+            if valor is None:
+                # Los requeridos ya se reportaron arriba
+                if not entrada[0]:
+                    errores.append({"campo": prefijo + nombre, "error": "no puede ser null"})
+                continue
+            entrada[1](valor, prefijo + nombre, errores)
+        for regla in reglas:
+            error = regla(data)
+            if error:
+                errores.append({"campo": ruta or "(cuerpo)", "error": error})
+
+    return validar_objeto
+
+
+# ---------- Esquemas por endpoint ----------
+
+PRODUCTO = {
+    "descripcion": Campo("texto", requerido=True, max_largo=255),
+    "sku": Campo("texto", max_largo=64),
+    "costo": Campo("numero", requerido=True, minimo=0),
+    "precio": Campo("numero", requerido=True, minimo=0),
+    "cantidad": Campo("entero", nulo=False, minimo=0),
+    "stock_minimo": Campo("entero", minimo=0),
+    "imagen": Campo("texto"),
+    "marca_id": Campo("entero"),
+    "marca": Campo("texto", max_largo=120),
+    "categoria_id": Campo("entero"),
+    "categoria": Campo("texto", max_largo=120),
+}
+
+SERVICIO = {
+    "descripcion": Campo("texto", requerido=True, max_largo=255),
+    "costo": Campo("numero", requerido=True, minimo=0),
+    "precio": Campo("numero", requerido=True, minimo=0),
+    "imagen": Campo("texto"),
+    "categoria_id": Campo("entero"),
+    "categoria": Campo("texto", max_largo=120),
+    "duracion_minutos": Campo("entero", minimo=1),
+}
+
+EMPLEADA_DE_ITEM = {
+    "nombre": Campo("texto", requerido=True, max_largo=120),
+    "telefono": Campo("texto", max_largo=30),
+}
+
+ITEM_ORDEN = Campo(
+    "objeto",
+    requerido=True,
+    campos={
+        "tipo": Campo("texto", requerido=True, opciones=TIPOS_ITEM),
+        "producto_id": Campo("entero"),
+        "sku": Campo("texto", max_largo=64),
+        "servicio_id": Campo("entero"),
+        "cantidad": Campo("entero", nulo=False, minimo=1),
+        "precio_unitario": Campo("numero", requerido=True, minimo=0),
+        "empleada_id": Campo("entero"),
+        "empleada": Campo("objeto", campos=EMPLEADA_DE_ITEM),
+    },
+    reglas=(
+        uno_de("empleada_id", "empleada"),
+        uno_de("producto_id", "sku", cuando=("tipo", "producto")),
+        uno_de("servicio_id", cuando=("tipo", "servicio")),
+    ),
+)
+
+ORDEN = {
+    "codigo": Campo("texto", requerido=True, max_largo=20),
+    "tipo_pago": Campo("texto", requerido=True, max_largo=50),
+    "referencia": Campo("texto", max_largo=120),
+    "fecha": Campo("fecha"),
+    "descuento": Campo("numero"),
+    "sucursal_id": Campo("entero"),
+    "cliente": Campo(
+        "objeto",
+        requerido=True,
+        campos={
+            "id": Campo("entero"),
+            "nombre": Campo("texto", max_largo=120),
+            "telefono": Campo("texto", max_largo=30),
+        },
+        reglas=(todos_o_id("nombre", "telefono"),),
+    ),
+    "items": Campo("lista", requerido=True, items=ITEM_ORDEN, min_items=1),
+}
+
+ACTUALIZAR_ORDEN = {
+    **parcial({k: ORDEN[k] for k in ("codigo", "tipo_pago", "referencia", "descuento", "items")}),
+    "fecha": Campo("fecha", nulo=False),
+    "cliente_id": Campo("entero", nulo=False),
+}
+
+CLIENTE = {
+    "nombre": Campo("texto", requerido=True, max_largo=120),
+    "telefono": Campo("texto", requerido=True, max_largo=30),
+}
+
+EMPLEADA = {
+    "nombre": Campo("texto", requerido=True, max_largo=120),
+    "telefono": Campo("texto", max_largo=30),
+    "activo": Campo("booleano", nulo=False),
+    "sucursal_id": Campo("entero"),
+}
+
+SUCURSAL = {
+    "nombre": Campo("texto", requerido=True, max_largo=120),
+    "direccion": Campo("texto", max_largo=255),
+    "telefono": Campo("texto", max_largo=30),
+    "activo": Campo("booleano", nulo=False),
+}
+
+CATEGORIA_PRODUCTO = {
+    "nombre": Campo("texto", requerido=True, max_largo=120),
+    "descripcion": Campo("texto", max_largo=255),
+    "activo": Campo("booleano", nulo=False),
+    "stock_minimo": Campo("entero", minimo=0),
+}
+
+CATALOGO_SIMPLE = {  # categorías de servicios y marcas
+    "nombre": Campo("texto", requerido=True, max_largo=120),
+    "descripcion": Campo("texto", max_largo=255),
+    "activo": Campo("booleano", nulo=False),
+}
+
+USUARIO = {
+    "username": Campo("texto", requerido=True, max_largo=80),
+    "password": Campo("texto", requerido=True),
+    "is_admin": Campo("booleano", nulo=False),
+}
+
+CITA = {
+    "empleada_id": Campo("entero", requerido=True),
+    "servicio_id": Campo("entero", requerido=True),
+    "inicio": Campo("fecha", requerido=True),
+    "duracion_minutos": Campo("entero", minimo=1),
+    "cliente_id": Campo("entero"),
+    "notas": Campo("texto", max_largo=255),
+}
+
+ACTUALIZAR_CITA = {
+    **parcial({k: CITA[k] for k in ("empleada_id", "inicio", "notas")}),
+    "duracion_minutos": Campo("entero", nulo=False, minimo=1),
+    "estado": Campo("texto", nulo=False, opciones=ESTADOS_CITA),
+}
+
+# PATCH /productos/bulk y /servicios/bulk
+AJUSTE = Campo(
+    "objeto",
+    nulo=False,
+    campos={modo: Campo("numero", nulo=False) for modo in MODOS_AJUSTE},
+    reglas=(solo_uno_de(*MODOS_AJUSTE),),
+)
+
+FILTRO_BULK = {
+    "categoria_id": Campo("entero"),
+    "ids": Campo("lista", items=Campo("entero", nulo=False), min_items=1),
+    "todos": Campo("booleano", nulo=False),
+}
+
+PRODUCTOS_BULK = {
+    "filtro": Campo("objeto", requerido=True, campos={**FILTRO_BULK, "marca_id": Campo("entero")}),
+    "precio": AJUSTE,
+    "costo": AJUSTE,
+    "cantidad": AJUSTE,
+    "dry_run": Campo("booleano", nulo=False),
+}
+
+SERVICIOS_BULK = {
+    "filtro": Campo("objeto", requerido=True, campos=FILTRO_BULK),
+    "precio": AJUSTE,
+    "costo": AJUSTE,
+    "dry_run": Campo("booleano", nulo=False),
+}
+
+# Los parámetros de todos los tipos de trabajo juntos (no se pisan); lo que
+# depende del tipo (requeridos, inicio < fin) lo revisa trabajos.py
+TRABAJO = {
+    "tipo": Campo("texto", requerido=True, opciones=sorted(TIPOS_TRABAJO)),
+    "parametros": Campo("objeto", campos={
+        "formato": Campo("texto", opciones=("csv", "json")),
+        "inicio": Campo("fecha"),
+        "fin": Campo("fecha"),
+        "sucursal_id": Campo("entero"),
+        "n": Campo("entero", minimo=1),
+        "criterio": Campo("texto", opciones=CRITERIOS_TOP),
+        "tipo": Campo("texto", opciones=TIPOS_ITEM),
+        "categoria_id": Campo("entero"),
+    }),
+}
+
+ESQUEMAS = {
+    "crear_producto": PRODUCTO,
+    "actualizar_producto": parcial(PRODUCTO),
+    "crear_servicio": SERVICIO,
+    "actualizar_servicio": parcial(SERVICIO),
+    "crear_orden": ORDEN,
+    "actualizar_orden": ACTUALIZAR_ORDEN,
+    "crear_cliente": CLIENTE,
+    "actualizar_cliente": parcial(CLIENTE),
+    "crear_empleada": EMPLEADA,
+    "actualizar_empleada": parcial(EMPLEADA),
+    "asignar_servicios_empleada": {
+        "servicio_ids": Campo("lista", requerido=True, items=Campo("entero", nulo=False)),
+    },
+    "crear_sucursal": SUCURSAL,
+    "actualizar_sucursal": parcial(SUCURSAL),
+    "ajustar_stock_sucursal": {"cantidad": Campo("entero", requerido=True)},
+    "crear_categoria_producto": CATEGORIA_PRODUCTO,
+    "actualizar_categoria_producto": parcial(CATEGORIA_PRODUCTO),
+    "crear_categoria_servicio": CATALOGO_SIMPLE,
+    "actualizar_categoria_servicio": parcial(CATALOGO_SIMPLE),
+    "crear_marca_producto": CATALOGO_SIMPLE,
+    "actualizar_marca_producto": parcial(CATALOGO_SIMPLE),
+    "crear_usuario": USUARIO,
+    "actualizar_usuario": parcial(USUARIO),
+    "login": {"username": Campo("texto", requerido=True), "password": Campo("texto", requerido=True)},
+    "crear_cita": CITA,
+    "actualizar_cita": ACTUALIZAR_CITA,
+    "actualizar_productos_bulk": PRODUCTOS_BULK,
+    "actualizar_servicios_bulk": SERVICIOS_BULK,
+    "crear_trabajo": TRABAJO,
+}
+
+# Se compilan una vez, al importar
+VALIDADORES = {nombre: compilar(campos) for nombre, campos in ESQUEMAS.items()}
+
+
+def _errores(validador, data) -> list:
+    if not isinstance(data, dict):
+        return [{"campo": "(cuerpo)", "error": "debe ser un objeto JSON"}]
+    errores = []
+    validador(data, "", errores)
+    return errores[:MAX_ERRORES]
+
+
+def validar(nombre: str, data) -> list:
+    """Lista de errores del payload según el esquema `nombre` (vacía si está bien)."""
+    return _errores(VALIDADORES[nombre], data)
+
+
+def valida(nombre: str):
+    """Decorador de ruta: responde 400 con todos los errores antes de entrar a la vista."""
+    validador = VALIDADORES[nombre]  # KeyError al arrancar si el esquema no existe
+
+    def decorador(vista):
+        @functools.wraps(vista)
+        def envoltura(*args, **kwargs):
+            errores = _errores(validador, request.get_json(silent=True))
+            if errores:
+                return jsonify({"error": "datos inválidos", "errores": errores}), 400
+            return vista(*args, **kwargs)
+
+        return envoltura
+
+    return decorador
@@ -0,0 +1,241 @@
+"""
+Eventos en vivo para el tablero y el POS (GET /eventos, Server-Sent Events).
+
+Las rutas llaman a emitir() / marcar_stock() dentro de la transacción y los
+eventos salen solo si hay commit (se descartan con el rollback):
+
+- orden_creada / orden_actualizada / orden_anulada: resumen de la orden
+- stock: {"productos": [{"id", "cantidad"}, ...]} o {"productos": null} cuando
+  cambiaron demasiados (import, ajuste masivo) y conviene recargar el listado
+- recargar: el suscriptor se quedó atrás y se perdieron eventos
+
+Reparto:
+- En cada proceso un Broker reparte los eventos a sus suscriptores. Cada
+  suscriptor tiene una cola acotada (EVENTOS_BUFFER): si el cliente no lee a
+  tiempo se vacía su cola y recibe un solo `recargar`, en vez de acumular
+  memoria o frenar al que publica.
+- Con Postgres (y EVENTOS_NOTIFY) los eventos se mandan con pg_notify en la
+  misma transacción; un thread por proceso hace LISTEN y los pasa a su Broker,
+  así llegan a los suscriptores de todos los workers. Sin Postgres se publica
+  directo en el Broker local después del commit (un solo proceso, desarrollo).
+"""
+import asyncio
+import json
+import logging
+import os
+import queue
+import select as selectors
+import threading
+import time
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from config import Config
+from models import db, Producto
+
+log = logging.getLogger(__name__)
+
+CANAL = "kiara_eventos"
+# Más productos que esto en un commit -> evento de stock sin detalle (NOTIFY acepta < 8000 bytes)
+MAX_PRODUCTOS_EVENTO = 100
+RECARGAR = {"tipo": "recargar", "datos": None}
+
+
+# ---------- Suscripciones y broker (por proceso) ----------
+
+class Suscripcion:
+    """Cola acotada de un cliente conectado, para handlers con threads (Flask)."""
+
+    def __init__(self, tipos=None, tamano=None):
+        self.tipos = frozenset(tipos) if tipos else None
+        self.perdidos = 0
+        self._cola = self._nueva_cola(tamano or Config.EVENTOS_BUFFER)
+        self._lock = threading.Lock()
+
+    def _nueva_cola(self, tamano):
+        return queue.Queue(maxsize=tamano)
+
+    def acepta(self, evento) -> bool:
+        return self.tipos is None or evento["tipo"] in self.tipos or evento["tipo"] == "recargar"
+
+    def entregar(self, evento):
+        """Lo llama el Broker; nunca bloquea."""
+        with self._lock:
+            self._poner(evento)
+
+    def _poner(self, evento):
+        try:
+            self._cola.put_nowait(evento)
+        except (queue.Full, asyncio.QueueFull):
+            # Cliente lento: se descarta lo pendiente y se le pide recargar
+            while not self._cola.empty():
+                self._cola.get_nowait()
+                self.perdidos += 1
+            self._cola.put_nowait(RECARGAR)
+
+    def siguiente(self, espera: float):
+        """El próximo evento, o None si no llegó ninguno en `espera` segundos."""
+        try:
+            return self._cola.get(timeout=espera)
+        except queue.Empty:
+            return None
+
+
+class SuscripcionAsync(Suscripcion):
+    """Igual, pero la cola vive en el event loop (handler ASGI en asgi.py)."""
+
+    def __init__(self, loop, tipos=None, tamano=None):
+        self._loop = loop
+        super().__init__(tipos, tamano)
+
+    def _nueva_cola(self, tamano):
+        return asyncio.Queue(maxsize=tamano)
+
+    def entregar(self, evento):
+        self._loop.call_soon_threadsafe(self._poner, evento)
+
+    async def siguiente(self, espera: float):
+        try:
+            return await asyncio.wait_for(self._cola.get(), espera)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broker:
+    def __init__(self):
+        self._suscripciones = set()
+        self._lock = threading.Lock()
+
+    def agregar(self, suscripcion: Suscripcion) -> Suscripcion:
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    def quitar(self, suscripcion: Suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def publicar(self, evento: dict):
+        with self._lock:
+            destinos = [s for s in self._suscripciones if s.acepta(evento)]
+        for suscripcion in destinos:
+            suscripcion.entregar(evento)
+
+    def __len__(self):
+        return len(self._suscripciones)
+
+
+broker = Broker()
+
+
+def formato_sse(evento: dict) -> str:
+    return f"event: {evento['tipo']}\ndata: {json.dumps(evento['datos'], default=str)}\n\n"
+
+
+# ---------- LISTEN en Postgres ----------
+
+_oyente = {"pid": None}
+_oyente_lock = threading.Lock()
+
+
+def usa_notify(engine) -> bool:
+    return Config.EVENTOS_NOTIFY and engine.dialect.name == "postgresql"
+
+
+def iniciar_oyente(engine):
+    """
+    Arranca (una vez por proceso) el thread que hace LISTEN. Se llama al
+    suscribirse, no al importar: con preload_app el master no debe tenerlo,
+    cada worker levanta el suyo después del fork.
+    """
+    if not usa_notify(engine):
+        return
+    with _oyente_lock:
+        if _oyente["pid"] == os.getpid():
+            return
+        _oyente["pid"] = os.getpid()
+        threading.Thread(target=_escuchar, args=(engine,), name="eventos-listen", daemon=True).start()
+
+
+def _escuchar(engine):
+    while True:
+        try:
+            # Conexión propia, fuera del pool: queda ocupada mientras viva el proceso
+            conexion = engine.raw_connection()
+            conexion.detach()
+            pg = conexion.driver_connection
+            pg.autocommit = True
+            with pg.cursor() as cursor:
+                cursor.execute(f"LISTEN {CANAL}")
+            while True:
+                if selectors.select([pg], [], [], Config.EVENTOS_HEARTBEAT) == ([], [], []):
+                    continue
+                pg.poll()
+                while pg.notifies:
+                    broker.publicar(json.loads(pg.notifies.pop(0).payload))
+        except Exception:
+            log.exception("se perdió el LISTEN de eventos, reintentando")
+            # Lo que se notificó mientras tanto no llegó: que los clientes recarguen
+            broker.publicar(RECARGAR)
+            time.sleep(5)
+
+
+# ---------- Emisión (dentro de la transacción) ----------
+
+def emitir(tipo: str, datos):
+    """Agrega un evento a la transacción actual; se publica si hay commit."""
+    db.session.info.setdefault("eventos", []).append({"tipo": tipo, "datos": datos})
+
+
+def marcar_stock(producto_ids=None):
+    """
+    Anota que cambió el stock de esos productos. Se junta todo lo de la
+    transacción en un solo evento `stock`. Sin ids: cambiaron muchos.
+    """
+    pendientes = db.session.info.setdefault("stock", set())
+    if producto_ids is None:
+        pendientes.add(None)
+    else:
+        pendientes.update(producto_ids)
+
+
+@event.listens_for(Session, "before_commit")
+def _preparar_eventos(session):
+    notify = usa_notify(session.get_bind())
+    if not notify and not len(broker):
+        # Nadie escucha en este proceso y no hay otros a quien avisar
+        session.info.pop("eventos", None)
+        session.info.pop("stock", None)
+        return
+
+    stock = session.info.pop("stock", None)
+    if stock:
+        if None in stock or len(stock) > MAX_PRODUCTOS_EVENTO:
+            productos = None
+        else:
+            # Una lectura por PK con los valores ya escritos en esta transacción
+            productos = [
+                {"id": id_, "cantidad": cantidad}
+                for id_, cantidad in session.execute(
+                    select(Producto.id, Producto.cantidad).where(Producto.id.in_(stock)).order_by(Producto.id)
+                )
+            ]
+        session.info.setdefault("eventos", []).append({"tipo": "stock", "datos": {"productos": productos}})
+
+    if session.info.get("eventos") and notify:
+        # NOTIFY es transaccional: Postgres lo entrega recién con el commit
+        for evento in session.info.pop("eventos"):
+            session.execute(select(func.pg_notify(CANAL, json.dumps(evento, default=str))))
+
+
+@event.listens_for(Session, "after_commit")
+def _publicar_eventos(session):
+    for evento in session.info.pop("eventos", ()):
+        broker.publicar(evento)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_eventos(session):
+    session.info.pop("eventos", None)
+    session.info.pop("stock", None)
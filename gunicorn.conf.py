@@ -0,0 +1,68 @@
+"""
+Configuración de gunicorn.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Workers y threads se calculan a partir de los CPUs y del pool de BD:
+- threads por worker <= conexiones del pool (cada thread puede tener una)
+- workers <= 2 * CPUs + 1, y sin pasar DB_MAX_CONEXIONES en total
+Todo se puede forzar con GUNICORN_WORKERS / GUNICORN_THREADS.
+
+Deploy sin cortar requests: con preload_app (default) el código se importa
+una sola vez en el master, así que kill -HUP solo reinicia los workers con
+el código viejo. Para tomar código nuevo:
+
+    kill -USR2 <pid del master>   # arranca un master nuevo con el código nuevo
+    kill -QUIT <pid del viejo>    # cuando el nuevo ya atiende, el viejo termina sus requests
+
+(o reiniciar el servicio). Con GUNICORN_PRELOAD=0 cada worker importa la app
+y kill -HUP sí carga el código nuevo, a cambio de no compartir memoria.
+"""
+import multiprocessing
+import os
+
+from config import Config
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+
+_cpus = multiprocessing.cpu_count()
+_conexiones_por_worker = Config.DB_POOL_SIZE + Config.DB_MAX_OVERFLOW
+
+threads = int(os.getenv("GUNICORN_THREADS", min(4, _conexiones_por_worker)))
+workers = int(os.getenv(
+    "GUNICORN_WORKERS",
+    max(1, min(2 * _cpus + 1, Config.DB_MAX_CONEXIONES // _conexiones_por_worker)),
+))
+worker_class = "gthread" if threads > 1 else "sync"
+
+# Importar la app una vez en el master; los workers la heredan (copy-on-write)
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+# Reciclar workers de vez en cuando para acotar fugas de memoria
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    """
+    Con preload_app el engine se creó en el master: cada worker debe empezar
+    con su propio pool, sin cerrar las conexiones del padre.
+    """
+    if not preload_app:
+        return
+    from models import db
+    from wsgi import app
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def when_ready(server):
+    server.log.info("workers=%s threads=%s (cpus=%s, conexiones por worker=%s)",
+                    workers, threads, _cpus, _conexiones_por_worker)
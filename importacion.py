@@ -0,0 +1,368 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import insert, select, text
+
+from cambios import registrar_ids
+from catalogo import normalizar_sku
+from config import Config
+from inventario import LibroMovimientos
+from models import db, insert_para_dialecto, Producto, MarcaProducto, CategoriaProducto
+
+
+# Columnas de producto que entran/salen en import/export (además de marca y categoría)
+COLUMNAS_PRODUCTO = ["descripcion", "sku", "costo", "precio", "cantidad", "stock_minimo", "imagen"]
+COLUMNAS_EXPORT = ["id", "marca", "categoria"] + COLUMNAS_PRODUCTO
+
+TAM_LOTE = 1000
+MAX_ERRORES = 50
+
+
+def resolver_nombres(modelo, nombres) -> dict:
+    """
+    Devuelve {nombre: id} para una tabla de catálogo (marcas / categorías),
+    creando en un solo INSERT ... ON CONFLICT DO NOTHING los que falten.
+    """
+    nombres = {str(n) for n in nombres if n}
+    if not nombres:
+        return {}
+
+    existentes = dict(
+        db.session.execute(select(modelo.nombre, modelo.id).where(modelo.nombre.in_(nombres))).all()
+    )
+    faltantes = nombres - existentes.keys()
+    if faltantes:
+        ahora = datetime.utcnow()
+        stmt = insert_para_dialecto(modelo.__table__).on_conflict_do_nothing(index_elements=["nombre"])
+        db.session.execute(stmt, [
+            {"nombre": n, "activo": True, "creado_en": ahora} for n in faltantes
+        ])
+        nuevos = dict(
+            db.session.execute(select(modelo.nombre, modelo.id).where(modelo.nombre.in_(faltantes))).all()
+        )
+        registrar_ids(modelo.__tablename__, nuevos.values(), "insert")
+        existentes.update(nuevos)
+    return existentes
+
+
+# ---------- Lectura ----------
+
+def leer_filas(stream, formato: str):
+    """
+    Itera las filas (dicts) de un archivo de catálogo.
+    formato: 'csv', 'json' (arreglo de objetos) o 'ndjson' (un objeto por línea).
+    """
+    if formato == "csv":
+        texto = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+        yield from csv.DictReader(texto)
+    elif formato == "ndjson":
+        for linea in io.TextIOWrapper(stream, encoding="utf-8"):
+            if linea.strip():
+                yield json.loads(linea)
+    elif formato == "json":
+        data = json.load(io.TextIOWrapper(stream, encoding="utf-8"))
+        if not isinstance(data, list):
+            raise ValueError("el JSON debe ser un arreglo de productos")
+        yield from data
+    else:
+        raise ValueError(f"formato no soportado: {formato}")
+
+
+def _vacio(valor):
+    return valor is None or (isinstance(valor, str) and not valor.strip())
+
+
+def _limpiar_fila(fila: dict) -> dict:
+    """Normaliza tipos de una fila; lanza ValueError con el problema."""
+    if _vacio(fila.get("descripcion")):
+        raise ValueError("descripcion es requerida")
+
+    limpia = {
+        "id": None if _vacio(fila.get("id")) else int(fila["id"]),
+        "marca": None if _vacio(fila.get("marca")) else str(fila["marca"]).strip(),
+        "categoria": None if _vacio(fila.get("categoria")) else str(fila["categoria"]).strip(),
+        "descripcion": str(fila["descripcion"]).strip(),
+        "sku": normalizar_sku(fila.get("sku")),
+        "cantidad": 0 if _vacio(fila.get("cantidad")) else int(fila["cantidad"]),
+        "stock_minimo": None if _vacio(fila.get("stock_minimo")) else int(fila["stock_minimo"]),
+        "imagen": None if _vacio(fila.get("imagen")) else fila["imagen"],
+    }
+    for campo in ("costo", "precio"):
+        if _vacio(fila.get(campo)):
+            raise ValueError(f"{campo} es requerido")
+        try:
+            limpia[campo] = Decimal(str(fila[campo]))
+        except InvalidOperation:
+            raise ValueError(f"{campo} no es un número válido")
+    return limpia
+
+
+class ResumenImportacion:
+    def __init__(self):
+        self.filas = 0
+        self.insertados = 0
+        self.actualizados = 0
+        self.errores = []
+        self.inicio = time.perf_counter()
+
+    def error(self, fila: int, mensaje: str):
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append({"fila": fila, "error": mensaje})
+
+    def to_dict(self):
+        segundos = time.perf_counter() - self.inicio
+        validas = self.insertados + self.actualizados
+        return {
+            "filas": self.filas,
+            "insertados": self.insertados,
+            "actualizados": self.actualizados,
+            "con_error": self.filas - validas,
+            "errores": self.errores,
+            "segundos": round(segundos, 3),
+            "filas_por_segundo": round(validas / segundos, 1) if segundos else None,
+        }
+
+
+def _lotes_validos(filas, resumen: ResumenImportacion):
+    lote = []
+    for n, fila in enumerate(filas, start=1):
+        resumen.filas += 1
+        try:
+            limpia = _limpiar_fila(fila)
+        except (ValueError, TypeError, AttributeError) as e:
+            resumen.error(n, str(e))
+            continue
+        limpia["fila"] = n
+        lote.append(limpia)
+        if len(lote) >= TAM_LOTE:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _con_ids(lote):
+    """Cambia nombres de marca/categoría por ids (un par de consultas por lote)."""
+    marcas = resolver_nombres(MarcaProducto, {f["marca"] for f in lote})
+    categorias = resolver_nombres(CategoriaProducto, {f["categoria"] for f in lote})
+    for f in lote:
+        f["marca_id"] = marcas.get(f.pop("marca"))
+        f["categoria_id"] = categorias.get(f.pop("categoria"))
+    return lote
+
+
+# ---------- Importación ----------
+
+def importar_productos(filas) -> dict:
+    """
+    Inserta/actualiza productos desde un iterable de dicts.
+    Las filas con 'id' se actualizan (upsert por id); las demás se insertan.
+    No hace commit.
+    """
+    resumen = ResumenImportacion()
+    if db.engine.dialect.name == "postgresql":
+        _importar_copy(filas, resumen)
+    else:
+        _importar_insert(filas, resumen)
+    return resumen.to_dict()
+
+
+def _importar_insert(filas, resumen):
+    """Camino genérico: executemany por lotes con INSERT ... ON CONFLICT (id)."""
+    tabla = Producto.__table__
+    columnas = ["marca_id", "categoria_id"] + COLUMNAS_PRODUCTO
+
+    for lote in _lotes_validos(filas, resumen):
+        _con_ids(lote)
+        libro = LibroMovimientos(total=False)  # el upsert ya fija productos.cantidad
+
+        # Si un id se repite en el lote gana la última fila
+        con_id = list({f["id"]: f for f in lote if f["id"] is not None}.values())
+        sin_id = [f for f in lote if f["id"] is None]
+        resumen.actualizados += sum(1 for f in lote if f["id"] is not None) - len(con_id)
+
+        if con_id:
+            actuales = dict(db.session.execute(
+                select(Producto.id, Producto.cantidad).where(Producto.id.in_([f["id"] for f in con_id]))
+            ).all())
+            stmt = insert_para_dialecto(tabla)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["id"],
+                set_={c: stmt.excluded[c] for c in columnas},
+            )
+            db.session.execute(stmt, [{k: f[k] for k in ["id"] + columnas} for f in con_id])
+            registrar_ids("productos", [f["id"] for f in con_id if f["id"] in actuales], "update")
+            registrar_ids("productos", [f["id"] for f in con_id if f["id"] not in actuales], "insert")
+            for f in con_id:
+                libro.registrar(f["id"], f["cantidad"] - actuales.get(f["id"], 0), "ajuste")
+                if f["id"] in actuales:
+                    resumen.actualizados += 1
+                else:
+                    resumen.insertados += 1
+
+        if sin_id:
+            nuevos = db.session.execute(
+                insert(tabla).returning(tabla.c.id, tabla.c.cantidad),
+                [{k: f[k] for k in columnas} for f in sin_id],
+            )
+            ids_nuevos = []
+            for producto_id, cantidad in nuevos:
+                libro.registrar(producto_id, cantidad, "ajuste")
+                ids_nuevos.append(producto_id)
+                resumen.insertados += 1
+            registrar_ids("productos", ids_nuevos, "insert")
+
+        libro.guardar()
+
+
+def _importar_copy(filas, resumen):
+    """
+    Camino rápido para Postgres: COPY a una tabla temporal y luego unos pocos
+    INSERT ... SELECT set-based (upsert, kardex y altas nuevas).
+    """
+    conexion = db.session.connection()
+    conexion.execute(text("""
+        CREATE TEMP TABLE productos_staging (
+            fila integer, id integer, marca_id integer, categoria_id integer,
+            descripcion varchar(255), sku varchar(64), costo numeric(10, 2), precio numeric(10, 2),
+            cantidad integer, stock_minimo integer, imagen text
+        ) ON COMMIT DROP
+    """))
+    columnas_staging = ["fila", "id", "marca_id", "categoria_id"] + COLUMNAS_PRODUCTO
+    cursor = conexion.connection.cursor()
+
+    for lote in _lotes_validos(filas, resumen):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for f in _con_ids(lote):
+            writer.writerow(["" if f[c] is None else f[c] for c in columnas_staging])
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY productos_staging ({', '.join(columnas_staging)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+
+    columnas = ["marca_id", "categoria_id"] + COLUMNAS_PRODUCTO
+    lista = ", ".join(columnas)
+    # Los ajustes del import van al stock de la sucursal por defecto
+    valores = {"ahora": datetime.utcnow(), "sucursal": Config.SUCURSAL_DEFAULT_ID}
+
+    # Última fila por id
+    conexion.execute(text(f"""
+        CREATE TEMP TABLE productos_staging_ids ON COMMIT DROP AS
+        SELECT DISTINCT ON (id) id, {lista} FROM productos_staging
+        WHERE id IS NOT NULL ORDER BY id, fila DESC
+    """))
+    existentes, con_id = conexion.execute(text("""
+        SELECT count(p.id), count(*) FROM productos_staging_ids s
+        LEFT JOIN productos p ON p.id = s.id
+    """)).one()
+    duplicadas = conexion.execute(text(
+        "SELECT count(*) FROM productos_staging WHERE id IS NOT NULL"
+    )).scalar() - con_id
+    resumen.actualizados += existentes + duplicadas
+    resumen.insertados += con_id - existentes
+
+    # Diferencia de stock de cada id contra lo actual, antes del upsert
+    conexion.execute(text("""
+        CREATE TEMP TABLE productos_staging_deltas ON COMMIT DROP AS
+        SELECT s.id, s.cantidad - coalesce(p.cantidad, 0) AS cantidad
+        FROM productos_staging_ids s LEFT JOIN productos p ON p.id = s.id
+        WHERE s.cantidad <> coalesce(p.cantidad, 0)
+    """))
+    conexion.execute(text("""
+        INSERT INTO movimientos_inventario (producto_id, tipo, cantidad, sucursal_id, fecha)
+        SELECT id, 'ajuste', cantidad, :sucursal, :ahora FROM productos_staging_deltas
+    """), valores)
+    # Bitácora de cambios (ver cambios.py): antes del upsert, para distinguir altas de cambios
+    existe = dict(conexion.execute(text("""
+        SELECT s.id, p.id IS NOT NULL FROM productos_staging_ids s LEFT JOIN productos p ON p.id = s.id
+    """)).all())
+    registrar_ids("productos", [i for i, si in existe.items() if si], "update")
+    registrar_ids("productos", [i for i, si in existe.items() if not si], "insert")
+    conexion.execute(text(f"""
+        INSERT INTO productos (id, {lista})
+        SELECT id, {lista} FROM productos_staging_ids
+        ON CONFLICT (id) DO UPDATE SET {", ".join(f"{c} = excluded.{c}" for c in columnas)}
+    """))
+    conexion.execute(text("""
+        INSERT INTO stock_sucursales (sucursal_id, producto_id, cantidad)
+        SELECT :sucursal, id, cantidad FROM productos_staging_deltas
+        ON CONFLICT (sucursal_id, producto_id) DO UPDATE SET cantidad = stock_sucursales.cantidad + excluded.cantidad
+    """), valores)
+
+    ids_nuevos = conexion.execute(text(f"""
+        WITH nuevos AS (
+            INSERT INTO productos ({lista})
+            SELECT {lista} FROM productos_staging WHERE id IS NULL ORDER BY fila
+            RETURNING id, cantidad
+        ), kardex AS (
+            INSERT INTO movimientos_inventario (producto_id, tipo, cantidad, sucursal_id, fecha)
+            SELECT id, 'ajuste', cantidad, :sucursal, :ahora FROM nuevos WHERE cantidad <> 0
+        ), stock AS (
+            INSERT INTO stock_sucursales (sucursal_id, producto_id, cantidad)
+            SELECT :sucursal, id, cantidad FROM nuevos WHERE cantidad <> 0
+        )
+        SELECT id FROM nuevos
+    """), valores).scalars().all()
+    registrar_ids("productos", ids_nuevos, "insert")
+    resumen.insertados += len(ids_nuevos)
+
+    # Los ids explícitos no avanzan la secuencia
+    conexion.execute(text(
+        "SELECT setval(pg_get_serial_sequence('productos', 'id'), "
+        "coalesce((SELECT max(id) FROM productos), 1))"
+    ))
+
+
+# ---------- Exportación ----------
+
+def _consulta_export():
+    return (
+        select(
+            Producto.id,
+            MarcaProducto.nombre.label("marca"),
+            CategoriaProducto.nombre.label("categoria"),
+            *[getattr(Producto, c) for c in COLUMNAS_PRODUCTO],
+        )
+        .outerjoin(MarcaProducto, MarcaProducto.id == Producto.marca_id)
+        .outerjoin(CategoriaProducto, CategoriaProducto.id == Producto.categoria_id)
+        .order_by(Producto.id)
+        .execution_options(yield_per=TAM_LOTE)
+    )
+
+
+def exportar_csv():
+    """Genera el catálogo como CSV, por pedazos (para Response en streaming)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNAS_EXPORT)
+    for particion in db.session.execute(_consulta_export()).partitions():
+        for row in particion:
+            writer.writerow(["" if v is None else v for v in row])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def exportar_json():
+    """Genera el catálogo como arreglo JSON, por pedazos."""
+    def a_json(v):
+        return float(v) if isinstance(v, Decimal) else v
+
+    yield "["
+    primero = True
+    for particion in db.session.execute(_consulta_export()).partitions():
+        pedazo = ",".join(
+            json.dumps({c: a_json(v) for c, v in zip(COLUMNAS_EXPORT, row)}, ensure_ascii=False)
+            for row in particion
+        )
+        if pedazo:
+            yield pedazo if primero else "," + pedazo
+            primero = False
+    yield "]"
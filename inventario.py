@@ -0,0 +1,176 @@
+from datetime import datetime
+from sqlalchemy import func, insert, literal, select, update
+from cambios import registrar_ids
+from catalogo import invalidar_una_vez
+from config import Config
+from eventos import marcar_stock
+from models import db, insert_para_dialecto, Producto, MovimientoInventario, SnapshotStock, StockSucursal
+
+
+class LibroMovimientos:
+    """
+    Junta los movimientos de stock de un request y los inserta de una sola vez.
+    Los movimientos son de una sucursal (default SUCURSAL_DEFAULT_ID) y también
+    se suman a su stock en stock_sucursales y al total en productos.cantidad,
+    en SQL (cantidad = cantidad + n): dos ventas del mismo producto en
+    distintas sucursales no se pisan el total.
+
+    Uso:
+        libro = LibroMovimientos(orden.sucursal_id)
+        libro.registrar(producto.id, -2, "venta", orden.id)
+        ...
+        libro.guardar()      # kardex (executemany), stock de la sucursal (upsert) y total del producto
+
+    total=False cuando productos.cantidad ya quedó fijado por otro lado (alta
+    de un producto, import).
+    """
+
+    def __init__(self, sucursal_id: int = None, total: bool = True):
+        self.sucursal_id = sucursal_id or Config.SUCURSAL_DEFAULT_ID
+        self.total = total
+        self._pendientes = {}
+        self._stock = {}
+
+    def disponible(self, producto_id: int) -> int:
+        """
+        Stock del producto en la sucursal contando lo ya registrado en este libro
+        (p. ej. las devoluciones de los items que reemplaza un PUT). La primera
+        vez lee la fila de stock_sucursales con FOR UPDATE: hasta el commit
+        ninguna otra venta de la sucursal puede vender las mismas unidades.
+        """
+        if producto_id not in self._stock:
+            self._stock[producto_id] = stock_en_sucursal(self.sucursal_id, producto_id, bloquear=True)
+        pendiente = sum(c for (p, _, _), c in self._pendientes.items() if p == producto_id)
+        return self._stock[producto_id] + pendiente
+
+    def registrar(self, producto_id: int, cantidad: int, tipo: str, orden_id: int = None):
+        if not cantidad:
+            return
+        clave = (producto_id, tipo, orden_id)
+        self._pendientes[clave] = self._pendientes.get(clave, 0) + cantidad
+
+    def guardar(self):
+        ahora = datetime.utcnow()
+        filas = [
+            {
+                "producto_id": producto_id,
+                "tipo": tipo,
+                "orden_id": orden_id,
+                "sucursal_id": self.sucursal_id,
+                "cantidad": cantidad,
+                "fecha": ahora,
+            }
+            for (producto_id, tipo, orden_id), cantidad in self._pendientes.items()
+            if cantidad
+        ]
+        if filas:
+            db.session.execute(insert(MovimientoInventario), filas)
+            por_producto = {}
+            for f in filas:
+                por_producto[f["producto_id"]] = por_producto.get(f["producto_id"], 0) + f["cantidad"]
+            sumar_stock_sucursal([
+                {"sucursal_id": self.sucursal_id, "producto_id": producto_id, "cantidad": cantidad}
+                for producto_id, cantidad in por_producto.items()
+            ])
+            if self.total:
+                sumar_total(por_producto)
+            marcar_stock(por_producto)
+        self._pendientes = {}
+        self._stock = {}
+
+
+def stock_en_sucursal(sucursal_id: int, producto_id: int, bloquear: bool = False) -> int:
+    """Existencias de un producto en una sucursal (0 si no tiene fila). bloquear: SELECT ... FOR UPDATE."""
+    query = select(StockSucursal.cantidad).where(
+        StockSucursal.sucursal_id == sucursal_id, StockSucursal.producto_id == producto_id
+    )
+    if bloquear:
+        query = query.with_for_update()
+    return db.session.execute(query).scalar() or 0
+
+
+def sumar_total(por_producto: dict):
+    """
+    Suma a productos.cantidad ({producto_id: cantidad}) con UPDATE atómicos.
+    Como no pasa por el ORM, registra el cambio en la bitácora, sube la
+    versión del catálogo y expira la cantidad de los objetos ya cargados.
+    """
+    session = db.session()
+    # En orden de id: dos transacciones con los mismos productos no se bloquean en cruz
+    for producto_id, cantidad in sorted(por_producto.items()):
+        session.execute(
+            update(Producto)
+            .where(Producto.id == producto_id)
+            .values(cantidad=func.coalesce(Producto.cantidad, 0) + cantidad)
+            .execution_options(synchronize_session=False)
+        )
+        producto = session.identity_map.get(session.identity_key(Producto, producto_id))
+        if producto is not None:
+            session.expire(producto, ["cantidad"])
+    registrar_ids("productos", por_producto, "update")
+    invalidar_una_vez(session, "productos")
+
+
+def sumar_stock_sucursal(deltas):
+    """
+    Suma cantidades a stock_sucursales (crea la fila si no existe).
+    `deltas`: lista de dicts {sucursal_id, producto_id, cantidad} o un SELECT
+    con esas tres columnas para los ajustes masivos (con WHERE: SQLite lo
+    necesita para distinguir el ON CONFLICT).
+    """
+    es_lista = isinstance(deltas, list)
+    if es_lista and not deltas:
+        return
+    tabla = StockSucursal.__table__
+    stmt = insert_para_dialecto(tabla)
+    if not es_lista:
+        stmt = stmt.from_select(["sucursal_id", "producto_id", "cantidad"], deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["sucursal_id", "producto_id"],
+        set_={"cantidad": tabla.c.cantidad + stmt.excluded.cantidad},
+    )
+    if es_lista:
+        db.session.execute(stmt, deltas)
+    else:
+        db.session.execute(stmt)
+
+
+def stock_a_fecha(producto_id: int, fecha: datetime) -> int:
+    """
+    Stock de un producto al momento `fecha`.
+
+    Parte del último snapshot anterior a la fecha y le suma los movimientos
+    posteriores. Si no hay snapshot, resta al stock actual los movimientos
+    que ocurrieron después de la fecha. En ambos casos son dos consultas
+    sobre índices (producto_id, fecha), sin recorrer todo el historial.
+    """
+    snapshot = (
+        SnapshotStock.query
+        .filter(SnapshotStock.producto_id == producto_id, SnapshotStock.fecha <= fecha)
+        .order_by(SnapshotStock.fecha.desc())
+        .first()
+    )
+
+    delta = select(func.coalesce(func.sum(MovimientoInventario.cantidad), 0)).where(
+        MovimientoInventario.producto_id == producto_id
+    )
+
+    if snapshot is not None:
+        delta = delta.where(MovimientoInventario.fecha > snapshot.fecha, MovimientoInventario.fecha <= fecha)
+        return snapshot.cantidad + db.session.execute(delta).scalar()
+
+    actual = db.session.query(Producto.cantidad).filter(Producto.id == producto_id).scalar() or 0
+    delta = delta.where(MovimientoInventario.fecha > fecha)
+    return actual - db.session.execute(delta).scalar()
+
+
+def tomar_snapshot() -> int:
+    """Guarda la cantidad actual de todos los productos en un solo INSERT ... SELECT."""
+    ahora = datetime.utcnow()
+    resultado = db.session.execute(
+        insert(SnapshotStock).from_select(
+            ["producto_id", "fecha", "cantidad"],
+            select(Producto.id, literal(ahora, db.DateTime), Producto.cantidad),
+        )
+    )
+    return resultado.rowcount
@@ -0,0 +1,88 @@
+"""sucursales: sucursal_id en órdenes, empleadas y kardex; stock por sucursal
+
+Revision ID: 1d6c8b3f7a52
+Revises: 5e9d3a71c2f4
+Create Date: 2026-10-19 18:22:37.518204
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1d6c8b3f7a52'
+down_revision = '5e9d3a71c2f4'
+branch_labels = None
+depends_on = None
+
+
+# Lo que ya existe queda en la sucursal 1 (SUCURSAL_DEFAULT_ID por defecto)
+TABLAS = ('ordenes', 'ordenes_archivo', 'empleadas', 'movimientos_inventario')
+INDICES = {
+    'ordenes': ('ix_ordenes_sucursal_fecha_tipo_pago', ['sucursal_id', 'fecha', 'tipo_pago']),
+    'ordenes_archivo': ('ix_ordenes_archivo_sucursal_fecha_tipo_pago', ['sucursal_id', 'fecha', 'tipo_pago']),
+    'empleadas': ('ix_empleadas_sucursal_nombre', ['sucursal_id', 'nombre']),
+}
+
+
+def upgrade():
+    sucursales = op.create_table('sucursales',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('nombre', sa.String(length=120), nullable=False),
+    sa.Column('direccion', sa.String(length=255), nullable=True),
+    sa.Column('telefono', sa.String(length=30), nullable=True),
+    sa.Column('activo', sa.Boolean(), nullable=False),
+    sa.Column('creado_en', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('nombre')
+    )
+    op.bulk_insert(sucursales, [
+        {'id': 1, 'nombre': 'Principal', 'activo': True, 'creado_en': datetime.utcnow()},
+    ])
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("SELECT setval(pg_get_serial_sequence('sucursales', 'id'), 1)")
+
+    for tabla in TABLAS:
+        # Con server_default el backfill es parte del ADD COLUMN (sin reescribir la tabla en Postgres 11+)
+        with op.batch_alter_table(tabla, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('sucursal_id', sa.Integer(), nullable=False, server_default='1'))
+        with op.batch_alter_table(tabla, schema=None) as batch_op:
+            batch_op.alter_column('sucursal_id', server_default=None)
+            batch_op.create_foreign_key(f'fk_{tabla}_sucursal_id', 'sucursales', ['sucursal_id'], ['id'])
+            if tabla in INDICES:
+                nombre, columnas = INDICES[tabla]
+                batch_op.create_index(nombre, columnas, unique=False)
+
+    op.create_table('stock_sucursales',
+    sa.Column('sucursal_id', sa.Integer(), nullable=False),
+    sa.Column('producto_id', sa.Integer(), nullable=False),
+    sa.Column('cantidad', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['producto_id'], ['productos.id'], ),
+    sa.ForeignKeyConstraint(['sucursal_id'], ['sucursales.id'], ),
+    sa.PrimaryKeyConstraint('sucursal_id', 'producto_id')
+    )
+    with op.batch_alter_table('stock_sucursales', schema=None) as batch_op:
+        batch_op.create_index('ix_stock_sucursales_producto', ['producto_id'], unique=False)
+
+    op.execute(
+        "INSERT INTO stock_sucursales (sucursal_id, producto_id, cantidad) "
+        "SELECT 1, id, cantidad FROM productos WHERE cantidad IS NOT NULL AND cantidad <> 0"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('stock_sucursales', schema=None) as batch_op:
+        batch_op.drop_index('ix_stock_sucursales_producto')
+
+    op.drop_table('stock_sucursales')
+
+    for tabla in reversed(TABLAS):
+        with op.batch_alter_table(tabla, schema=None) as batch_op:
+            if tabla in INDICES:
+                batch_op.drop_index(INDICES[tabla][0])
+            batch_op.drop_constraint(f'fk_{tabla}_sucursal_id', type_='foreignkey')
+            batch_op.drop_column('sucursal_id')
+
+    op.drop_table('sucursales')
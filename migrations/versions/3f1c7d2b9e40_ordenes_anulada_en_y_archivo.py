@@ -0,0 +1,71 @@
+"""ordenes: anulada_en y tablas de archivo
+
+Revision ID: 3f1c7d2b9e40
+Revises: a9a52f593006
+Create Date: 2026-10-19 09:12:31.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c7d2b9e40'
+down_revision = 'a9a52f593006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ordenes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('anulada_en', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_ordenes_fecha'), ['fecha'], unique=False)
+
+    op.create_table('ordenes_archivo',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('codigo', sa.String(length=20), nullable=False),
+    sa.Column('fecha', sa.DateTime(), nullable=False),
+    sa.Column('tipo_pago', sa.String(length=50), nullable=False),
+    sa.Column('referencia', sa.String(length=120), nullable=True),
+    sa.Column('descuento', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('total', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('anulada_en', sa.DateTime(), nullable=True),
+    sa.Column('cliente_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['cliente_id'], ['clientes.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('ordenes_archivo', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_ordenes_archivo_fecha'), ['fecha'], unique=False)
+
+    op.create_table('orden_items_archivo',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('orden_id', sa.Integer(), nullable=False),
+    sa.Column('empleada_id', sa.Integer(), nullable=False),
+    sa.Column('tipo', postgresql.ENUM('producto', 'servicio', name='tipo_item', create_type=False), nullable=False),
+    sa.Column('producto_id', sa.Integer(), nullable=True),
+    sa.Column('servicio_id', sa.Integer(), nullable=True),
+    sa.Column('cantidad', sa.Integer(), nullable=False),
+    sa.Column('precio_unitario', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['orden_id'], ['ordenes_archivo.id'], ),
+    sa.ForeignKeyConstraint(['empleada_id'], ['empleadas.id'], ),
+    sa.ForeignKeyConstraint(['producto_id'], ['productos.id'], ),
+    sa.ForeignKeyConstraint(['servicio_id'], ['servicios.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('orden_items_archivo', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_orden_items_archivo_orden_id'), ['orden_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('orden_items_archivo', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_orden_items_archivo_orden_id'))
+    op.drop_table('orden_items_archivo')
+
+    with op.batch_alter_table('ordenes_archivo', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_ordenes_archivo_fecha'))
+    op.drop_table('ordenes_archivo')
+
+    with op.batch_alter_table('ordenes', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_ordenes_fecha'))
+        batch_op.drop_column('anulada_en')
@@ -0,0 +1,38 @@
+"""precio_unitario de items a Numeric(10,2)
+
+Revision ID: 4b8d1e6f2a90
+Revises: e7b0a3c95d12
+Create Date: 2026-10-19 15:02:44.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b8d1e6f2a90'
+down_revision = 'e7b0a3c95d12'
+branch_labels = None
+depends_on = None
+
+
+TABLAS = ('orden_items', 'orden_items_archivo')
+
+
+def upgrade():
+    for tabla in TABLAS:
+        with op.batch_alter_table(tabla, schema=None) as batch_op:
+            batch_op.alter_column('precio_unitario',
+                                  existing_type=sa.Float(),
+                                  type_=sa.Numeric(precision=10, scale=2),
+                                  existing_nullable=False,
+                                  postgresql_using='round(precio_unitario::numeric, 2)')
+
+
+def downgrade():
+    for tabla in TABLAS:
+        with op.batch_alter_table(tabla, schema=None) as batch_op:
+            batch_op.alter_column('precio_unitario',
+                                  existing_type=sa.Numeric(precision=10, scale=2),
+                                  type_=sa.Float(),
+                                  existing_nullable=False)
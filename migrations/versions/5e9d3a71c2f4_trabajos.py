@@ -0,0 +1,44 @@
+"""cola de trabajos en segundo plano
+
+Revision ID: 5e9d3a71c2f4
+Revises: b7e25d0c4a19
+Create Date: 2026-10-19 17:48:13.204961
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e9d3a71c2f4'
+down_revision = 'b7e25d0c4a19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('trabajos',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tipo', sa.String(length=40), nullable=False),
+    sa.Column('parametros', sa.JSON(), nullable=False),
+    sa.Column('estado', sa.String(length=12), nullable=False),
+    sa.Column('intentos', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('archivo', sa.String(length=255), nullable=True),
+    sa.Column('tamano', sa.BigInteger(), nullable=True),
+    sa.Column('worker', sa.String(length=80), nullable=True),
+    sa.Column('creado_en', sa.DateTime(), nullable=False),
+    sa.Column('disponible_en', sa.DateTime(), nullable=False),
+    sa.Column('iniciado_en', sa.DateTime(), nullable=True),
+    sa.Column('terminado_en', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('trabajos', schema=None) as batch_op:
+        batch_op.create_index('ix_trabajos_estado_disponible', ['estado', 'disponible_en', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('trabajos', schema=None) as batch_op:
+        batch_op.drop_index('ix_trabajos_estado_disponible')
+
+    op.drop_table('trabajos')
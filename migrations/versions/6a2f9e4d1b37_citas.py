@@ -0,0 +1,57 @@
+"""citas con exclusión de horarios por empleada
+
+Revision ID: 6a2f9e4d1b37
+Revises: 1d6c8b3f7a52
+Create Date: 2026-10-19 19:04:51.227316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a2f9e4d1b37'
+down_revision = '1d6c8b3f7a52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('citas',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sucursal_id', sa.Integer(), nullable=False),
+    sa.Column('empleada_id', sa.Integer(), nullable=False),
+    sa.Column('servicio_id', sa.Integer(), nullable=False),
+    sa.Column('cliente_id', sa.Integer(), nullable=True),
+    sa.Column('inicio', sa.DateTime(), nullable=False),
+    sa.Column('fin', sa.DateTime(), nullable=False),
+    sa.Column('estado', sa.String(length=12), nullable=False),
+    sa.Column('notas', sa.String(length=255), nullable=True),
+    sa.Column('creado_en', sa.DateTime(), nullable=False),
+    sa.CheckConstraint('fin > inicio', name='ck_citas_fin_despues_de_inicio'),
+    sa.ForeignKeyConstraint(['cliente_id'], ['clientes.id'], ),
+    sa.ForeignKeyConstraint(['empleada_id'], ['empleadas.id'], ),
+    sa.ForeignKeyConstraint(['servicio_id'], ['servicios.id'], ),
+    sa.ForeignKeyConstraint(['sucursal_id'], ['sucursales.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('citas', schema=None) as batch_op:
+        batch_op.create_index('ix_citas_empleada_inicio', ['empleada_id', 'inicio'], unique=False)
+        batch_op.create_index('ix_citas_sucursal_inicio', ['sucursal_id', 'inicio'], unique=False)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # btree_gist: para combinar empleada_id (=) con el rango (&&) en el mismo índice GiST
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        op.execute(
+            "ALTER TABLE citas ADD CONSTRAINT ex_citas_empleada_horario "
+            "EXCLUDE USING gist (empleada_id WITH =, tsrange(inicio, fin) WITH &&) "
+            "WHERE (estado <> 'cancelada')"
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('citas', schema=None) as batch_op:
+        batch_op.drop_index('ix_citas_sucursal_inicio')
+        batch_op.drop_index('ix_citas_empleada_inicio')
+
+    op.drop_table('citas')
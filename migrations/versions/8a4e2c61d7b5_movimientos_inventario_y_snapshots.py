@@ -0,0 +1,63 @@
+"""movimientos_inventario y snapshots_stock
+
+Revision ID: 8a4e2c61d7b5
+Revises: 3f1c7d2b9e40
+Create Date: 2026-10-19 10:03:54.118620
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e2c61d7b5'
+down_revision = '3f1c7d2b9e40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('movimientos_inventario',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('producto_id', sa.Integer(), nullable=False),
+    sa.Column('tipo', sa.String(length=20), nullable=False),
+    sa.Column('cantidad', sa.Integer(), nullable=False),
+    sa.Column('orden_id', sa.Integer(), nullable=True),
+    sa.Column('fecha', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['producto_id'], ['productos.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('movimientos_inventario', schema=None) as batch_op:
+        batch_op.create_index('ix_movimientos_inventario_producto_fecha', ['producto_id', 'fecha'], unique=False)
+
+    op.create_table('snapshots_stock',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('producto_id', sa.Integer(), nullable=False),
+    sa.Column('fecha', sa.DateTime(), nullable=False),
+    sa.Column('cantidad', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['producto_id'], ['productos.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('snapshots_stock', schema=None) as batch_op:
+        batch_op.create_index('ix_snapshots_stock_producto_fecha', ['producto_id', 'fecha'], unique=False)
+
+    # Punto de partida: una foto del stock actual
+    op.get_bind().execute(
+        sa.text(
+            "INSERT INTO snapshots_stock (producto_id, fecha, cantidad) "
+            "SELECT id, :ahora, cantidad FROM productos"
+        ),
+        {"ahora": datetime.utcnow()},
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('snapshots_stock', schema=None) as batch_op:
+        batch_op.drop_index('ix_snapshots_stock_producto_fecha')
+    op.drop_table('snapshots_stock')
+
+    with op.batch_alter_table('movimientos_inventario', schema=None) as batch_op:
+        batch_op.drop_index('ix_movimientos_inventario_producto_fecha')
+    op.drop_table('movimientos_inventario')
@@ -0,0 +1,57 @@
+"""búsqueda en el catálogo: tsvector con unaccent e índices por marca/categoría
+
+Revision ID: 9b3d5e7f1c20
+Revises: c84e1f2a6d93
+Create Date: 2026-10-19 21:12:37.418205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3d5e7f1c20'
+down_revision = 'c84e1f2a6d93'
+branch_labels = None
+depends_on = None
+
+
+FUNCION_UNACCENT = (
+    "CREATE OR REPLACE FUNCTION kiara_unaccent(text) RETURNS text "
+    "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT "
+    "AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$"
+)
+
+
+def upgrade():
+    with op.batch_alter_table('productos', schema=None) as batch_op:
+        batch_op.create_index('ix_productos_marca', ['marca_id'], unique=False)
+        batch_op.create_index('ix_productos_categoria', ['categoria_id'], unique=False)
+
+    with op.batch_alter_table('servicios', schema=None) as batch_op:
+        batch_op.create_index('ix_servicios_categoria', ['categoria_id'], unique=False)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+        op.execute(FUNCION_UNACCENT)
+        for tabla in ('productos', 'servicios'):
+            op.execute(
+                f"ALTER TABLE {tabla} ADD COLUMN busqueda tsvector GENERATED ALWAYS AS "
+                "(to_tsvector('spanish'::regconfig, kiara_unaccent(descripcion))) STORED"
+            )
+            op.execute(f"CREATE INDEX ix_{tabla}_busqueda ON {tabla} USING gin (busqueda)")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for tabla in ('servicios', 'productos'):
+            op.execute(f"DROP INDEX IF EXISTS ix_{tabla}_busqueda")
+            op.execute(f"ALTER TABLE {tabla} DROP COLUMN IF EXISTS busqueda")
+        op.execute("DROP FUNCTION IF EXISTS kiara_unaccent(text)")
+
+    with op.batch_alter_table('servicios', schema=None) as batch_op:
+        batch_op.drop_index('ix_servicios_categoria')
+
+    with op.batch_alter_table('productos', schema=None) as batch_op:
+        batch_op.drop_index('ix_productos_categoria')
+        batch_op.drop_index('ix_productos_marca')
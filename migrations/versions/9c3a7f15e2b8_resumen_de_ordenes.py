@@ -0,0 +1,50 @@
+"""columnas de resumen en ordenes (num_items, subtotales, num_empleadas)
+
+Revision ID: 9c3a7f15e2b8
+Revises: 4b8d1e6f2a90
+Create Date: 2026-10-19 15:31:09.402771
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3a7f15e2b8'
+down_revision = '4b8d1e6f2a90'
+branch_labels = None
+depends_on = None
+
+
+# tabla de órdenes -> tabla de sus items
+TABLAS = {'ordenes': 'orden_items', 'ordenes_archivo': 'orden_items_archivo'}
+COLUMNAS = ('num_items', 'subtotal', 'subtotal_productos', 'subtotal_servicios', 'num_empleadas')
+
+
+def upgrade():
+    for ordenes, items in TABLAS.items():
+        with op.batch_alter_table(ordenes, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('num_items', sa.Integer(), nullable=False, server_default='0'))
+            batch_op.add_column(sa.Column('subtotal', sa.Numeric(precision=10, scale=2), nullable=False, server_default='0'))
+            batch_op.add_column(sa.Column('subtotal_productos', sa.Numeric(precision=10, scale=2), nullable=False, server_default='0'))
+            batch_op.add_column(sa.Column('subtotal_servicios', sa.Numeric(precision=10, scale=2), nullable=False, server_default='0'))
+            batch_op.add_column(sa.Column('num_empleadas', sa.Integer(), nullable=False, server_default='0'))
+
+        # Backfill en un solo UPDATE con subconsultas correlacionadas (usan el índice por orden_id).
+        # Sin alias en la tabla del UPDATE: SQLite no lo acepta
+        subtotal = f"SELECT coalesce(sum(i.cantidad * i.precio_unitario), 0) FROM {items} i WHERE i.orden_id = {ordenes}.id"
+        op.execute(
+            f"UPDATE {ordenes} SET "
+            f"num_items = (SELECT count(*) FROM {items} i WHERE i.orden_id = {ordenes}.id), "
+            f"subtotal = round(({subtotal}), 2), "
+            f"subtotal_productos = round(({subtotal} AND i.tipo = 'producto'), 2), "
+            f"subtotal_servicios = round(({subtotal} AND i.tipo = 'servicio'), 2), "
+            f"num_empleadas = (SELECT count(DISTINCT i.empleada_id) FROM {items} i WHERE i.orden_id = {ordenes}.id)"
+        )
+
+
+def downgrade():
+    for ordenes in TABLAS:
+        with op.batch_alter_table(ordenes, schema=None) as batch_op:
+            for columna in reversed(COLUMNAS):
+                batch_op.drop_column(columna)
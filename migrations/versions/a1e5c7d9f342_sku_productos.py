@@ -0,0 +1,28 @@
+"""sku (código de barras) de productos
+
+Revision ID: a1e5c7d9f342
+Revises: 9b3d5e7f1c20
+Create Date: 2026-10-19 22:03:51.207664
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1e5c7d9f342'
+down_revision = '9b3d5e7f1c20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('productos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sku', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_productos_sku', ['sku'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('productos', schema=None) as batch_op:
+        batch_op.drop_index('ix_productos_sku')
+        batch_op.drop_column('sku')
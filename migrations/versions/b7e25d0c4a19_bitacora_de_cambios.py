@@ -0,0 +1,37 @@
+"""bitácora de cambios para sincronización incremental
+
+Revision ID: b7e25d0c4a19
+Revises: f2a8c4d9b613
+Create Date: 2026-10-19 17:05:42.310587
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e25d0c4a19'
+down_revision = 'f2a8c4d9b613'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cambios',
+    sa.Column('seq', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('tabla', sa.String(length=40), nullable=False),
+    sa.Column('registro_id', sa.Integer(), nullable=False),
+    sa.Column('operacion', sa.String(length=10), nullable=False),
+    sa.Column('datos', sa.JSON(), nullable=True),
+    sa.Column('fecha', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('seq')
+    )
+    with op.batch_alter_table('cambios', schema=None) as batch_op:
+        batch_op.create_index('ix_cambios_tabla_seq', ['tabla', 'seq'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('cambios', schema=None) as batch_op:
+        batch_op.drop_index('ix_cambios_tabla_seq')
+
+    op.drop_table('cambios')
@@ -0,0 +1,48 @@
+"""stock_minimo e índices para reporte de bajo stock
+
+Revision ID: c52d9f0a1e83
+Revises: 8a4e2c61d7b5
+Create Date: 2026-10-19 10:41:07.562309
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52d9f0a1e83'
+down_revision = '8a4e2c61d7b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('categorias_productos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('stock_minimo', sa.Integer(), nullable=True))
+
+    with op.batch_alter_table('productos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('stock_minimo', sa.Integer(), nullable=True))
+
+    op.create_index('ix_productos_bajo_stock', 'productos', ['id'], unique=False,
+                    postgresql_where=sa.text('cantidad <= stock_minimo'),
+                    sqlite_where=sa.text('cantidad <= stock_minimo'))
+    op.create_index('ix_productos_sin_stock_minimo', 'productos', ['categoria_id', 'cantidad'], unique=False,
+                    postgresql_where=sa.text('stock_minimo IS NULL'),
+                    sqlite_where=sa.text('stock_minimo IS NULL'))
+
+    with op.batch_alter_table('orden_items', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_orden_items_orden_id'), ['orden_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('orden_items', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_orden_items_orden_id'))
+
+    op.drop_index('ix_productos_sin_stock_minimo', table_name='productos')
+    op.drop_index('ix_productos_bajo_stock', table_name='productos')
+
+    with op.batch_alter_table('productos', schema=None) as batch_op:
+        batch_op.drop_column('stock_minimo')
+
+    with op.batch_alter_table('categorias_productos', schema=None) as batch_op:
+        batch_op.drop_column('stock_minimo')
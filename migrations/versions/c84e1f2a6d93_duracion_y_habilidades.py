@@ -0,0 +1,47 @@
+"""duración de servicios y empleada_servicios
+
+Revision ID: c84e1f2a6d93
+Revises: 6a2f9e4d1b37
+Create Date: 2026-10-19 19:41:08.660153
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c84e1f2a6d93'
+down_revision = '6a2f9e4d1b37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('servicios', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('duracion_minutos', sa.Integer(), nullable=True))
+
+    op.create_table('empleada_servicios',
+    sa.Column('empleada_id', sa.Integer(), nullable=False),
+    sa.Column('servicio_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['empleada_id'], ['empleadas.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['servicio_id'], ['servicios.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('empleada_id', 'servicio_id')
+    )
+    with op.batch_alter_table('empleada_servicios', schema=None) as batch_op:
+        batch_op.create_index('ix_empleada_servicios_servicio', ['servicio_id', 'empleada_id'], unique=False)
+
+    # Hasta ahora cualquiera hacía todo: se parte de ahí y se van quitando
+    op.execute(
+        "INSERT INTO empleada_servicios (empleada_id, servicio_id) "
+        "SELECT e.id, s.id FROM empleadas e CROSS JOIN servicios s"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('empleada_servicios', schema=None) as batch_op:
+        batch_op.drop_index('ix_empleada_servicios_servicio')
+
+    op.drop_table('empleada_servicios')
+
+    with op.batch_alter_table('servicios', schema=None) as batch_op:
+        batch_op.drop_column('duracion_minutos')
@@ -0,0 +1,32 @@
+"""índices ordenes(cliente_id, fecha) para historial por clienta
+
+Revision ID: d41f6b0c8e27
+Revises: 9c3a7f15e2b8
+Create Date: 2026-10-19 16:05:52.730914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41f6b0c8e27'
+down_revision = '9c3a7f15e2b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ordenes', schema=None) as batch_op:
+        batch_op.create_index('ix_ordenes_cliente_fecha', ['cliente_id', 'fecha'], unique=False)
+
+    with op.batch_alter_table('ordenes_archivo', schema=None) as batch_op:
+        batch_op.create_index('ix_ordenes_archivo_cliente_fecha', ['cliente_id', 'fecha'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('ordenes_archivo', schema=None) as batch_op:
+        batch_op.drop_index('ix_ordenes_archivo_cliente_fecha')
+
+    with op.batch_alter_table('ordenes', schema=None) as batch_op:
+        batch_op.drop_index('ix_ordenes_cliente_fecha')
@@ -0,0 +1,32 @@
+"""catalogo_versiones para ETag y cache de listados
+
+Revision ID: e7b0a3c95d12
+Revises: c52d9f0a1e83
+Create Date: 2026-10-19 11:26:45.930271
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b0a3c95d12'
+down_revision = 'c52d9f0a1e83'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    versiones = op.create_table('catalogo_versiones',
+    sa.Column('nombre', sa.String(length=40), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('nombre')
+    )
+    op.bulk_insert(versiones, [
+        {'nombre': 'productos', 'version': 1},
+        {'nombre': 'servicios', 'version': 1},
+    ])
+
+
+def downgrade():
+    op.drop_table('catalogo_versiones')
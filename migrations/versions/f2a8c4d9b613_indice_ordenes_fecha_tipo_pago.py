@@ -0,0 +1,30 @@
+"""índice ordenes(fecha, tipo_pago) para el corte de caja
+
+Reemplaza a ix_ordenes_fecha: el compuesto sirve igual para los rangos de fecha.
+
+Revision ID: f2a8c4d9b613
+Revises: d41f6b0c8e27
+Create Date: 2026-10-19 16:38:20.551046
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a8c4d9b613'
+down_revision = 'd41f6b0c8e27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ordenes', schema=None) as batch_op:
+        batch_op.create_index('ix_ordenes_fecha_tipo_pago', ['fecha', 'tipo_pago'], unique=False)
+        batch_op.drop_index('ix_ordenes_fecha')
+
+
+def downgrade():
+    with op.batch_alter_table('ordenes', schema=None) as batch_op:
+        batch_op.create_index('ix_ordenes_fecha', ['fecha'], unique=False)
+        batch_op.drop_index('ix_ordenes_fecha_tipo_pago')
@@ -1,9 +1,20 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import Numeric
+from sqlalchemy.dialects import postgresql, sqlite
 from werkzeug.security import generate_password_hash, check_password_hash
 
-db = SQLAlchemy()
+from replicas import SesionRuteada
+
+# Los SELECT de las rutas @solo_lectura pueden ir a una réplica (ver replicas.py)
+db = SQLAlchemy(session_options={"class_": SesionRuteada})
+
+
+def insert_para_dialecto(tabla):
+    """INSERT con soporte de ON CONFLICT para el motor actual (Postgres o SQLite)."""
+    if db.engine.dialect.name == "postgresql":
+        return postgresql.insert(tabla)
+    return sqlite.insert(tabla)
 
 
 class Cliente(db.Model):
@@ -20,6 +31,25 @@ class Cliente(db.Model):
         return f"<Cliente {self.nombre}>"
 
 
+class Sucursal(db.Model):
+    """
+    Salón. Las órdenes, las empleadas y el stock (StockSucursal) son de una
+    sucursal; los catálogos de productos y servicios son compartidos.
+    """
+    __tablename__ = "sucursales"
+
+    id = db.Column(db.Integer, primary_key=True)
+    nombre = db.Column(db.String(120), unique=True, nullable=False)
+    direccion = db.Column(db.String(255), nullable=True)
+    telefono = db.Column(db.String(30), nullable=True)
+    activo = db.Column(db.Boolean, default=True, nullable=False)
+    creado_en = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<Sucursal {self.nombre}>"
+
+
+
 class CategoriaProducto(db.Model):
     __tablename__ = "categorias_productos"
 
@@ -29,6 +59,9 @@ class CategoriaProducto(db.Model):
     activo = db.Column(db.Boolean, default=True, nullable=False)
     creado_en = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
+    # Umbral de reorden para los productos de la categoría que no tienen uno propio
+    stock_minimo = db.Column(db.Integer, nullable=True)
+
     # Una categoría puede tener muchos productos
     productos = db.relationship("Producto", back_populates="categoria")
 
@@ -70,6 +103,25 @@ class CategoriaServicio(db.Model):
 
 class Producto(db.Model):
     __tablename__ = "productos"
+    __table_args__ = (
+        # Índices parciales para el reporte de bajo stock (/productos/bajo-stock):
+        # solo contienen las filas que pueden aparecer en él.
+        db.Index(
+            "ix_productos_bajo_stock", "id",
+            postgresql_where=db.text("cantidad <= stock_minimo"),
+            sqlite_where=db.text("cantidad <= stock_minimo"),
+        ),
+        db.Index(
+            "ix_productos_sin_stock_minimo", "categoria_id", "cantidad",
+            postgresql_where=db.text("stock_minimo IS NULL"),
+            sqlite_where=db.text("stock_minimo IS NULL"),
+        ),
+        # /buscar: productos de las marcas y categorías que coinciden
+        db.Index("ix_productos_marca", "marca_id"),
+        db.Index("ix_productos_categoria", "categoria_id"),
+        # GET /productos/por-codigo/<codigo> y items de orden por sku
+        db.Index("ix_productos_sku", "sku", unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -82,6 +134,8 @@ class Producto(db.Model):
     marca = db.relationship("MarcaProducto", back_populates="productos")
 
     descripcion = db.Column(db.String(255), nullable=False)
+    # Código de barras / SKU que lee el escáner en caja (único; puede faltar)
+    sku = db.Column(db.String(64), nullable=True)
 
     # 🔹 Categoría (FK)
     categoria_id = db.Column(
@@ -94,6 +148,8 @@ class Producto(db.Model):
     costo = db.Column(Numeric(10, 2), nullable=False)
     precio = db.Column(Numeric(10, 2), nullable=False)
     cantidad = db.Column(db.Integer, nullable=False, default=0)
+    # Umbral de reorden propio; si es NULL se usa el de la categoría
+    stock_minimo = db.Column(db.Integer, nullable=True)
     imagen = db.Column(db.Text)
 
     orden_items = db.relationship("OrdenItem", back_populates="producto")
@@ -106,6 +162,9 @@ class Producto(db.Model):
 
 class Servicio(db.Model):
     __tablename__ = "servicios"
+    __table_args__ = (
+        db.Index("ix_servicios_categoria", "categoria_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     descripcion = db.Column(db.String(255), nullable=False)
@@ -120,6 +179,8 @@ class Servicio(db.Model):
     costo = db.Column(Numeric(10, 2), nullable=False)
     precio = db.Column(Numeric(10, 2), nullable=False)
     imagen = db.Column(db.Text)
+    # Duración de la cita; sin dato se usa CITAS_DURACION_DEFAULT
+    duracion_minutos = db.Column(db.Integer, nullable=True)
 
     orden_items = db.relationship("OrdenItem", back_populates="servicio")
 
@@ -130,6 +191,14 @@ class Servicio(db.Model):
 
 class Orden(db.Model):
     __tablename__ = "ordenes"
+    __table_args__ = (
+        # Rangos de fecha (listados, reportes) y corte de caja por tipo_pago
+        db.Index("ix_ordenes_fecha_tipo_pago", "fecha", "tipo_pago"),
+        # Historial y resumen por clienta (/clientes/<id>/historial y /resumen)
+        db.Index("ix_ordenes_cliente_fecha", "cliente_id", "fecha"),
+        # Listados y reportes de una sucursal (?sucursal_id=)
+        db.Index("ix_ordenes_sucursal_fecha_tipo_pago", "sucursal_id", "fecha", "tipo_pago"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     codigo = db.Column(db.String(20), unique=True, nullable=False)
@@ -139,10 +208,24 @@ class Orden(db.Model):
     descuento = db.Column(Numeric(10, 2), nullable=False, default=0)
     total = db.Column(Numeric(10, 2), nullable=False, default=0)
 
+    # Resumen de los items, mantenido al escribir (ver aplicar_resumen en app.py)
+    # para que los listados no tengan que leer orden_items
+    num_items = db.Column(db.Integer, nullable=False, default=0)
+    subtotal = db.Column(Numeric(10, 2), nullable=False, default=0)
+    subtotal_productos = db.Column(Numeric(10, 2), nullable=False, default=0)
+    subtotal_servicios = db.Column(Numeric(10, 2), nullable=False, default=0)
+    num_empleadas = db.Column(db.Integer, nullable=False, default=0)
+
+    # Baja lógica: la orden se conserva pero ya no cuenta en listados ni stock
+    anulada_en = db.Column(db.DateTime, nullable=True)
+
     # Relación con cliente (muchas órdenes -> un cliente)
     cliente_id = db.Column(db.Integer, db.ForeignKey("clientes.id"), nullable=False)
     cliente = db.relationship("Cliente", back_populates="ordenes")
 
+    # Sucursal donde se hizo la venta (y de cuyo stock salen los productos)
+    sucursal_id = db.Column(db.Integer, db.ForeignKey("sucursales.id"), nullable=False)
+
     # Items de esta orden (productos/servicios)
     items = db.relationship(
         "OrdenItem",
@@ -165,7 +248,7 @@ class OrdenItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
 
     # Relación con la orden
-    orden_id = db.Column(db.Integer, db.ForeignKey("ordenes.id"), nullable=False)
+    orden_id = db.Column(db.Integer, db.ForeignKey("ordenes.id"), nullable=False, index=True)
     orden = db.relationship("Orden", back_populates="items")
 
     # Empleada asociada a este item (cada item puede ser vendido por alguien diferente)
@@ -187,13 +270,217 @@ class OrdenItem(db.Model):
 
     # Campos adicionales del item
     cantidad = db.Column(db.Integer, nullable=False, default=1)
-    precio_unitario = db.Column(db.Float, nullable=False)  # snapshot del precio
+    precio_unitario = db.Column(Numeric(10, 2), nullable=False)  # snapshot del precio
 
     def __repr__(self):
         return f"<OrdenItem {self.tipo} x{self.cantidad}>"
 
 
 
+class OrdenArchivo(db.Model):
+    """
+    Copia en frío de una orden de un mes ya cerrado.
+    Mismas columnas que Orden; se llena con `flask archivar-ordenes`.
+    """
+    __tablename__ = "ordenes_archivo"
+    __table_args__ = (
+        db.Index("ix_ordenes_archivo_cliente_fecha", "cliente_id", "fecha"),
+        db.Index("ix_ordenes_archivo_sucursal_fecha_tipo_pago", "sucursal_id", "fecha", "tipo_pago"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    codigo = db.Column(db.String(20), nullable=False)
+    fecha = db.Column(db.DateTime, nullable=False, index=True)
+    tipo_pago = db.Column(db.String(50), nullable=False)
+    referencia = db.Column(db.String(120), nullable=True)
+    descuento = db.Column(Numeric(10, 2), nullable=False, default=0)
+    total = db.Column(Numeric(10, 2), nullable=False, default=0)
+    num_items = db.Column(db.Integer, nullable=False, default=0)
+    subtotal = db.Column(Numeric(10, 2), nullable=False, default=0)
+    subtotal_productos = db.Column(Numeric(10, 2), nullable=False, default=0)
+    subtotal_servicios = db.Column(Numeric(10, 2), nullable=False, default=0)
+    num_empleadas = db.Column(db.Integer, nullable=False, default=0)
+    anulada_en = db.Column(db.DateTime, nullable=True)
+
+    cliente_id = db.Column(db.Integer, db.ForeignKey("clientes.id"), nullable=False)
+    cliente = db.relationship("Cliente", viewonly=True)
+    sucursal_id = db.Column(db.Integer, db.ForeignKey("sucursales.id"), nullable=False)
+
+    items = db.relationship("OrdenItemArchivo", back_populates="orden", viewonly=True)
+
+    def __repr__(self):
+        return f"<OrdenArchivo {self.codigo}>"
+
+
+
+class OrdenItemArchivo(db.Model):
+    """Renglón de una orden archivada (ver OrdenArchivo)."""
+    __tablename__ = "orden_items_archivo"
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    orden_id = db.Column(db.Integer, db.ForeignKey("ordenes_archivo.id"), nullable=False, index=True)
+    orden = db.relationship("OrdenArchivo", back_populates="items", viewonly=True)
+
+    empleada_id = db.Column(db.Integer, db.ForeignKey("empleadas.id"), nullable=False)
+    empleada = db.relationship("Empleada", viewonly=True)
+
+    tipo = db.Column(
+        db.Enum("producto", "servicio", name="tipo_item"),
+        nullable=False
+    )
+
+    producto_id = db.Column(db.Integer, db.ForeignKey("productos.id"), nullable=True)
+    servicio_id = db.Column(db.Integer, db.ForeignKey("servicios.id"), nullable=True)
+
+    producto = db.relationship("Producto", viewonly=True)
+    servicio = db.relationship("Servicio", viewonly=True)
+
+    cantidad = db.Column(db.Integer, nullable=False, default=1)
+    precio_unitario = db.Column(Numeric(10, 2), nullable=False)
+
+    def __repr__(self):
+        return f"<OrdenItemArchivo {self.tipo} x{self.cantidad}>"
+
+
+
+class MovimientoInventario(db.Model):
+    """
+    Kardex: cada cambio de stock de un producto queda como un renglón
+    (solo se insertan, nunca se actualizan ni borran).
+    """
+    __tablename__ = "movimientos_inventario"
+    __table_args__ = (
+        db.Index("ix_movimientos_inventario_producto_fecha", "producto_id", "fecha"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    producto_id = db.Column(db.Integer, db.ForeignKey("productos.id"), nullable=False)
+    # venta | devolucion | ajuste
+    tipo = db.Column(db.String(20), nullable=False)
+    # Positivo = entra stock, negativo = sale
+    cantidad = db.Column(db.Integer, nullable=False)
+    # Sin FK: las órdenes se pueden mover al archivo
+    orden_id = db.Column(db.Integer, nullable=True)
+    sucursal_id = db.Column(db.Integer, db.ForeignKey("sucursales.id"), nullable=False)
+    fecha = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<MovimientoInventario {self.producto_id} {self.cantidad:+d}>"
+
+
+
+class SnapshotStock(db.Model):
+    """Foto periódica de Producto.cantidad, punto de partida para reconstruir stock."""
+    __tablename__ = "snapshots_stock"
+    __table_args__ = (
+        db.Index("ix_snapshots_stock_producto_fecha", "producto_id", "fecha"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    producto_id = db.Column(db.Integer, db.ForeignKey("productos.id"), nullable=False)
+    fecha = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    cantidad = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<SnapshotStock {self.producto_id} {self.fecha:%Y-%m-%d} = {self.cantidad}>"
+
+
+
+class StockSucursal(db.Model):
+    """
+    Existencias de un producto en una sucursal. Producto.cantidad es la suma
+    de todas las sucursales; las dos se mueven juntas en LibroMovimientos.
+    """
+    __tablename__ = "stock_sucursales"
+    __table_args__ = (
+        db.Index("ix_stock_sucursales_producto", "producto_id"),
+    )
+
+    # La PK empieza por sucursal: el stock de una sucursal es un rango contiguo
+    sucursal_id = db.Column(db.Integer, db.ForeignKey("sucursales.id"), primary_key=True)
+    producto_id = db.Column(db.Integer, db.ForeignKey("productos.id"), primary_key=True)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<StockSucursal {self.sucursal_id}:{self.producto_id} = {self.cantidad}>"
+
+
+
+class VersionCatalogo(db.Model):
+    """
+    Contador por catálogo ("productos", "servicios") que sube con cada cambio.
+    Sirve de ETag y para saber si el cache en memoria sigue vigente. Las tablas
+    de marcas y categorías tienen el suyo (por nombre de tabla) para los lookups
+    nombre -> id, que solo sube al renombrar o borrar.
+    """
+    __tablename__ = "catalogo_versiones"
+
+    nombre = db.Column(db.String(40), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<VersionCatalogo {self.nombre}={self.version}>"
+
+
+
+class Cambio(db.Model):
+    """
+    Bitácora append-only de altas, cambios y bajas, para que los clientes
+    sincronicen solo lo nuevo (GET /cambios?desde=<seq>). La llena cambios.py.
+    `datos` es la fila completa después del cambio; queda en NULL en los
+    caminos masivos y en las bajas (el endpoint la completa al leer).
+    """
+    __tablename__ = "cambios"
+    __table_args__ = (
+        db.Index("ix_cambios_tabla_seq", "tabla", "seq"),
+    )
+
+    seq = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True)
+    tabla = db.Column(db.String(40), nullable=False)
+    registro_id = db.Column(db.Integer, nullable=False)
+    # insert | update | delete
+    operacion = db.Column(db.String(10), nullable=False)
+    datos = db.Column(db.JSON, nullable=True)
+    fecha = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<Cambio {self.seq} {self.operacion} {self.tabla}:{self.registro_id}>"
+
+
+class Trabajo(db.Model):
+    """
+    Cola de trabajos pesados (exports, reportes) que corren fuera del request
+    en `flask worker` (ver trabajos.py). El resultado queda en un archivo en
+    TRABAJOS_DIR y se descarga con GET /trabajos/<id>/descarga.
+    """
+    __tablename__ = "trabajos"
+    __table_args__ = (
+        # El worker busca el pendiente más viejo ya disponible
+        db.Index("ix_trabajos_estado_disponible", "estado", "disponible_en", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(40), nullable=False)
+    parametros = db.Column(db.JSON, nullable=False, default=dict)
+    # pendiente | en_curso | terminado | error
+    estado = db.Column(db.String(12), nullable=False, default="pendiente")
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    # Nombre del archivo dentro de TRABAJOS_DIR
+    archivo = db.Column(db.String(255), nullable=True)
+    tamano = db.Column(db.BigInteger, nullable=True)
+    worker = db.Column(db.String(80), nullable=True)
+    creado_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Para reintentos con espera
+    disponible_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    iniciado_en = db.Column(db.DateTime, nullable=True)
+    terminado_en = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<Trabajo {self.id} {self.tipo} {self.estado}>"
+
+
 class Usuario(db.Model):
     __tablename__ = "usuarios"
 
@@ -217,11 +504,15 @@ class Usuario(db.Model):
     
 class Empleada(db.Model):
     __tablename__ = "empleadas"
+    __table_args__ = (
+        db.Index("ix_empleadas_sucursal_nombre", "sucursal_id", "nombre"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(120), nullable=False)
     telefono = db.Column(db.String(30), nullable=True)
     activo = db.Column(db.Boolean, default=True, nullable=False)
+    sucursal_id = db.Column(db.Integer, db.ForeignKey("sucursales.id"), nullable=False)
     creado_en = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
     # Una empleada puede tener muchos items en diferentes órdenes
@@ -229,3 +520,99 @@ class Empleada(db.Model):
 
     def __repr__(self):
         return f"<Empleada {self.nombre}>"
+
+
+class EmpleadaServicio(db.Model):
+    """
+    Qué servicios hace cada empleada. Se consulta por los dos lados: los de
+    una empleada (PK) y las empleadas que hacen un servicio (índice inverso).
+    """
+    __tablename__ = "empleada_servicios"
+    __table_args__ = (
+        db.Index("ix_empleada_servicios_servicio", "servicio_id", "empleada_id"),
+    )
+
+    empleada_id = db.Column(db.Integer, db.ForeignKey("empleadas.id", ondelete="CASCADE"), primary_key=True)
+    servicio_id = db.Column(db.Integer, db.ForeignKey("servicios.id", ondelete="CASCADE"), primary_key=True)
+
+    def __repr__(self):
+        return f"<EmpleadaServicio {self.empleada_id}:{self.servicio_id}>"
+
+
+class Cita(db.Model):
+    """
+    Turno de una empleada para un servicio, en [inicio, fin) UTC. Las citas no
+    canceladas de una empleada no se pueden encimar: en Postgres lo garantiza
+    ex_citas_empleada_horario (EXCLUDE USING gist, ver abajo); en SQLite lo
+    revisa citas.choques() antes de guardar.
+    """
+    __tablename__ = "citas"
+    __table_args__ = (
+        # Agenda de la empleada y disponibilidad de la sucursal por día
+        db.Index("ix_citas_empleada_inicio", "empleada_id", "inicio"),
+        db.Index("ix_citas_sucursal_inicio", "sucursal_id", "inicio"),
+        db.CheckConstraint("fin > inicio", name="ck_citas_fin_despues_de_inicio"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sucursal_id = db.Column(db.Integer, db.ForeignKey("sucursales.id"), nullable=False)
+    empleada_id = db.Column(db.Integer, db.ForeignKey("empleadas.id"), nullable=False)
+    servicio_id = db.Column(db.Integer, db.ForeignKey("servicios.id"), nullable=False)
+    cliente_id = db.Column(db.Integer, db.ForeignKey("clientes.id"), nullable=True)
+    inicio = db.Column(db.DateTime, nullable=False)
+    fin = db.Column(db.DateTime, nullable=False)
+    # agendada | completada | cancelada
+    estado = db.Column(db.String(12), nullable=False, default="agendada")
+    notas = db.Column(db.String(255), nullable=True)
+    creado_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    empleada = db.relationship("Empleada")
+    servicio = db.relationship("Servicio")
+    cliente = db.relationship("Cliente")
+
+    def __repr__(self):
+        return f"<Cita {self.id} empleada={self.empleada_id} {self.inicio:%Y-%m-%d %H:%M}>"
+
+
+# Solo Postgres: rangos con índice GiST. El mismo constraint responde "¿choca
+# con algo?" sin recorrer la agenda y cierra la carrera entre dos reservas.
+db.event.listen(
+    Cita.__table__, "before_create",
+    db.DDL("CREATE EXTENSION IF NOT EXISTS btree_gist").execute_if(dialect="postgresql"),
+)
+db.event.listen(
+    Cita.__table__, "after_create",
+    db.DDL(
+        "ALTER TABLE citas ADD CONSTRAINT ex_citas_empleada_horario "
+        "EXCLUDE USING gist (empleada_id WITH =, tsrange(inicio, fin) WITH &&) "
+        "WHERE (estado <> 'cancelada')"
+    ).execute_if(dialect="postgresql"),
+)
+
+
+# Búsqueda de texto (ver busqueda.py), solo Postgres. productos y servicios
+# llevan una columna generada `busqueda` (tsvector, sin mapear en el ORM) con
+# índice GIN. unaccent() no es IMMUTABLE y una columna generada lo exige, de
+# ahí el envoltorio kiara_unaccent.
+FUNCION_UNACCENT = (
+    "CREATE OR REPLACE FUNCTION kiara_unaccent(text) RETURNS text "
+    "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT "
+    "AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$"
+)
+db.event.listen(
+    db.metadata, "before_create",
+    db.DDL("CREATE EXTENSION IF NOT EXISTS unaccent").execute_if(dialect="postgresql"),
+)
+db.event.listen(db.metadata, "before_create", db.DDL(FUNCION_UNACCENT).execute_if(dialect="postgresql"))
+for _modelo in (Producto, Servicio):
+    db.event.listen(
+        _modelo.__table__, "after_create",
+        db.DDL(
+            "ALTER TABLE %(table)s ADD COLUMN busqueda tsvector GENERATED ALWAYS AS "
+            "(to_tsvector('spanish'::regconfig, kiara_unaccent(descripcion))) STORED"
+        ).execute_if(dialect="postgresql"),
+    )
+    db.event.listen(
+        _modelo.__table__, "after_create",
+        db.DDL("CREATE INDEX ix_%(table)s_busqueda ON %(table)s USING gin (busqueda)").execute_if(dialect="postgresql"),
+    )
@@ -0,0 +1,132 @@
+"""
+Lecturas en réplicas (DATABASE_REPLICAS).
+
+Las rutas marcadas con @solo_lectura mandan sus SELECT a una réplica; todo lo
+demás (y cualquier escritura, aunque ocurra dentro de una ruta de lectura)
+va a la primaria. La sesión de la app es SesionRuteada (ver models.py), que
+decide el engine en get_bind().
+
+Se lee de la primaria aunque la ruta sea de lectura cuando:
+- no hay réplicas configuradas, o ninguna está al día: el retraso se mide
+  cada REPLICA_CHEQUEO_TTL segundos comparando la bitácora `cambios` de la
+  réplica con la de la primaria, y si pasa de REPLICA_MAX_RETRASO (o la
+  réplica no contesta) no se usa;
+- el cliente acaba de escribir: después de un POST/PUT/PATCH/DELETE exitoso
+  se deja la cookie REPLICA_COOKIE por REPLICA_PEGAJOSO segundos, así lee lo
+  que escribió (read-after-write). Sin cookies se puede mandar el header
+  X-Consistencia: primaria.
+
+La respuesta lleva X-Replica con el nombre usado ("primaria" si ninguna).
+"""
+import functools
+import random
+from datetime import datetime
+
+from flask import current_app, g, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, text
+
+from cache import TTLCache
+
+METODOS_ESCRITURA = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+class SesionRuteada(Session):
+    """Session de Flask-SQLAlchemy que manda los SELECT a session.info["replica"] si hay una."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get("replica")
+        if replica is not None and bind is None and not self.info.get("escribio"):
+            if (
+                clause is not None
+                and getattr(clause, "is_select", False)
+                and getattr(clause, "_for_update_arg", None) is None
+                and not self._flushing
+            ):
+                return replica
+            # Desde la primera escritura todo va a la primaria (leer lo propio)
+            self.info["escribio"] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def init_replicas(app):
+    """Crea un engine por réplica y registra la cookie de read-after-write."""
+    opciones = app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+    app.extensions["replicas"] = {
+        f"replica{i}": create_engine(url, **opciones)
+        for i, url in enumerate(app.config["DATABASE_REPLICAS"], start=1)
+    }
+    app.extensions["replicas_retraso"] = TTLCache(
+        max(1, len(app.extensions["replicas"])), app.config["REPLICA_CHEQUEO_TTL"]
+    )
+
+    @app.after_request
+    def marcar_escritura(response):
+        if request.method in METODOS_ESCRITURA and response.status_code < 400 and app.extensions["replicas"]:
+            response.set_cookie(
+                app.config["REPLICA_COOKIE"], "1",
+                max_age=app.config["REPLICA_PEGAJOSO"], httponly=True, samesite="Lax",
+            )
+        replica = g.get("replica")
+        if replica is not None:
+            response.headers["X-Replica"] = replica
+        return response
+
+
+def retraso(nombre: str):
+    """
+    Segundos que la réplica va atrás de la primaria (0 si está al día), o None
+    si no contesta. Es la edad del primer cambio de la primaria que la réplica
+    todavía no tiene. Cacheado REPLICA_CHEQUEO_TTL segundos.
+    """
+    cache = current_app.extensions["replicas_retraso"]
+    medido = cache.get(nombre)
+    if medido is not None:
+        return medido[0]
+
+    try:
+        with current_app.extensions["replicas"][nombre].connect() as conexion:
+            seq = conexion.execute(text("SELECT coalesce(max(seq), 0) FROM cambios")).scalar()
+        with current_app.extensions["sqlalchemy"].engine.connect() as conexion:
+            pendiente = conexion.execute(text("SELECT min(fecha) FROM cambios WHERE seq > :seq"), {"seq": seq}).scalar()
+        if isinstance(pendiente, str):  # SQLite en SQL crudo
+            pendiente = datetime.fromisoformat(pendiente)
+        valor = 0.0 if pendiente is None else max(0.0, (datetime.utcnow() - pendiente).total_seconds())
+    except Exception:
+        current_app.logger.warning("réplica %s no disponible", nombre, exc_info=True)
+        valor = None
+    cache.set(nombre, (valor,))
+    return valor
+
+
+def elegir_replica():
+    """Nombre de una réplica al día, al azar entre las que sirven, o None."""
+    maximo = current_app.config["REPLICA_MAX_RETRASO"]
+    candidatas = [
+        nombre for nombre in current_app.extensions["replicas"]
+        if (r := retraso(nombre)) is not None and r <= maximo
+    ]
+    return random.choice(candidatas) if candidatas else None
+
+
+def pide_primaria() -> bool:
+    return (
+        request.cookies.get(current_app.config["REPLICA_COOKIE"]) == "1"
+        or request.headers.get("X-Consistencia", "").lower() == "primaria"
+    )
+
+
+def solo_lectura(vista):
+    """Decorador para rutas GET que solo leen: sus SELECT pueden ir a una réplica."""
+
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        if current_app.extensions["replicas"]:
+            nombre = None if pide_primaria() else elegir_replica()
+            g.replica = nombre or "primaria"
+            if nombre is not None:
+                sesion = current_app.extensions["sqlalchemy"].session
+                sesion.info["replica"] = current_app.extensions["replicas"][nombre]
+        return vista(*args, **kwargs)
+
+    return envoltura
@@ -0,0 +1,201 @@
+"""
+Reportes de ventas agregados en la BD (rutas /reportes/* en app.py).
+
+Los resultados se guardan un rato (REPORTES_CACHE_TTL) en un cache por
+proceso con los parámetros como clave: los mismos números pedidos desde
+varias cajas o al refrescar el tablero no repiten la agregación.
+"""
+import csv
+import io
+
+from sqlalchemy import case, func, select, union_all
+
+from cache import TTLCache
+from config import Config
+from models import db, Orden, OrdenItem, OrdenArchivo, OrdenItemArchivo, Producto, Servicio
+
+cache_reportes = TTLCache(Config.REPORTES_CACHE_TAMANO, Config.REPORTES_CACHE_TTL)
+
+CRITERIOS_TOP = ("ingresos", "unidades")
+COLUMNAS_CORTE = ["tipo_pago", "ordenes", "con_referencia", "anuladas", "bruto", "descuentos", "neto"]
+COLUMNAS_CORTE_DETALLE = ["codigo", "fecha", "tipo_pago", "referencia", "subtotal", "descuento", "total", "anulada"]
+TAM_LOTE = 1000
+
+
+def en_cache(clave, calcular):
+    """Devuelve el resultado cacheado para `clave` o lo calcula y lo guarda."""
+    resultado = cache_reportes.get(clave)
+    if resultado is None:
+        resultado = calcular()
+        cache_reportes.set(clave, resultado)
+    return resultado
+
+
+def _items_vendidos(modelo, item, inicio, fin, tipo=None, categoria_id=None, sucursal_id=None):
+    """Items de órdenes no anuladas del rango (de una sucursal o de todas), con su importe."""
+    query = (
+        select(
+            item.tipo,
+            item.producto_id,
+            item.servicio_id,
+            item.cantidad.label("cantidad"),
+            (item.cantidad * item.precio_unitario).label("importe"),
+        )
+        .join(modelo, modelo.id == item.orden_id)
+        .where(modelo.fecha >= inicio, modelo.fecha <= fin, modelo.anulada_en.is_(None))
+    )
+    if sucursal_id is not None:
+        query = query.where(modelo.sucursal_id == sucursal_id)
+    if tipo is not None:
+        query = query.where(item.tipo == tipo)
+    if categoria_id is not None:
+        catalogo = Producto if tipo == "producto" else Servicio
+        columna = item.producto_id if tipo == "producto" else item.servicio_id
+        query = query.join(catalogo, catalogo.id == columna).where(catalogo.categoria_id == categoria_id)
+    return query
+
+
+def top_vendidos(inicio, fin, n=10, criterio="ingresos", tipo=None, categoria_id=None, incluir_archivo=False,
+                 sucursal_id=None):
+    """
+    Los `n` productos y servicios más vendidos del rango, por ingresos o unidades.
+
+    Es una sola consulta: agrupa los items por producto/servicio y numera cada
+    grupo dentro de su tipo con row_number(), así el top de productos y el de
+    servicios salen juntos.
+    """
+    fuentes = [_items_vendidos(Orden, OrdenItem, inicio, fin, tipo, categoria_id, sucursal_id)]
+    if incluir_archivo:
+        fuentes.append(_items_vendidos(OrdenArchivo, OrdenItemArchivo, inicio, fin, tipo, categoria_id, sucursal_id))
+    items = (union_all(*fuentes) if len(fuentes) > 1 else fuentes[0]).subquery()
+
+    unidades = func.sum(items.c.cantidad)
+    ingresos = func.sum(items.c.importe)
+    metrica = ingresos if criterio == "ingresos" else unidades
+    ranking = (
+        select(
+            items.c.tipo,
+            items.c.producto_id,
+            items.c.servicio_id,
+            unidades.label("unidades"),
+            ingresos.label("ingresos"),
+            func.row_number().over(
+                partition_by=items.c.tipo,
+                order_by=(metrica.desc(), items.c.producto_id, items.c.servicio_id),
+            ).label("puesto"),
+        )
+        .group_by(items.c.tipo, items.c.producto_id, items.c.servicio_id)
+        .subquery()
+    )
+    filas = (
+        select(ranking, func.coalesce(Producto.descripcion, Servicio.descripcion).label("descripcion"))
+        .outerjoin(Producto, Producto.id == ranking.c.producto_id)
+        .outerjoin(Servicio, Servicio.id == ranking.c.servicio_id)
+        .where(ranking.c.puesto <= n)
+        .order_by(ranking.c.tipo, ranking.c.puesto)
+    )
+
+    resultado = {"productos": [], "servicios": []}
+    for fila in db.session.execute(filas):
+        resultado["productos" if fila.tipo == "producto" else "servicios"].append({
+            f"{fila.tipo}_id": fila.producto_id if fila.tipo == "producto" else fila.servicio_id,
+            "descripcion": fila.descripcion,
+            "unidades": int(fila.unidades),
+            "ingresos": round(float(fila.ingresos), 2),
+        })
+    return resultado
+
+
+# ---------- Corte de caja ----------
+
+def _ordenes_del_rango(columnas, inicio, fin, incluir_archivo, sucursal_id=None):
+    """Las columnas pedidas de ordenes (y ordenes_archivo si hace falta) en [inicio, fin)."""
+    fuentes = [
+        select(*[getattr(modelo, c) for c in columnas])
+        .where(modelo.fecha >= inicio, modelo.fecha < fin)
+        .where(*([modelo.sucursal_id == sucursal_id] if sucursal_id is not None else []))
+        for modelo in ((Orden, OrdenArchivo) if incluir_archivo else (Orden,))
+    ]
+    return (union_all(*fuentes) if len(fuentes) > 1 else fuentes[0]).subquery()
+
+
+def corte_caja(inicio, fin, incluir_archivo=False, sucursal_id=None):
+    """
+    Totales por tipo_pago del período [inicio, fin) en una sola consulta
+    (usa ix_ordenes_fecha_tipo_pago, o ix_ordenes_sucursal_fecha_tipo_pago para
+    una sucursal, y las columnas de resumen: no lee los items).
+    Las anuladas se cuentan aparte y no suman montos.
+    """
+    o = _ordenes_del_rango(
+        ["tipo_pago", "referencia", "subtotal", "descuento", "total", "anulada_en"], inicio, fin, incluir_archivo,
+        sucursal_id,
+    )
+    vigente = o.c.anulada_en.is_(None)
+
+    def suma(columna):
+        return func.coalesce(func.sum(case((vigente, columna), else_=0)), 0)
+
+    query = (
+        select(
+            o.c.tipo_pago,
+            func.count(case((vigente, 1))).label("ordenes"),
+            func.count(case((vigente & (o.c.referencia.is_not(None)) & (o.c.referencia != ""), 1))).label("con_referencia"),
+            func.count(case((~vigente, 1))).label("anuladas"),
+            suma(o.c.subtotal).label("bruto"),
+            suma(o.c.descuento).label("descuentos"),
+            suma(o.c.total).label("neto"),
+        )
+        .group_by(o.c.tipo_pago)
+        .order_by(o.c.tipo_pago)
+    )
+
+    filas = []
+    for fila in db.session.execute(query):
+        filas.append({
+            "tipo_pago": fila.tipo_pago,
+            "ordenes": fila.ordenes,
+            "con_referencia": fila.con_referencia,
+            "anuladas": fila.anuladas,
+            "bruto": round(float(fila.bruto), 2),
+            "descuentos": round(float(fila.descuentos), 2),
+            "neto": round(float(fila.neto), 2),
+        })
+    totales = {
+        c: round(sum(f[c] for f in filas), 2) if c in ("bruto", "descuentos", "neto") else sum(f[c] for f in filas)
+        for c in COLUMNAS_CORTE[1:]
+    }
+    return {"por_tipo_pago": filas, "totales": totales}
+
+
+def corte_csv(corte):
+    """El resumen del corte como CSV (una fila por tipo_pago y la fila TOTAL)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNAS_CORTE)
+    for fila in corte["por_tipo_pago"]:
+        writer.writerow([fila[c] for c in COLUMNAS_CORTE])
+    writer.writerow(["TOTAL"] + [corte["totales"][c] for c in COLUMNAS_CORTE[1:]])
+    yield buffer.getvalue()
+
+
+def corte_detalle_csv(inicio, fin, incluir_archivo=False, sucursal_id=None):
+    """Cada orden del período como CSV, por pedazos (para cruzar referencias)."""
+    o = _ordenes_del_rango(
+        ["codigo", "fecha", "tipo_pago", "referencia", "subtotal", "descuento", "total", "anulada_en"],
+        inicio, fin, incluir_archivo, sucursal_id,
+    )
+    query = select(o).order_by(o.c.tipo_pago, o.c.fecha).execution_options(yield_per=TAM_LOTE)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNAS_CORTE_DETALLE)
+    for particion in db.session.execute(query).partitions():
+        for fila in particion:
+            writer.writerow([
+                fila.codigo, fila.fecha.isoformat(), fila.tipo_pago, fila.referencia or "",
+                fila.subtotal, fila.descuento, fila.total, "si" if fila.anulada_en else "",
+            ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,137 @@
+"""
+Ajustes de tamaño de las respuestas JSON:
+
+- Compresión gzip/brotli negociada con Accept-Encoding (solo si la respuesta
+  pasa de COMPRESION_MIN_BYTES). brotli viene en requirements.txt; si falta
+  (p. ej. un entorno armado a mano) solo se ofrece gzip.
+- ?fields=id,codigo,cliente.nombre,items.cantidad  -> solo esas claves
+- ?compacto=true -> sin valores null (incluye las claves de compatibilidad)
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:  # opcional
+    brotli = None
+
+from flask import request
+
+
+TIPOS_COMPRIMIBLES = ("application/json", "text/csv", "text/plain", "text/html")
+
+
+# ---------- fields / compacto ----------
+
+def parse_fields(valor: str):
+    """'id,cliente.nombre' -> {"id": None, "cliente": {"nombre": None}}; None si no hay filtro."""
+    if not valor:
+        return None
+    arbol = {}
+    for campo in valor.split(","):
+        partes = [p for p in campo.strip().split(".") if p]
+        nodo = arbol
+        for i, parte in enumerate(partes):
+            if i == len(partes) - 1:
+                # un campo completo gana sobre sub-campos del mismo nombre
+                nodo[parte] = None
+            else:
+                siguiente = nodo.get(parte, {})
+                if siguiente is None:
+                    break
+                nodo = nodo.setdefault(parte, siguiente)
+    return arbol or None
+
+
+def _seleccionar(data, arbol):
+    if isinstance(data, list):
+        return [_seleccionar(x, arbol) for x in data]
+    if not isinstance(data, dict):
+        return data
+    resultado = {}
+    for clave, sub in arbol.items():
+        if clave in data:
+            resultado[clave] = data[clave] if sub is None else _seleccionar(data[clave], sub)
+    return resultado
+
+
+def _compactar(data):
+    # Las claves de compatibilidad (p. ej. "empleada" a nivel de orden) siempre
+    # van en null, así que también se van aquí.
+    if isinstance(data, list):
+        return [_compactar(x) for x in data]
+    if not isinstance(data, dict):
+        return data
+    return {k: _compactar(v) for k, v in data.items() if v is not None}
+
+
+def recortar(data, fields=None, compacto=False):
+    """Aplica ?fields= y ?compacto= a un dict o lista de dicts ya serializable."""
+    arbol = parse_fields(fields)
+    if arbol is not None:
+        data = _seleccionar(data, arbol)
+    if compacto:
+        data = _compactar(data)
+    return data
+
+
+def pide_recorte(args) -> bool:
+    return bool(args.get("fields")) or str(args.get("compacto", "")).lower() == "true"
+
+
+def recortar_segun(args, data):
+    return recortar(data, args.get("fields"), str(args.get("compacto", "")).lower() == "true")
+
+
+# ---------- compresión ----------
+
+def elegir_codificacion(accept_encoding: str):
+    """'br' si el cliente lo acepta y brotli está instalado, si no 'gzip', si no None."""
+    aceptadas = set()
+    for parte in (accept_encoding or "").split(","):
+        nombre, _, params = parte.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        aceptadas.add(nombre.strip().lower())
+    if brotli is not None and "br" in aceptadas:
+        return "br"
+    if "gzip" in aceptadas or "*" in aceptadas:
+        return "gzip"
+    return None
+
+
+def comprimir(datos: bytes, codificacion: str, nivel: int) -> bytes:
+    if codificacion == "br":
+        return brotli.compress(datos, quality=min(nivel, 11))
+    return gzip.compress(datos, compresslevel=nivel)
+
+
+def init_compresion(app):
+    """Registra el after_request que comprime las respuestas grandes."""
+
+    @app.after_request
+    def comprimir_respuesta(response):
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in TIPOS_COMPRIMIBLES
+        ):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        datos = response.get_data()
+        if len(datos) < app.config["COMPRESION_MIN_BYTES"]:
+            return response
+
+        codificacion = elegir_codificacion(request.headers.get("Accept-Encoding"))
+        if codificacion is None:
+            return response
+
+        response.set_data(comprimir(datos, codificacion, app.config["COMPRESION_NIVEL"]))
+        response.headers["Content-Encoding"] = codificacion
+        # Otra representación: el ETag pasa a ser débil
+        etag, debil = response.get_etag()
+        if etag and not debil:
+            response.set_etag(etag, weak=True)
+        return response
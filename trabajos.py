@@ -0,0 +1,282 @@
+"""
+Trabajos en segundo plano: exports y reportes pesados que no deben correr
+dentro de un request (los cortaría el timeout del worker de gunicorn).
+
+- POST /trabajos encola una fila en `trabajos` (estado pendiente).
+- `flask worker` toma el pendiente más viejo con SELECT ... FOR UPDATE SKIP
+  LOCKED (varios workers no se pisan; en SQLite el UPDATE condicionado hace
+  lo mismo), lo ejecuta y deja el resultado en TRABAJOS_DIR.
+- GET /trabajos/<id> da el estado y /trabajos/<id>/descarga el archivo.
+
+Si un tipo falla se reintenta con espera creciente hasta
+TRABAJOS_MAX_INTENTOS; si un worker muere a la mitad, el trabajo vuelve a
+pendiente cuando pasa TRABAJOS_TIMEOUT.
+"""
+import json
+import os
+import signal
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select, update
+
+from config import Config
+from importacion import exportar_csv, exportar_json
+from models import db, Trabajo
+from reportes import CRITERIOS_TOP, corte_detalle_csv, top_vendidos
+
+MIMETYPES = {"csv": "text/csv", "json": "application/json"}
+
+
+def _fecha(parametros, campo, default=None):
+    """ISO 8601 -> datetime UTC sin zona (como se guardan las fechas)."""
+    valor = parametros.get(campo)
+    if not valor:
+        if default is None:
+            raise ValueError(f"{campo} es requerido")
+        return default
+    try:
+        fecha = datetime.fromisoformat(valor[:-1] + "+00:00" if valor.endswith("Z") else valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"{campo} debe estar en formato ISO 8601")
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
+
+
+# ---------- Tipos de trabajo ----------
+# validar(parametros) -> parametros normalizados (o ValueError)
+# generar(parametros) -> (extensión, iterable de str)
+
+def _validar_exportar_productos(parametros):
+    formato = parametros.get("formato", "csv")
+    if formato not in ("csv", "json"):
+        raise ValueError("formato debe ser 'csv' o 'json'")
+    return {"formato": formato}
+
+
+def _generar_exportar_productos(parametros):
+    formato = parametros["formato"]
+    return formato, exportar_csv() if formato == "csv" else exportar_json()
+
+
+def _sucursal(parametros):
+    try:
+        return int(parametros["sucursal_id"]) if parametros.get("sucursal_id") is not None else None
+    except (TypeError, ValueError):
+        raise ValueError("sucursal_id debe ser entero")
+
+
+def _validar_corte_detalle(parametros):
+    inicio, fin = _fecha(parametros, "inicio"), _fecha(parametros, "fin")
+    if inicio >= fin:
+        raise ValueError("inicio debe ser anterior a fin")
+    return {"inicio": inicio.isoformat(), "fin": fin.isoformat(), "sucursal_id": _sucursal(parametros)}
+
+
+def _generar_corte_detalle(parametros):
+    inicio, fin = _fecha(parametros, "inicio"), _fecha(parametros, "fin")
+    # Fuera del request no importa leer también el archivo
+    return "csv", corte_detalle_csv(inicio, fin, incluir_archivo=True, sucursal_id=parametros.get("sucursal_id"))
+
+
+def _validar_top_vendidos(parametros):
+    fin = _fecha(parametros, "fin", datetime.utcnow())
+    inicio = _fecha(parametros, "inicio", fin - timedelta(days=30))
+    criterio = parametros.get("criterio", "ingresos")
+    if criterio not in CRITERIOS_TOP:
+        raise ValueError(f"criterio debe ser uno de {', '.join(CRITERIOS_TOP)}")
+    tipo = parametros.get("tipo")
+    if tipo not in (None, "producto", "servicio"):
+        raise ValueError("tipo debe ser 'producto' o 'servicio'")
+    try:
+        n = int(parametros.get("n", 50))
+        categoria_id = int(parametros["categoria_id"]) if parametros.get("categoria_id") is not None else None
+    except (TypeError, ValueError):
+        raise ValueError("n y categoria_id deben ser enteros")
+    if categoria_id is not None and tipo is None:
+        raise ValueError("categoria_id requiere tipo")
+    return {
+        "inicio": inicio.isoformat(), "fin": fin.isoformat(), "n": max(1, n),
+        "criterio": criterio, "tipo": tipo, "categoria_id": categoria_id,
+        "sucursal_id": _sucursal(parametros),
+    }
+
+
+def _generar_top_vendidos(parametros):
+    resultado = top_vendidos(
+        _fecha(parametros, "inicio"), _fecha(parametros, "fin"), parametros["n"], parametros["criterio"],
+        parametros["tipo"], parametros["categoria_id"], incluir_archivo=True,
+        sucursal_id=parametros.get("sucursal_id"),
+    )
+    return "json", [json.dumps({**parametros, **resultado}, ensure_ascii=False)]
+
+
+TIPOS = {
+    "exportar_productos": (_validar_exportar_productos, _generar_exportar_productos),
+    "corte_detalle": (_validar_corte_detalle, _generar_corte_detalle),
+    "top_vendidos": (_validar_top_vendidos, _generar_top_vendidos),
+}
+
+
+# ---------- Cola ----------
+
+def encolar(tipo: str, parametros: dict) -> Trabajo:
+    """Valida y agrega el trabajo a la sesión. No hace commit. ValueError si no es válido."""
+    if tipo not in TIPOS:
+        raise ValueError(f"tipo debe ser uno de {', '.join(sorted(TIPOS))}")
+    if not isinstance(parametros, dict):
+        raise ValueError("parametros debe ser un objeto")
+    validar, _ = TIPOS[tipo]
+    trabajo = Trabajo(tipo=tipo, parametros=validar(parametros))
+    db.session.add(trabajo)
+    return trabajo
+
+
+def ruta_resultado(trabajo: Trabajo) -> str:
+    return os.path.join(Config.TRABAJOS_DIR, trabajo.archivo)
+
+
+def trabajo_to_dict(trabajo: Trabajo) -> dict:
+    return {
+        "id": trabajo.id,
+        "tipo": trabajo.tipo,
+        "parametros": trabajo.parametros,
+        "estado": trabajo.estado,
+        "intentos": trabajo.intentos,
+        "error": trabajo.error,
+        "tamano": trabajo.tamano,
+        "descarga": f"/trabajos/{trabajo.id}/descarga" if trabajo.estado == "terminado" else None,
+        "creado_en": trabajo.creado_en.isoformat() if trabajo.creado_en else None,
+        "iniciado_en": trabajo.iniciado_en.isoformat() if trabajo.iniciado_en else None,
+        "terminado_en": trabajo.terminado_en.isoformat() if trabajo.terminado_en else None,
+    }
+
+
+def tomar_siguiente(worker: str):
+    """Marca como en_curso el pendiente más viejo y devuelve su id (o None)."""
+    ahora = datetime.utcnow()
+    trabajo_id = db.session.execute(
+        select(Trabajo.id)
+        .where(Trabajo.estado == "pendiente", Trabajo.disponible_en <= ahora)
+        .order_by(Trabajo.disponible_en, Trabajo.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    ).scalar()
+    if trabajo_id is None:
+        db.session.rollback()
+        return None
+    # Condicionado al estado: donde no hay SKIP LOCKED, solo un worker lo gana
+    tomado = db.session.execute(
+        update(Trabajo)
+        .where(Trabajo.id == trabajo_id, Trabajo.estado == "pendiente")
+        .values(estado="en_curso", intentos=Trabajo.intentos + 1, iniciado_en=ahora, worker=worker)
+    ).rowcount
+    db.session.commit()
+    return trabajo_id if tomado else None
+
+
+def ejecutar(trabajo_id: int):
+    """Corre el trabajo y deja el resultado en TRABAJOS_DIR (vía archivo temporal)."""
+    trabajo = db.session.get(Trabajo, trabajo_id)
+    _, generar = TIPOS[trabajo.tipo]
+    temporal = None
+    try:
+        extension, partes = generar(trabajo.parametros)
+        nombre = f"{trabajo.id}_{trabajo.tipo}.{extension}"
+        os.makedirs(Config.TRABAJOS_DIR, exist_ok=True)
+        temporal = os.path.join(Config.TRABAJOS_DIR, nombre + ".parcial")
+        with open(temporal, "w", encoding="utf-8", newline="") as f:
+            for parte in partes:
+                f.write(parte)
+        os.replace(temporal, os.path.join(Config.TRABAJOS_DIR, nombre))
+    except Exception:
+        db.session.rollback()
+        if temporal and os.path.exists(temporal):
+            os.remove(temporal)
+        _fallo(trabajo, traceback.format_exc(limit=5))
+        return False
+
+    trabajo.estado = "terminado"
+    trabajo.archivo = nombre
+    trabajo.tamano = os.path.getsize(ruta_resultado(trabajo))
+    trabajo.error = None
+    trabajo.terminado_en = datetime.utcnow()
+    db.session.commit()
+    return True
+
+
+def _fallo(trabajo: Trabajo, error: str):
+    if trabajo.intentos >= Config.TRABAJOS_MAX_INTENTOS:
+        trabajo.estado = "error"
+        trabajo.terminado_en = datetime.utcnow()
+    else:
+        trabajo.estado = "pendiente"
+        trabajo.disponible_en = datetime.utcnow() + timedelta(seconds=30 * 2 ** (trabajo.intentos - 1))
+    trabajo.error = error
+    db.session.commit()
+
+
+def recuperar_colgados() -> int:
+    """Los en_curso de un worker que murió vuelven a la cola (o a error si ya no quedan intentos)."""
+    limite = datetime.utcnow() - timedelta(seconds=Config.TRABAJOS_TIMEOUT)
+    colgados = (Trabajo.estado == "en_curso", Trabajo.iniciado_en < limite)
+    n = db.session.execute(
+        update(Trabajo)
+        .where(*colgados, Trabajo.intentos >= Config.TRABAJOS_MAX_INTENTOS)
+        .values(estado="error", error="el worker no terminó a tiempo", terminado_en=datetime.utcnow())
+    ).rowcount
+    n += db.session.execute(
+        update(Trabajo).where(*colgados).values(estado="pendiente", disponible_en=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return n
+
+
+def trabajar(worker: str, una_vez: bool = False, espera: float = None, log=print):
+    """
+    Bucle del worker: toma y ejecuta trabajos hasta SIGTERM/SIGINT (termina
+    el que está corriendo antes de salir). Con `una_vez` sale cuando la cola
+    queda vacía.
+    """
+    espera = Config.TRABAJOS_ESPERA if espera is None else espera
+    detener = {"si": False}
+
+    def pedir_salida(*_):
+        detener["si"] = True
+
+    signal.signal(signal.SIGTERM, pedir_salida)
+    signal.signal(signal.SIGINT, pedir_salida)
+
+    ultimo_rescate = 0.0
+    while not detener["si"]:
+        if time.monotonic() - ultimo_rescate > 60:
+            if recuperar_colgados():
+                log("trabajos colgados devueltos a la cola")
+            ultimo_rescate = time.monotonic()
+
+        trabajo_id = tomar_siguiente(worker)
+        if trabajo_id is None:
+            if una_vez:
+                break
+            time.sleep(espera)
+            continue
+
+        inicio = time.perf_counter()
+        ok = ejecutar(trabajo_id)
+        log(f"trabajo {trabajo_id} {'terminado' if ok else 'falló'} en {time.perf_counter() - inicio:.1f} s")
+        db.session.remove()
+
+
+def podar_trabajos(dias: int) -> int:
+    """Borra los trabajos terminados o con error de hace más de `dias` días, y sus archivos."""
+    corte = datetime.utcnow() - timedelta(days=dias)
+    viejos = (Trabajo.estado.in_(("terminado", "error")), Trabajo.creado_en < corte)
+    for archivo in db.session.execute(select(Trabajo.archivo).where(*viejos, Trabajo.archivo.is_not(None))).scalars():
+        ruta = os.path.join(Config.TRABAJOS_DIR, archivo)
+        if os.path.exists(ruta):
+            os.remove(ruta)
+    n = db.session.execute(delete(Trabajo).where(*viejos)).rowcount
+    db.session.commit()
+    return n